@@ -0,0 +1,74 @@
+"""
+Measure the memory used by the links of a large intersphinx inventory.
+
+Compares a dictionary of C{(base_url, location)} tuples, which is how
+pydoctor used to store the links, to the packed link table that
+L{pydoctor.sphinx.SphinxInventory} uses, for a synthetic inventory.
+
+Usage::
+
+    python benchmarks/intersphinx_memory.py [number of entries]
+"""
+
+from typing import Callable, Dict, Mapping, Tuple
+import gc
+import sys
+import time
+import tracemalloc
+import zlib
+
+from pydoctor.sphinx import SphinxInventory, _LinkTable
+
+
+def inventory(size: int) -> bytes:
+    """Generate a compressed inventory with C{size} entries."""
+    lines = []
+    for i in range(size):
+        module = f'package{i // 5000}.module{i // 100}'
+        if i % 100 == 0:
+            lines.append(f'{module} py:module -1 api/{module}.html#module-$ -')
+        else:
+            lines.append(f'{module}.name{i} py:function 1 api/{module}.html#$ -')
+    return (b'# Sphinx inventory version 2\n'
+            b'# The rest of this file is compressed with zlib.\n'
+            + zlib.compress('\n'.join(lines).encode()))
+
+def to_dict(links: Mapping[str, Tuple[str, str]]) -> Dict[str, Tuple[str, str]]:
+    return dict(links)
+
+def to_table(links: Mapping[str, Tuple[str, str]]) -> _LinkTable:
+    table = _LinkTable()
+    table.update(links)
+    table.pack()
+    return table
+
+def measure(build: Callable[[Mapping[str, Tuple[str, str]]], Mapping[str, Tuple[str, str]]],
+            data: bytes) -> Tuple[int, float]:
+    """Return the memory used by the links built by C{build}, in bytes,
+    and the average time to look up a link, in seconds."""
+    inv = SphinxInventory(logger=print)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    links = build(inv._parseInventory(
+        'https://docs.example.org', inv._getPayload('', data)))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    names = list(links)[::97]
+    start = time.perf_counter()
+    for name in names:
+        links[name]
+    return size, (time.perf_counter() - start) / len(names)
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    data = inventory(size)
+    print(f'{size} links')
+    for label, build in (('dict:      ', to_dict), ('link table:', to_table)):
+        memory, lookup = measure(build, data)
+        print(f'{label} {memory / 2**20:6.1f} MiB, {lookup * 1e6:5.2f} us per lookup')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure the time it takes to parse reStructuredText docstrings.
+
+Compares parsing each docstring into a document with its own
+C{publish_string()} call, which is how pydoctor used to parse docstrings,
+to the reusable parser in L{pydoctor.epydoc.markup.restructuredtext}.
+
+Usage::
+
+    python benchmarks/rst_parsing.py [number of docstrings]
+"""
+
+from typing import Callable, List
+import sys
+import time
+
+from docutils.core import publish_string
+
+from pydoctor.epydoc.markup import ParseError
+from pydoctor.epydoc.markup.restructuredtext import (
+    _DocumentPseudoWriter, _EpydocReader, _Parser
+)
+
+
+templates = [
+    "Return the number of {name}.",
+    """
+    Create a new {name}.
+
+    :param size: The size of the {name}, in *bytes*.
+    :type size: int
+    :raises ValueError: If C{{size}} is negative.
+    """,
+    """
+    A {name} that can be used with ``with`` statements.
+
+    Example:
+
+    >>> with {name}() as x:
+    ...     print(x)
+
+    .. note:: See `the documentation <http://example.com/{name}>`_.
+
+    - First item about `{name}`.
+    - Second item.
+
+    :ivar count: How often the {name} was used.
+    """,
+    ]
+
+def corpus(size: int) -> List[str]:
+    """Generate C{size} distinct docstrings."""
+    return [
+        templates[i % len(templates)].format(name=f'thing{i}')
+        for i in range(size)
+        ]
+
+def parse_with_publish_string(docstring: str, errors: List[ParseError]) -> object:
+    writer = _DocumentPseudoWriter()
+    reader = _EpydocReader(errors)
+    publish_string(docstring, writer=writer, reader=reader,
+                   settings_overrides={'report_level':10000,
+                                       'halt_level':10000,
+                                       'warning_stream':None})
+    return writer.document
+
+def measure(parse: Callable[[str, List[ParseError]], object], docstrings: List[str]) -> float:
+    """Return the average time to parse one docstring, in seconds."""
+    start = time.perf_counter()
+    for docstring in docstrings:
+        parse(docstring, [])
+    return (time.perf_counter() - start) / len(docstrings)
+
+def main() -> None:
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    docstrings = corpus(size)
+    # Warm up: import parsers and directives before measuring.
+    parse_reusable = _Parser.get().parse
+    for parse in (parse_with_publish_string, parse_reusable):
+        parse(docstrings[-1], [])
+
+    before = measure(parse_with_publish_string, docstrings)
+    after = measure(parse_reusable, docstrings)
+    print(f'{size} docstrings')
+    print(f'publish_string() per docstring: {before * 1e6:8.0f} us')
+    print(f'reusable parser per docstring:  {after * 1e6:8.0f} us')
+    print(f'speedup: {before / after:.1f}x')
+
+if __name__ == '__main__':
+    main()
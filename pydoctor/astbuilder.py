@@ -758,22 +758,7 @@ class ModuleVistor(ast.NodeVisitor):
         if docstring is not None:
             attr.setDocstring(docstring)
             assert attr.docstring is not None
-            pdoc = epydoc2stan.parse_docstring(attr, attr.docstring, attr)
-            other_fields = []
-            for field in pdoc.fields:
-                tag = field.tag()
-                if tag == 'return':
-                    if not pdoc.has_body:
-                        pdoc = field.body()
-                        # Avoid format_summary() going back to the original
-                        # empty-body docstring.
-                        attr.docstring = ''
-                elif tag == 'rtype':
-                    attr.parsed_type = field.body()
-                else:
-                    other_fields.append(field)
-            pdoc.fields = other_fields
-            attr.parsed_docstring = pdoc
+            parsePropertyDocstring(attr, attr.docstring)
 
         if node.returns is not None:
             attr.annotation = self._unstring_annotation(node.returns)
@@ -856,6 +841,35 @@ class ModuleVistor(ast.NodeVisitor):
             return expr
 
 
+def parsePropertyDocstring(attr: model.Attribute, docstring: str) -> None:
+    """Parse the docstring of a property.
+
+    The C{return} and C{rtype} fields of a property's docstring describe
+    the property's value, so they are moved out of the field list.
+
+    @param docstring: The docstring of the property's getter.
+        This is kept as C{attr.property_docstring}, since C{attr.docstring}
+        is cleared if the docstring only consists of a C{return} field.
+    """
+    attr.property_docstring = docstring
+    pdoc = epydoc2stan.parse_docstring(attr, docstring, attr)
+    other_fields = []
+    for field in pdoc.fields:
+        tag = field.tag()
+        if tag == 'return':
+            if not pdoc.has_body:
+                pdoc = field.body()
+                # Avoid format_summary() going back to the original
+                # empty-body docstring.
+                attr.docstring = ''
+        elif tag == 'rtype':
+            attr.parsed_type = field.body()
+        else:
+            other_fields.append(field)
+    pdoc.fields = other_fields
+    attr.parsed_docstring = pdoc
+
+
 class _ValueFormatter:
     """Formats values stored in AST expressions.
     Used for presenting default values of parameters.
@@ -0,0 +1,62 @@
+"""Storage of intermediate results between runs, in the directory given
+by C{--build-cache-dir}.
+
+Entries are files named after a hash of their inputs, so an entry is only
+found again if its inputs did not change. Old entries are never removed
+by pydoctor; the whole directory can be deleted at any time.
+"""
+
+from pathlib import Path
+from typing import Optional, Union
+import hashlib
+import mmap
+import os
+import sys
+
+from pydoctor import __version__
+
+
+def cacheKey(data: Union[bytes, mmap.mmap], *context: str) -> str:
+    """Compute the key of the cache entry that is derived from C{data}.
+
+    C{data} can be a memory-mapped file, which is hashed without being
+    copied into memory.
+
+    The pydoctor and Python versions are part of every key, since either
+    can change the result for the same input.
+
+    @param context: Anything else the result depends on, such as the
+        docstring format.
+    """
+    h = hashlib.sha256()
+    h.update('\0'.join((__version__, sys.version, *context, '')).encode())
+    h.update(data)
+    return h.hexdigest()
+
+def readEntry(path: Path) -> Optional[bytes]:
+    """Read a cache entry, or return L{None} if it does not exist or
+    cannot be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def writeEntry(path: Path, data: bytes) -> None:
+    """Atomically write a cache entry.
+
+    Failing to write to the cache is not an error: the entry will be
+    computed again on the next run.
+    """
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
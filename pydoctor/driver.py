@@ -7,7 +7,7 @@ import datetime
 import os
 import sys
 
-from pydoctor import model, zopeinterface, __version__
+from pydoctor import model, snapshot, zopeinterface, __version__
 from pydoctor.sphinx import (MAX_AGE_HELP, USER_INTERSPHINX_CACHE,
                              SphinxInventoryWriter, prepareCache)
 
@@ -150,6 +150,14 @@ def getparser() -> OptionParser:
         '--html-writer', dest='htmlwriter',
         help=("Dotted name of html writer class to use (default "
               "'pydoctor.templatewriter.TemplateWriter')."))
+    parser.add_option(
+        '--html-incremental', dest='htmlincremental',
+        action='store_true', default=False,
+        help=("Only rewrite the HTML pages whose inputs changed since the "
+              "previous run with this option. Warnings about docstrings "
+              "that are shown on unchanged pages are not repeated. Every "
+              "page shows the build time, so pages are only kept if it is "
+              "fixed with --buildtime or SOURCE_DATE_EPOCH."))
     parser.add_option(
         '--html-viewsource-base', dest='htmlsourcebase',
         help=("This should be the path to the trac browser for the top "
@@ -179,6 +187,29 @@ def getparser() -> OptionParser:
         type=str, default={}, dest='verbosity_details',
         callback=verbose_about_callback,
         help=("Be noiser during a particular stage of generation."))
+    parser.add_option(
+        '--jobs', type='int', dest='jobs', default=1, metavar='N',
+        help=("Number of worker processes to use for rendering HTML pages. "
+              "Use 0 to start one worker per CPU. Default is 1, which "
+              "does all work in the main process."))
+    parser.add_option(
+        '--build-cache-dir', dest='buildcachedir', type='path', default=None,
+        metavar='PATH',
+        help=("Directory in which to cache parsed docstrings and "
+              "intersphinx inventories between runs. Unchanged inputs are "
+              "loaded from the cache instead of being parsed again. The "
+              "cache files are loaded with pickle, so only use a directory "
+              "that nobody else can write to."))
+    parser.add_option(
+        '--save-system', dest='savesystem', type='path', default=None,
+        metavar='PATH',
+        help=("Save the processed system to a file, which can be used "
+              "with --load-system in later runs."))
+    parser.add_option(
+        '--load-system', dest='loadsystem', type='path', default=None,
+        metavar='PATH',
+        help=("Load a system saved with --save-system, instead of "
+              "processing source paths."))
     parser.add_option(
         '--introspect-c-modules', default=False, action='store_true',
         help=("Import and introspect any C modules found."))
@@ -188,7 +219,10 @@ def getparser() -> OptionParser:
         metavar='URL_TO_OBJECTS.INV', default=[],
         help=(
             "Use Sphinx objects inventory to generate links to external "
-            "documentation. Can be repeated."))
+            "documentation. Can be repeated. Local inventories can be given "
+            "as a path or file:// URL, preceded by BASE_URL= to link to the "
+            "documentation at BASE_URL. A local directory is used as a "
+            "registry that contains ROOT/objects.inv per project root."))
 
     parser.add_option(
         '--enable-intersphinx-cache',
@@ -258,6 +292,11 @@ def parse_args(args: Sequence[str]) -> Tuple[Values, List[str]]:
     options, args = parser.parse_args(args)
     options.verbosity -= options.quietness
 
+    if options.jobs < 0:
+        parser.error("--jobs must not be negative")
+    if options.jobs == 0:
+        options.jobs = os.cpu_count() or 1
+
     _warn_deprecated_options(options)
 
     return options, args
@@ -346,7 +385,15 @@ def main(args: Sequence[str] = sys.argv[1:]) -> int:
 
         # step 2: add any packages and modules
 
-        if args:
+        if options.loadsystem:
+            if args:
+                error("Source paths cannot be combined with --load-system.")
+            system.msg('snapshot', f"loading system from {options.loadsystem}")
+            try:
+                snapshot.load_system(system, options.loadsystem)
+            except snapshot.SnapshotError as ex:
+                error(f"Cannot load system from {options.loadsystem}: {ex}")
+        elif args:
             prependedpackage = None
             if options.prependedpackage:
                 for m in options.prependedpackage.split('.'):
@@ -383,14 +430,22 @@ def main(args: Sequence[str] = sys.argv[1:]) -> int:
 
         # step 3: move the system to the desired state
 
-        if system.options.projectname is None:
+        if system.options.projectname is not None:
+            system.projectname = system.options.projectname
+        elif not options.loadsystem:
             name = '/'.join(ro.name for ro in system.rootobjects)
             system.msg('warning', f"Guessing '{name}' for project name.", thresh=0)
             system.projectname = name
-        else:
-            system.projectname = system.options.projectname
 
-        system.process()
+        if not options.loadsystem:
+            system.process()
+
+        if options.savesystem:
+            system.msg('snapshot', f"saving system to {options.savesystem}")
+            try:
+                snapshot.save_system(system, options.savesystem)
+            except snapshot.SnapshotError as ex:
+                error(f"Cannot save system to {options.savesystem}: {ex}")
 
         # step 4: make html, if desired
 
@@ -422,6 +477,8 @@ def main(args: Sequence[str] = sys.argv[1:]) -> int:
                 writer.writeModuleIndex(system)
                 subjects = system.rootobjects
             writer.writeIndividualFiles(subjects)
+            system.msg('html', '%d cross-references resolved, %d found in cache' % (
+                system.xrefCacheMisses, system.xrefCacheHits), thresh=1)
             if system.docstring_syntax_errors:
                 def p(msg: str) -> None:
                     system.msg('docstring-summary', msg, thresh=-1, topthresh=1)
@@ -431,6 +488,10 @@ def main(args: Sequence[str] = sys.argv[1:]) -> int:
                 for fn in sorted(system.docstring_syntax_errors):
                     p('    '+fn)
 
+        # Report problems with the intersphinx inventories, also when
+        # no links were looked up.
+        system.intersphinx.wait()
+
         if system.violations and options.warnings_as_errors:
             # Update exit code if the run has produced warnings.
             exitcode = 3
@@ -19,14 +19,14 @@ Creating C{ParsedRstDocstring}s
 ===============================
 
 C{ParsedRstDocstring}s are created by the C{parse_document} function,
-using the C{docutils.core.publish_string()} method, with the following
-helpers:
+which does what the C{docutils.core.publish_string()} method would do
+with the following helpers, set up once per process by L{_Parser}:
 
   - An L{_EpydocReader} is used to capture all error messages as it
     parses the docstring.
-  - A L{_DocumentPseudoWriter} is used to extract the document itself,
-    without actually writing any output.  The document is saved for
-    further processing.  The settings for the writer are copied from
+  - A L{_DocumentPseudoWriter} stands in for a writer, without
+    actually writing any output.  The document is saved for further
+    processing.  The settings for the writer are copied from
     C{docutils.writers.html4css1.Writer}, since those settings will
     be used when we actually write the docstring to html.
 
@@ -42,11 +42,13 @@ the list.
 """
 __docformat__ = 'epytext en'
 
-from typing import Any, ClassVar, Iterable, List, Optional, Sequence, Set
+from typing import Any, ClassVar, Dict, Iterable, List, Optional, Sequence, Set
+import copy
 import optparse
+import os
 import re
 
-from docutils.core import publish_string
+from docutils.io import StringInput
 from docutils.writers import Writer
 from docutils.writers.html4css1 import HTMLTranslator, Writer as HTMLWriter
 from docutils.readers.standalone import Reader as StandaloneReader
@@ -87,6 +89,22 @@ CONSOLIDATED_FIELDS = {
 #: a @type field.
 CONSOLIDATED_DEFLIST_FIELDS = ['param', 'arg', 'var', 'ivar', 'cvar', 'keyword']
 
+#: The text around attributions of block quotes, for each value of the
+#: C{attribution} setting.
+_ATTRIBUTION_FORMATS = {
+    'dash': ('\N{EM DASH}', ''),
+    'parentheses': ('(', ')'),
+    'parens': ('(', ')'),
+    'none': ('', ''),
+    }
+
+#: The image types that the HTML translator puts in an C{<object>} element,
+#: by file extension.
+_OBJECT_IMAGE_TYPES = {
+    '.svg': 'image/svg+xml',
+    '.swf': 'application/x-shockwave-flash',
+    }
+
 def parse_docstring(docstring: str, errors: List[ParseError]) -> ParsedDocstring:
     """
     Parse the given docstring, which is formatted using
@@ -97,14 +115,7 @@ def parse_docstring(docstring: str, errors: List[ParseError]) -> ParsedDocstring
     @param errors: A list where any errors generated during parsing
         will be stored.
     """
-    writer = _DocumentPseudoWriter()
-    reader = _EpydocReader(errors) # Outputs errors to the list.
-    publish_string(docstring, writer=writer, reader=reader,
-                   settings_overrides={'report_level':10000,
-                                       'halt_level':10000,
-                                       'warning_stream':None})
-
-    document = writer.document
+    document = _Parser.get().parse(docstring, errors)
     visitor = _SplitFieldsTranslator(document, errors)
     document.walk(visitor)
 
@@ -144,13 +155,73 @@ class ParsedRstDocstring(ParsedDocstring):
 
     def to_stan(self, docstring_linker: DocstringLinker) -> Tag:
         # Inherit docs
-        visitor = _EpydocHTMLTranslator(self._document, docstring_linker)
+        visitor = _StanTranslator(self._document, docstring_linker)
         self._document.walkabout(visitor)
-        return html2stan(''.join(visitor.body))
+        return visitor.root
 
     def __repr__(self) -> str:
         return '<ParsedRstDocstring: ...>'
 
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Docutils does not pickle the reporter of a document.
+        document = self._document
+        document.reporter = OptimizedReporter(
+            document.get('source', ''), 'SEVERE', 'SEVERE', '')
+
+class _Parser:
+    """
+    The docutils components that turn docstrings into documents.
+
+    Setting up the components and their settings is much slower than
+    parsing a typical docstring, so that is done once per process;
+    each docstring only gets a new document.
+    """
+
+    _instance: ClassVar[Optional['_Parser']] = None
+
+    @classmethod
+    def get(cls) -> '_Parser':
+        """Return the parser for this process."""
+        parser = cls._instance
+        if parser is None:
+            parser = cls._instance = cls()
+        return parser
+
+    def __init__(self) -> None:
+        self.reader = _EpydocReader([])
+        self.reader.set_parser('restructuredtext')
+        self.parser = self.reader.parser
+        self.writer = _DocumentPseudoWriter()
+        # Same as the settings publish_string() would use.
+        self.settings = OptionParser(
+            components=(self.parser, self.reader, self.writer),
+            defaults={'report_level': 10000,
+                      'halt_level': 10000,
+                      'warning_stream': None},
+            read_config_files=True,
+            ).get_default_values()
+        self.settings._source = None
+        self.settings._destination = None
+
+    def parse(self, docstring: str, errors: List[ParseError]) -> docutils.nodes.document:
+        """Parse C{docstring} into a new document, with all transforms
+        applied.
+
+        @param errors: A list where any errors generated during parsing
+            will be stored.
+        """
+        reader = self.reader
+        reader._errors = errors
+        # Each document gets its own copy of the settings, since
+        # processing a document can change them.
+        document: docutils.nodes.document = reader.read(
+            StringInput(source=docstring), self.parser, copy.copy(self.settings))
+        transformer = document.transformer
+        transformer.populate_from_components((reader, self.parser, self.writer))
+        transformer.apply_transforms()
+        return document
+
 class _EpydocReader(StandaloneReader):
     """
     A reader that captures all errors that are generated by parsing,
@@ -159,6 +230,8 @@ class _EpydocReader(StandaloneReader):
 
     def __init__(self, errors: List[ParseError]):
         self._errors = errors
+        """The list to which errors are appended; can be replaced
+        between documents."""
         StandaloneReader.__init__(self)
 
     def get_transforms(self) -> List[Transform]:
@@ -381,6 +454,33 @@ class _SplitFieldsTranslator(NodeVisitor):
 
 _TARGET_RE = re.compile(r'^(.*?)\s*<(?:URI:|URL:)?([^<>]+)>$')
 
+def _title_reference_to_stan(node: Node, docstring_linker: DocstringLinker) -> Tag:
+    """
+    Present interpreted text as a crossreference, which is linked to its
+    target if the linker can resolve it.
+    """
+    m = _TARGET_RE.match(node.astext())
+    if m: text, target = m.groups()
+    else: target = text = node.astext()
+    label = tags.code(text)
+    # TODO: 'node.line' is None for some reason.
+    #       https://github.com/twisted/pydoctor/issues/237
+    lineno = 0
+    try:
+        url = docstring_linker.resolve_identifier_xref(target, lineno)
+    except LookupError:
+        return label
+    else:
+        return tags.a(label, href=url)
+
+def _doctest_block_to_stan(node: Node) -> Tag:
+    """Present a doctest block, or a C{python} directive, as colorized code."""
+    pysrc = node[0].astext()
+    if node.get('codeblock'):
+        return colorize_codeblock(pysrc)
+    else:
+        return colorize_doctest(pysrc)
+
 class _EpydocHTMLTranslator(HTMLTranslator):
 
     settings: ClassVar[Optional[optparse.Values]] = None
@@ -392,29 +492,21 @@ class _EpydocHTMLTranslator(HTMLTranslator):
         self._linker = docstring_linker
 
         # Set the document's settings.
-        if self.settings is None:
-            settings = OptionParser([HTMLWriter()]).get_default_values()
-            self.__class__.settings = settings
-        document.settings = self.settings
+        document.settings = self.get_settings()
 
         super().__init__(document)
 
+    @classmethod
+    def get_settings(cls) -> optparse.Values:
+        """Return the settings of the HTML writer, which are created once."""
+        settings = cls.settings
+        if settings is None:
+            settings = cls.settings = OptionParser([HTMLWriter()]).get_default_values()
+        return settings
+
     # Handle interpreted text (crossreferences)
     def visit_title_reference(self, node: Node) -> None:
-        m = _TARGET_RE.match(node.astext())
-        if m: text, target = m.groups()
-        else: target = text = node.astext()
-        label = tags.code(text)
-        # TODO: 'node.line' is None for some reason.
-        #       https://github.com/twisted/pydoctor/issues/237
-        lineno = 0
-        try:
-            url = self._linker.resolve_identifier_xref(target, lineno)
-        except LookupError:
-            xref = label
-        else:
-            xref = tags.a(label, href=url)
-        self.body.append(flatten(xref))
+        self.body.append(flatten(_title_reference_to_stan(node, self._linker)))
         raise SkipNode()
 
     def should_be_compact_paragraph(self, node: Node) -> bool:
@@ -472,13 +564,925 @@ class _EpydocHTMLTranslator(HTMLTranslator):
         return super().starttag(node, tagname, suffix, **attributes)  # type: ignore[no-any-return]
 
     def visit_doctest_block(self, node: Node) -> None:
-        pysrc = node[0].astext()
-        if node.get('codeblock'):
-            self.body.append(flatten(colorize_codeblock(pysrc)))
+        self.body.append(flatten(_doctest_block_to_stan(node)))
+        raise SkipNode()
+
+_RE_CONTROL = re.compile(
+    '[' + ''.join(ch for ch in map(chr, range(0, 32)) if ch not in '\r\n\t\f') + ']'
+    )
+_RE_WHITESPACE = re.compile('[\n\r\t\v\f]')
+
+def _escape_control(text: str) -> str:
+    """Replace control characters, which are not allowed in XML, the same
+    way L{html2stan()} does."""
+    return _RE_CONTROL.sub(lambda m: '\\x%02x' % ord(m.group()), text)
+
+class _SimpleListChecker(docutils.nodes.GenericNodeVisitor):
+    """
+    Raise L{docutils.nodes.NodeFound} if a list item is not simple, which
+    means that it contains more than a single paragraph, a simple list, or
+    a paragraph followed by a simple list.
+
+    This is the check that the HTML translator uses for compact lists.
+    """
+
+    def default_visit(self, node: Node) -> None:
+        raise docutils.nodes.NodeFound()
+
+    def visit_list_item(self, node: Node) -> None:
+        children = [child for child in node.children
+                    if not isinstance(child, docutils.nodes.Invisible)]
+        if (children and isinstance(children[0], docutils.nodes.paragraph)
+            and isinstance(children[-1], (docutils.nodes.bullet_list,
+                                          docutils.nodes.enumerated_list,
+                                          docutils.nodes.field_list))):
+            children.pop()
+        if len(children) > 1:
+            raise docutils.nodes.NodeFound()
+
+    def pass_node(self, node: Node) -> None:
+        pass
+
+    def ignore_node(self, node: Node) -> None:
+        # Nodes that can only contain inline nodes are never complex.
+        raise SkipNode()
+
+    # Paragraphs and text
+    visit_Text = ignore_node
+    visit_paragraph = ignore_node
+
+    # Lists
+    visit_bullet_list = pass_node
+    visit_enumerated_list = pass_node
+    visit_docinfo = pass_node
+
+    # Docinfo nodes
+    visit_author = ignore_node
+    visit_authors = visit_list_item
+    visit_address = visit_list_item
+    visit_contact = pass_node
+    visit_copyright = ignore_node
+    visit_date = ignore_node
+    visit_organization = ignore_node
+    visit_status = ignore_node
+    visit_version = visit_list_item
+
+    # Definition lists
+    visit_definition_list = pass_node
+    visit_definition_list_item = pass_node
+    visit_term = ignore_node
+    visit_classifier = pass_node
+    visit_definition = visit_list_item
+
+    # Field lists
+    visit_field_list = pass_node
+    visit_field = pass_node
+    # The field body corresponds to a list item.
+    visit_field_body = visit_list_item
+    visit_field_name = ignore_node
+
+    # Invisible nodes
+    visit_comment = ignore_node
+    visit_substitution_definition = ignore_node
+    visit_target = ignore_node
+    visit_pending = ignore_node
+
+class _StanTranslator(NodeVisitor):
+    """
+    A docutils translator that builds a Stan tree from a document.
+
+    The tree is the one L{html2stan()} would make from the output of
+    L{_EpydocHTMLTranslator}: the same tags, CSS classes and whitespace,
+    including the compact lists and paragraphs of
+    L{docutils.writers.html4css1}.  But instead of writing the document
+    as an HTML string that is parsed again, tags are created directly.
+
+    Nodes that are rare in docstrings, such as topics, sidebars, option
+    lists and citations, are still rendered to HTML by
+    L{_EpydocHTMLTranslator}.
+
+    Unlike L{_EpydocHTMLTranslator}, this translator does not change the
+    document, so it can be rendered again.
+    """
+
+    def __init__(self,
+            document: docutils.nodes.document,
+            docstring_linker: DocstringLinker
+            ):
+        NodeVisitor.__init__(self, document)
+        self._linker = docstring_linker
+        settings = _EpydocHTMLTranslator.get_settings()
+        self._initial_header_level = int(settings.initial_header_level)
+        self._compact_lists = settings.compact_lists
+        self._compact_field_lists = settings.compact_field_lists
+        self._field_name_limit = settings.field_name_limit
+        self._attribution = _ATTRIBUTION_FORMATS[settings.attribution]
+        self._table_style = settings.table_style
+        self._footnote_backlinks = settings.footnote_backlinks
+        self._footnote_references = settings.footnote_references
+
+        self.root = Tag('')
+        """The Stan tree of the document."""
+        self._stack = [self.root]
+        self._context: List[Any] = []
+        self._extra_classes: Dict[int, List[str]] = {}
+        """Classes that the HTML translator would add to nodes,
+        by node id."""
+        self._colspecs: List[Node] = []
+        self._stubs: Dict[int, List[Any]] = {}
+        """Whether the columns of a table group are stubs, by node id
+        of the group."""
+
+        # The state of the HTML translator.
+        self.section_level = 0
+        self.compact_p: Optional[bool] = True
+        self.compact_simple = False
+        self.compact_field_list = False
+        self.topic_classes: List[str] = []
+
+    def _add(self, *children: Any) -> None:
+        self._stack[-1].children.extend(children)
+
+    def _classes(self, node: Node) -> List[str]:
+        classes: List[str] = node.get('classes', [])
+        return classes + self._extra_classes.get(id(node), [])
+
+    def _add_class(self, node: Node, cls: str) -> None:
+        self._extra_classes.setdefault(id(node), []).append(cls)
+
+    def _start(self,
+            node: Node,
+            tagname: str,
+            suffix: str = '\n',
+            classes: Optional[List[str]] = None,
+            ids: Optional[List[str]] = None,
+            empty: bool = False,
+            **attributes: Any
+            ) -> Tag:
+        """
+        Add a tag for C{node} and make it the parent of the tags that are
+        added next.  The attributes are those that
+        L{_EpydocHTMLTranslator.starttag()} would write.
+
+        @param suffix: Text at the start of the tag's content.
+        @param classes: The classes of the node, if not its own.
+        @param ids: The ids of the node, if not its own.
+        """
+        atts: Dict[str, Any] = {}
+        for key, value in attributes.items():
+            key = key.lower()
+            if key == 'class':
+                value = f'rst-{value}'
+            elif key == 'href':
+                if value[:1] == '#':
+                    value = f'#rst-{value[1:]}'
+                else:
+                    # If it's an external link, open it in a new page.
+                    atts['target'] = '_top'
+            atts[key] = value
+        if re.match(r'^h\d+$', tagname):
+            atts['class'] = ' '.join([atts.get('class', ''), 'heading']).strip()
+
+        if classes is None:
+            classes = self._classes(node)
+        all_classes: List[str] = []
+        for cls in [f'rst-{cls}' for cls in classes] + atts.pop('class', '').split():
+            if cls.strip() and cls not in all_classes:
+                all_classes.append(cls)
+        if all_classes:
+            atts['class'] = ' '.join(all_classes)
+        if ids is None:
+            ids = node.get('ids', [])
+        ids = [f'rst-{id}' for id in ids]
+        if ids:
+            atts['id'] = ids[0]
+
+        tag = Tag(tagname, attributes={
+            name: _escape_control(_RE_WHITESPACE.sub(' ', str(value)))
+            for name, value in sorted(atts.items())
+            })
+        # Additional ids get empty spans.
+        spans = [tags.span(id=id) for id in ids[1:]]
+        if empty or isinstance(node, (docutils.nodes.bullet_list,
+                                      docutils.nodes.definition_list,
+                                      docutils.nodes.enumerated_list)):
+            self._add(*spans)
+            spans = []
+        self._add(tag)
+        self._stack.append(tag)
+        if suffix:
+            tag(suffix)
+        tag(*spans)
+        return tag
+
+    def _end(self, suffix: str = '\n') -> None:
+        """Stop adding tags to the tag that was started last.
+
+        @param suffix: Text to add after the tag.
+        """
+        self._stack.pop()
+        if suffix:
+            self._add(suffix)
+
+    def _set_first_last(self, node: Node) -> None:
+        children = [n for n in node if not isinstance(n, docutils.nodes.Invisible)]
+        if children:
+            self._add_class(children[0], 'first')
+            self._add_class(children[-1], 'last')
+
+    def unknown_visit(self, node: Node) -> None:
+        # The HTML translator changes the settings of the document and the
+        # attributes of the nodes it visits; restore them afterwards.
+        settings = self.document.settings
+        saved = [
+            (n, {key: value[:] if isinstance(value, list) else value
+                 for key, value in n.attributes.items()})
+            for n in node.traverse(docutils.nodes.Element)
+            ]
+        try:
+            # Render the node with the HTML translator, in the same state.
+            visitor = _EpydocHTMLTranslator(self.document, self._linker)
+            for name in ('section_level', 'compact_p', 'compact_simple',
+                         'compact_field_list', 'topic_classes'):
+                setattr(visitor, name, getattr(self, name))
+            node['classes'] = self._classes(node)
+            node.walkabout(visitor)
+        finally:
+            self.document.settings = settings
+            for n, attributes in saved:
+                n.attributes = attributes
+        self._add(*html2stan(''.join(visitor.body)).children)
+        raise SkipNode()
+
+    def visit_document(self, node: Node) -> None:
+        pass
+
+    def depart_document(self, node: Node) -> None:
+        pass
+
+    def visit_Text(self, node: Node) -> None:
+        self._add(_escape_control(node.astext()))
+
+    def depart_Text(self, node: Node) -> None:
+        pass
+
+    def _is_compact_paragraph(self, node: Node) -> bool:
+        parent = node.parent
+        if len(self.document.children) == 1 and self.document.children[0] is node:
+            return True
+        if isinstance(parent, (docutils.nodes.document, docutils.nodes.compound)):
+            # Never compact paragraphs in document or compound.
+            return False
+        for key, value in node.attlist():
+            if key != 'classes' and node.is_not_default(key):
+                # Attribute which needs to survive.
+                return False
+        if self._classes(node) not in ([], ['first'], ['last'], ['first', 'last']):
+            return False
+        first = isinstance(parent[0], docutils.nodes.label) # skip label
+        for child in parent.children[first:]:
+            # only first paragraph can be compact
+            if isinstance(child, docutils.nodes.Invisible):
+                continue
+            if child is node:
+                break
+            return False
+        parent_length = len([n for n in parent if not isinstance(
+            n, (docutils.nodes.Invisible, docutils.nodes.label))])
+        return bool(self.compact_simple
+                    or self.compact_field_list
+                    or self.compact_p and parent_length == 1)
+
+    def visit_paragraph(self, node: Node) -> None:
+        compact = self._is_compact_paragraph(node)
+        if not compact:
+            self._start(node, 'p', '')
+        self._context.append(compact)
+
+    def depart_paragraph(self, node: Node) -> None:
+        if not self._context.pop():
+            self._end()
+
+    def visit_emphasis(self, node: Node) -> None:
+        self._start(node, 'em', '')
+
+    def depart_emphasis(self, node: Node) -> None:
+        self._end('')
+
+    def visit_strong(self, node: Node) -> None:
+        self._start(node, 'strong', '')
+
+    def depart_strong(self, node: Node) -> None:
+        self._end('')
+
+    def visit_inline(self, node: Node) -> None:
+        self._start(node, 'span', '')
+
+    def depart_inline(self, node: Node) -> None:
+        self._end('')
+
+    def visit_subscript(self, node: Node) -> None:
+        if isinstance(node.parent, docutils.nodes.literal_block):
+            self._start(node, 'span', '', CLASS='subscript')
+        else:
+            self._start(node, 'sub', '')
+
+    def depart_subscript(self, node: Node) -> None:
+        self._end('')
+
+    def visit_superscript(self, node: Node) -> None:
+        if isinstance(node.parent, docutils.nodes.literal_block):
+            self._start(node, 'span', '', CLASS='superscript')
+        else:
+            self._start(node, 'sup', '')
+
+    def depart_superscript(self, node: Node) -> None:
+        self._end('')
+
+    def visit_literal(self, node: Node) -> None:
+        classes = self._classes(node)
+        if 'code' in classes:
+            self._start(node, 'code', '',
+                        classes=[cls for cls in classes if cls != 'code'])
+            return
+        tag = self._start(node, 'tt', '', CLASS='docutils literal')
+        for token in HTMLTranslator.words_and_spaces.findall(node.astext()):
+            if token.strip():
+                # Protect text like "--an-option" and the regular expression
+                # ``[+]?(\d+(\.\d*)?|\.\d+)`` from bad line wrapping
+                if HTMLTranslator.in_word_wrap_point.search(token):
+                    tag(tags.span(_escape_control(token), class_='pre'))
+                else:
+                    tag(_escape_control(token))
+            elif token in ('\n', ' '):
+                # Allow breaks at whitespace:
+                tag(token)
+            else:
+                # Protect runs of multiple spaces; the last space can wrap:
+                tag('\N{NO-BREAK SPACE}' * (len(token) - 1) + ' ')
+        self._end('')
+        raise SkipNode()
+
+    def depart_literal(self, node: Node) -> None:
+        # Only reached for the "code" role.
+        self._end('')
+
+    def visit_title_reference(self, node: Node) -> None:
+        self._add(_title_reference_to_stan(node, self._linker))
+        raise SkipNode()
+
+    def visit_reference(self, node: Node) -> None:
+        cls = 'reference'
+        if 'refuri' in node:
+            href = node['refuri']
+            cls += ' external'
+        else:
+            href = '#' + node['refid']
+            cls += ' internal'
+        if not isinstance(node.parent, docutils.nodes.TextElement):
+            cls += ' image-reference'
+        self._start(node, 'a', '', CLASS=cls, href=href)
+
+    def depart_reference(self, node: Node) -> None:
+        if isinstance(node.parent, docutils.nodes.TextElement):
+            self._end('')
+        else:
+            self._end()
+
+    def visit_target(self, node: Node) -> None:
+        started = not ('refuri' in node or 'refid' in node or 'refname' in node)
+        if started:
+            self._start(node, 'span', '', CLASS='target')
+        self._context.append(started)
+
+    def depart_target(self, node: Node) -> None:
+        if self._context.pop():
+            self._end('')
+
+    def visit_substitution_definition(self, node: Node) -> None:
+        raise SkipNode()
+
+    def visit_literal_block(self, node: Node) -> None:
+        self._start(node, 'pre', CLASS='literal-block')
+
+    def depart_literal_block(self, node: Node) -> None:
+        self._add('\n')
+        self._end()
+
+    def visit_doctest_block(self, node: Node) -> None:
+        self._add(_doctest_block_to_stan(node))
+        raise SkipNode()
+
+    def visit_block_quote(self, node: Node) -> None:
+        self._start(node, 'blockquote')
+
+    def depart_block_quote(self, node: Node) -> None:
+        self._end()
+
+    def visit_attribution(self, node: Node) -> None:
+        prefix, suffix = self._attribution
+        self._context.append(suffix)
+        self._start(node, 'p', prefix, CLASS='attribution')
+
+    def depart_attribution(self, node: Node) -> None:
+        suffix = self._context.pop()
+        if suffix:
+            self._add(suffix)
+        self._end()
+
+    def _is_compactable(self, node: Node) -> bool:
+        classes = self._classes(node)
+        if 'compact' in classes:
+            return True
+        if not self._compact_lists or 'open' in classes:
+            return False
+        if self.compact_simple or self.topic_classes == ['contents']:
+            return True
+        visitor = _SimpleListChecker(self.document)
+        try:
+            node.walk(visitor)
+        except docutils.nodes.NodeFound:
+            return False
+        else:
+            return True
+
+    def _start_list(self, node: Node, tagname: str, atts: Dict[str, Any]) -> None:
+        old_compact_simple = self.compact_simple
+        self._context.append((self.compact_simple, self.compact_p))
+        self.compact_p = None
+        self.compact_simple = self._is_compactable(node)
+        if self.compact_simple and not old_compact_simple:
+            atts['class'] = (atts.get('class', '') + ' simple').strip()
+        self._start(node, tagname, **atts)
+
+    def _end_list(self) -> None:
+        self.compact_simple, self.compact_p = self._context.pop()
+        self._end()
+
+    def visit_bullet_list(self, node: Node) -> None:
+        self._start_list(node, 'ul', {})
+
+    def depart_bullet_list(self, node: Node) -> None:
+        self._end_list()
+
+    def visit_enumerated_list(self, node: Node) -> None:
+        atts: Dict[str, Any] = {}
+        if 'start' in node:
+            atts['start'] = node['start']
+        if 'enumtype' in node:
+            atts['class'] = node['enumtype']
+        self._start_list(node, 'ol', atts)
+
+    def depart_enumerated_list(self, node: Node) -> None:
+        self._end_list()
+
+    def visit_list_item(self, node: Node) -> None:
+        self._start(node, 'li', '')
+        if len(node):
+            self._add_class(node[0], 'first')
+
+    def depart_list_item(self, node: Node) -> None:
+        self._end()
+
+    def visit_definition_list(self, node: Node) -> None:
+        self._start(node, 'dl', CLASS='docutils')
+
+    def depart_definition_list(self, node: Node) -> None:
+        self._end()
+
+    def visit_definition_list_item(self, node: Node) -> None:
+        pass
+
+    def depart_definition_list_item(self, node: Node) -> None:
+        pass
+
+    def visit_term(self, node: Node) -> None:
+        # The term gets the classes and ids of the definition list item.
+        item = node.parent
+        classes = item.get('classes', []) + self._classes(node)
+        ids = item.get('ids', []) + node.get('ids', [])
+        self._start(node, 'dt', '', classes=classes, ids=ids)
+
+    def depart_term(self, node: Node) -> None:
+        # The term is ended by the definition, in case there's a classifier.
+        pass
+
+    def visit_classifier(self, node: Node) -> None:
+        self._add(' ', tags.span(':', class_='classifier-delimiter'), ' ')
+        self._start(node, 'span', '', CLASS='classifier')
+
+    def depart_classifier(self, node: Node) -> None:
+        self._end('')
+
+    def visit_definition(self, node: Node) -> None:
+        # End the term.
+        self._end()
+        self._start(node, 'dd', '')
+        self._set_first_last(node)
+
+    def depart_definition(self, node: Node) -> None:
+        self._end()
+
+    def visit_section(self, node: Node) -> None:
+        self.section_level += 1
+        self._start(node, 'div', CLASS='section')
+
+    def depart_section(self, node: Node) -> None:
+        self.section_level -= 1
+        self._end()
+
+    def visit_title(self, node: Node) -> None:
+        parent = node.parent
+        if isinstance(parent, docutils.nodes.document):
+            # The HTML translator writes the document title, and everything
+            # before it, to its header instead of the body.
+            del self.root.children[:]
+            raise SkipNode()
+        if isinstance(parent, docutils.nodes.Admonition):
+            self._start(node, 'p', '', CLASS='admonition-title')
+            self._context.append(False)
+            return
+        if isinstance(parent, docutils.nodes.table):
+            self._start(node, 'caption', '')
+            self._context.append(False)
+            return
+        if not isinstance(parent, docutils.nodes.section):
+            self.unknown_visit(node)
+        h_level = self.section_level + self._initial_header_level - 1
+        self._start(node, f'h{h_level}', '')
+        if node.hasattr('refid'):
+            self._start(node, 'a', '', classes=[], ids=[],
+                        CLASS='toc-backref', href='#' + node['refid'])
+            self._context.append(True)
+        else:
+            self._context.append(False)
+
+    def depart_title(self, node: Node) -> None:
+        if self._context.pop():
+            self._end('')
+        self._end()
+
+    def visit_subtitle(self, node: Node) -> None:
+        if isinstance(node.parent, docutils.nodes.document):
+            del self.root.children[:]
+            raise SkipNode()
+        self.unknown_visit(node)
+
+    def visit_rubric(self, node: Node) -> None:
+        self._start(node, 'p', '', CLASS='rubric')
+
+    def depart_rubric(self, node: Node) -> None:
+        self._end()
+
+    def visit_transition(self, node: Node) -> None:
+        self._start(node, 'hr', '', empty=True, CLASS='docutils')
+        self._end()
+        raise SkipNode()
+
+    def visit_line_block(self, node: Node) -> None:
+        self._start(node, 'div', CLASS='line-block')
+
+    def depart_line_block(self, node: Node) -> None:
+        self._end()
+
+    def visit_line(self, node: Node) -> None:
+        self._start(node, 'div', '', CLASS='line')
+        if not len(node):
+            self._add(tags.br())
+
+    def depart_line(self, node: Node) -> None:
+        self._end()
+
+    def visit_admonition(self, node: Node) -> None:
+        self._start(node, 'div', classes=['admonition'] + self._classes(node))
+        self._set_first_last(node)
+
+    def depart_admonition(self, node: Node) -> None:
+        self._end()
+
+    def _start_table_body(self, valign: str) -> None:
+        """Start a table body that is not written for a node."""
+        tbody = Tag('tbody', attributes={'valign': valign})
+        self._add(tbody)
+        self._stack.append(tbody)
+        tbody('\n')
+
+    def visit_field_list(self, node: Node) -> None:
+        self._context.append((self.compact_field_list, self.compact_p))
+        self.compact_p = None
+        classes = self._classes(node)
+        if 'compact' in classes:
+            self.compact_field_list = True
+        elif self._compact_field_lists and 'open' not in classes:
+            self.compact_field_list = True
+        if self.compact_field_list:
+            for field in node:
+                children = [n for n in field[-1]
+                            if not isinstance(n, docutils.nodes.Invisible)]
+                if len(children) > 1 or children and not isinstance(
+                        children[0], (docutils.nodes.paragraph,
+                                      docutils.nodes.line_block)):
+                    self.compact_field_list = False
+                    break
+        self._start(node, 'table', frame='void', rules='none',
+                    CLASS='docutils field-list')
+        self._add(tags.col(class_='field-name'), '\n',
+                  tags.col(class_='field-body'), '\n')
+        self._start_table_body('top')
+
+    def depart_field_list(self, node: Node) -> None:
+        self._end()
+        self._end()
+        self.compact_field_list, self.compact_p = self._context.pop()
+
+    def visit_field(self, node: Node) -> None:
+        self._start(node, 'tr', '', CLASS='field')
+
+    def depart_field(self, node: Node) -> None:
+        self._end()
+
+    def visit_field_name(self, node: Node) -> None:
+        # A long name gets a row of its own.
+        long_name = bool(self._field_name_limit
+                         and len(node.astext()) > self._field_name_limit)
+        if long_name:
+            self._start(node, 'th', '', CLASS='field-name', colspan=2)
         else:
-            self.body.append(flatten(colorize_doctest(pysrc)))
+            self._start(node, 'th', '', CLASS='field-name')
+        self._context.append(long_name)
+
+    def depart_field_name(self, node: Node) -> None:
+        self._add(':')
+        self._end('')
+        if self._context.pop():
+            self._end()
+            self._start(node.parent, 'tr', '', CLASS='field')
+            self._add(tags.td('\N{NO-BREAK SPACE}'))
+
+    def visit_field_body(self, node: Node) -> None:
+        self._start(node, 'td', '', CLASS='field-body')
+        children = [n for n in node if not isinstance(n, docutils.nodes.Invisible)]
+        if children:
+            self._add_class(children[0], 'first')
+            field = node.parent
+            if (self.compact_field_list
+                    or isinstance(field.parent, docutils.nodes.docinfo)
+                    or field.parent.index(field) == len(field.parent) - 1):
+                self._add_class(children[-1], 'last')
+
+    def depart_field_body(self, node: Node) -> None:
+        self._end()
+
+    def visit_table(self, node: Node) -> None:
+        self._context.append(self.compact_p)
+        self.compact_p = True
+        atts: Dict[str, Any] = {'border': 1}
+        classes = ['docutils', self._table_style]
+        if 'align' in node:
+            classes.append(f"align-{node['align']}")
+        if 'width' in node:
+            atts['style'] = f"width: {node['width']}"
+        self._start(node, 'table', CLASS=' '.join(classes), **atts)
+
+    def depart_table(self, node: Node) -> None:
+        self.compact_p = self._context.pop()
+        self._end()
+
+    def visit_tgroup(self, node: Node) -> None:
+        self._colspecs = []
+        self._stubs[id(node)] = []
+
+    def depart_tgroup(self, node: Node) -> None:
+        pass
+
+    def visit_colspec(self, node: Node) -> None:
+        self._colspecs.append(node)
+        self._stubs[id(node.parent)].append(node.attributes.get('stub'))
+
+    def depart_colspec(self, node: Node) -> None:
+        # Write the column widths after the last column.
+        if isinstance(node.next_node(descend=False, siblings=True),
+                      docutils.nodes.colspec):
+            return
+        table_classes = self._classes(node.parent.parent)
+        if 'colwidths-auto' in table_classes or (
+                'colwidths-auto' in self._table_style
+                and 'colwidths-given' not in table_classes):
+            return
+        total_width = sum(colspec['colwidth'] for colspec in self._colspecs)
+        self._start(node, 'colgroup')
+        for colspec in self._colspecs:
+            colwidth = int(colspec['colwidth'] * 100.0 / total_width + 0.5)
+            self._start(colspec, 'col', '', empty=True, width=f'{colwidth}%')
+            self._end()
+        self._end()
+
+    def visit_thead(self, node: Node) -> None:
+        self._start(node, 'thead', valign='bottom')
+
+    def depart_thead(self, node: Node) -> None:
+        self._end()
+
+    def visit_tbody(self, node: Node) -> None:
+        self._start(node, 'tbody', valign='top')
+
+    def depart_tbody(self, node: Node) -> None:
+        self._end()
+
+    def visit_row(self, node: Node) -> None:
+        self._start(node, 'tr', '')
+        # The number of the next column.
+        self._context.append(0)
+
+    def depart_row(self, node: Node) -> None:
+        self._context.pop()
+        self._end()
+
+    def visit_entry(self, node: Node) -> None:
+        row = node.parent
+        column = self._context[-1]
+        classes = []
+        if isinstance(row.parent, docutils.nodes.thead):
+            classes.append('head')
+        if self._stubs[id(row.parent.parent)][column]:
+            classes.append('stub')
+        atts: Dict[str, Any] = {}
+        if classes:
+            tagname = 'th'
+            atts['class'] = ' '.join(classes)
+        else:
+            tagname = 'td'
+        column += 1
+        if 'morerows' in node:
+            atts['rowspan'] = node['morerows'] + 1
+        if 'morecols' in node:
+            atts['colspan'] = node['morecols'] + 1
+            column += node['morecols']
+        self._context[-1] = column
+        self._start(node, tagname, '', **atts)
+        if len(node) == 0:
+            self._add('\N{NO-BREAK SPACE}')
+        self._set_first_last(node)
+
+    def depart_entry(self, node: Node) -> None:
+        self._end()
+
+    def visit_footnote(self, node: Node) -> None:
+        self._start(node, 'table', CLASS='docutils footnote',
+                    frame='void', rules='none')
+        self._add(tags.colgroup(tags.col(class_='label'), tags.col()), '\n')
+        self._start_table_body('top')
+        row = Tag('tr')
+        self._add(row)
+        self._stack.append(row)
+
+        # The back references are written around the label.
+        backrefs = node['backrefs']
+        if self._footnote_backlinks and len(backrefs) == 1:
+            backlink = Tag('a', attributes={
+                'class': 'fn-backref', 'href': f'#{backrefs[0]}'})
+            self._context.append((backlink, ''))
+        elif self._footnote_backlinks and backrefs:
+            backlinks = Tag('em')('(')
+            for i, backref in enumerate(backrefs, 1):
+                if i > 1:
+                    backlinks(', ')
+                backlinks(Tag('a', attributes={
+                    'class': 'fn-backref', 'href': f'#{backref}'})(str(i)))
+            backlinks(')')
+            self._context.append((None, [backlinks, ' ']))
+        else:
+            self._context.append((None, ''))
+        if len(node) > 1:
+            # With back references before the text, the top margin of
+            # the text is kept.
+            if not (self._footnote_backlinks and len(backrefs) > 1):
+                self._add_class(node[1], 'first')
+            self._add_class(node[-1], 'last')
+
+    def depart_footnote(self, node: Node) -> None:
+        self._end('')
+        self._end()
+        self._end()
+        self._end()
+
+    def visit_label(self, node: Node) -> None:
+        self._start(node, 'td', '', CLASS='label')
+        backlink, _ = self._context[-1]
+        if backlink is not None:
+            self._add(backlink)
+            self._stack.append(backlink)
+        self._add('[')
+
+    def depart_label(self, node: Node) -> None:
+        backlink, backlinks = self._context.pop()
+        self._add(']')
+        if backlink is not None:
+            self._stack.pop()
+        self._end('')
+        cell = Tag('td')
+        self._add(cell)
+        self._stack.append(cell)
+        self._add(*backlinks)
+
+    def visit_footnote_reference(self, node: Node) -> None:
+        href = '#' + node['refid']
+        if self._footnote_references == 'brackets':
+            self._start(node, 'a', '[', CLASS='footnote-reference', href=href)
+            self._context.append(False)
+        else:
+            self._start(node, 'a', '', CLASS='footnote-reference', href=href)
+            sup = Tag('sup')
+            self._add(sup)
+            self._stack.append(sup)
+            self._context.append(True)
+
+    def depart_footnote_reference(self, node: Node) -> None:
+        if self._context.pop():
+            self._stack.pop()
+        else:
+            self._add(']')
+        self._end('')
+
+    def visit_generated(self, node: Node) -> None:
+        pass
+
+    def depart_generated(self, node: Node) -> None:
+        pass
+
+    def visit_image(self, node: Node) -> None:
+        atts: Dict[str, Any] = {}
+        uri = node['uri']
+        ext = os.path.splitext(uri)[1].lower()
+        if ext in _OBJECT_IMAGE_TYPES:
+            atts['data'] = uri
+            atts['type'] = _OBJECT_IMAGE_TYPES[ext]
+        else:
+            atts['src'] = uri
+            atts['alt'] = node.get('alt', uri)
+        for name in ('width', 'height'):
+            if name in node:
+                atts[name] = node[name]
+        # Only sizes given in the docstring are scaled: the image files
+        # are not read.
+        if 'scale' in node:
+            for name in ('width', 'height'):
+                if name in atts:
+                    match = re.match(r'([0-9.]+)(\S*)$', atts[name])
+                    assert match
+                    atts[name] = '%s%s' % (
+                        float(match.group(1)) * (float(node['scale']) / 100),
+                        match.group(2))
+        style = []
+        for name in ('width', 'height'):
+            if name in atts:
+                if re.match(r'^[0-9.]+$', atts[name]):
+                    # Interpret unitless values as pixels.
+                    atts[name] += 'px'
+                style.append(f'{name}: {atts.pop(name)};')
+        if style:
+            atts['style'] = ' '.join(style)
+        parent = node.parent
+        if isinstance(parent, docutils.nodes.TextElement) or (
+                isinstance(parent, docutils.nodes.reference)
+                and not isinstance(parent.parent, docutils.nodes.TextElement)):
+            # Inline, or surrounded by a link.
+            suffix = ''
+        else:
+            suffix = '\n'
+        if 'align' in node:
+            atts['class'] = f"align-{node['align']}"
+        if ext in _OBJECT_IMAGE_TYPES:
+            self._start(node, 'object', suffix, **atts)
+            self._add(node.get('alt', uri))
+        else:
+            self._start(node, 'img', '', empty=True, **atts)
+        self._end(suffix)
         raise SkipNode()
 
+    def visit_figure(self, node: Node) -> None:
+        atts: Dict[str, Any] = {'class': 'figure'}
+        if node.get('width'):
+            atts['style'] = f"width: {node['width']}"
+        if node.get('align'):
+            atts['class'] += f" align-{node['align']}"
+        self._start(node, 'div', **atts)
+
+    def depart_figure(self, node: Node) -> None:
+        self._end()
+
+    def visit_caption(self, node: Node) -> None:
+        self._start(node, 'p', '', CLASS='caption')
+
+    def depart_caption(self, node: Node) -> None:
+        self._end()
+
+    def visit_legend(self, node: Node) -> None:
+        self._start(node, 'div', CLASS='legend')
+
+    def depart_legend(self, node: Node) -> None:
+        self._end()
+
 class PythonCodeDirective(Directive):
     """
     A custom restructuredtext directive which can be used to display
@@ -10,16 +10,22 @@ from typing import (
 )
 import ast
 import itertools
+import pickle
 
 import astor
 import attr
 
-from pydoctor import model
+from pydoctor import buildcache, model
 from pydoctor.epydoc.markup import Field as EpydocField, ParseError
 from twisted.web.template import Tag, tags
 from pydoctor.epydoc.markup import DocstringLinker, ParsedDocstring
 import pydoctor.epydoc.markup.plaintext
 
+try:
+    from docutils import __version__ as _docutils_version
+except ImportError:
+    _docutils_version = ''
+
 
 def get_parser(obj: model.Documentable) -> Callable[[str, List[ParseError]], ParsedDocstring]:
     formatname = obj.system.options.docformat
@@ -54,7 +60,7 @@ class _EpydocLinker(DocstringLinker):
     def look_for_name(self,
             name: str,
             candidates: Iterable[model.Documentable],
-            lineno: int
+            problems: List[str]
             ) -> Optional[model.Documentable]:
         part0 = name.split('.')[0]
         potential_targets = []
@@ -67,11 +73,10 @@ class _EpydocLinker(DocstringLinker):
         if len(potential_targets) == 1:
             return potential_targets[0]
         elif len(potential_targets) > 1:
-            self.obj.report(
+            problems.append(
                 "ambiguous ref to %s, could be %s" % (
                     name,
-                    ', '.join(ob.fullName() for ob in potential_targets)),
-                'resolve_identifier_xref', lineno)
+                    ', '.join(ob.fullName() for ob in potential_targets)))
         return None
 
     def look_for_intersphinx(self, name: str) -> Optional[str]:
@@ -92,6 +97,41 @@ class _EpydocLinker(DocstringLinker):
         return self.look_for_intersphinx(fullID)
 
     def resolve_identifier_xref(self, identifier: str, lineno: int) -> str:
+        system = self.obj.system
+        cache = system._xrefCache
+        key = (self.obj, identifier)
+        resolved = None if cache is None else cache.get(key)
+        if resolved is None:
+            system.xrefCacheMisses += 1
+            resolved = self._resolve_identifier_xref(identifier)
+            if cache is not None:
+                cache[key] = resolved
+        else:
+            system.xrefCacheHits += 1
+            if model.checkCaches:
+                expected = self._resolve_identifier_xref(identifier)
+                assert resolved == expected, \
+                    f"cached link target of {identifier!r} in {self.obj.fullName()} " \
+                    f"is {resolved}, should be {expected}"
+
+        # Problems are reported for every occurrence, cached or not.
+        url, problems = resolved
+        for problem in problems:
+            self._report(problem, lineno)
+        if url is None:
+            raise LookupError(identifier)
+        return url
+
+    def _report(self, problem: str, lineno: int) -> None:
+        self.obj.report(problem, 'resolve_identifier_xref', lineno)
+
+    def _resolve_identifier_xref(self, identifier: str) -> model.XrefResult:
+        """Find the URL that C{identifier} links to from our object.
+
+        @return: The URL, or L{None} if the link target was not found, and
+            the problems that should be reported where the link is used.
+        """
+        problems: List[str] = []
 
         # There is a lot of DWIM here. Look for a global match first,
         # to reduce the chance of a false positive.
@@ -99,7 +139,7 @@ class _EpydocLinker(DocstringLinker):
         # Check if 'identifier' is the fullName of an object.
         target = self.obj.system.objForFullName(identifier)
         if target is not None:
-            return target.url
+            return target.url, problems
 
         # Check if the fullID exists in an intersphinx inventory.
         fullID = self.obj.expandName(identifier)
@@ -110,7 +150,7 @@ class _EpydocLinker(DocstringLinker):
             # try our luck with 'identifier'.
             target_url = self.look_for_intersphinx(identifier)
         if target_url:
-            return target_url
+            return target_url, problems
 
         # Since there was no global match, go look for the name in the
         # context where it was used.
@@ -122,29 +162,40 @@ class _EpydocLinker(DocstringLinker):
         while src is not None:
             target = src.resolveName(identifier)
             if target is not None:
-                return target.url
+                return target.url, problems
             src = src.parent
 
         # Walk up the object tree again and see if 'identifier' refers to an
         # object in an "uncle" object.  (So if p.m1 has a class C, the
         # docstring for p.m2 can say L{C} to refer to the class in m1).
         # If at any level 'identifier' refers to more than one object, complain.
+        # Only objects that contain the first part of 'identifier' can match,
+        # so look those up instead of trying every object.
+        containers = self.obj.system.objectsContaining(identifier.split('.')[0])
+        containersByParent: Dict[model.Documentable, List[model.Documentable]] = {}
+        for c in containers:
+            if c.parent is not None:
+                containersByParent.setdefault(c.parent, []).append(c)
         src = self.obj
         while src is not None:
-            target = self.look_for_name(identifier, src.contents.values(), lineno)
+            contents = src.contents
+            target = self.look_for_name(identifier, [
+                c for c in containersByParent.get(src, ())
+                if contents.get(c.name) is c
+                ], problems)
             if target is not None:
-                return target.url
+                return target.url, problems
             src = src.parent
 
         # Examine every module and package in the system and see if 'identifier'
         # names an object in each one.  Again, if more than one object is
         # found, complain.
         target = self.look_for_name(identifier, itertools.chain(
-            self.obj.system.objectsOfType(model.Module),
-            self.obj.system.objectsOfType(model.Package)),
-            lineno)
+            (c for c in containers if isinstance(c, model.Module)),
+            (c for c in containers if isinstance(c, model.Package))),
+            problems)
         if target is not None:
-            return target.url
+            return target.url, problems
 
         message = f'Cannot find link target for "{fullID}"'
         if identifier != fullID:
@@ -152,8 +203,20 @@ class _EpydocLinker(DocstringLinker):
         root_idx = fullID.find('.')
         if root_idx != -1 and fullID[:root_idx] not in self.obj.system.root_names:
             message += ' (you can link to external docs with --intersphinx)'
-        self.obj.report(message, 'resolve_identifier_xref', lineno)
-        raise LookupError(identifier)
+        problems.append(message)
+        return None, problems
+
+
+class _SummaryLinker(_EpydocLinker):
+    """Linker that records the problems with links in a summary, which are
+    reported every time the cached summary is used."""
+
+    def __init__(self, obj: model.Documentable):
+        super().__init__(obj)
+        self.problems: List[Tuple[str, int]] = []
+
+    def _report(self, problem: str, lineno: int) -> None:
+        self.problems.append((problem, lineno))
 
 
 @attr.s(auto_attribs=True)
@@ -477,12 +540,73 @@ def parse_docstring(
         source: model.Documentable,
         ) -> ParsedDocstring:
     """Parse a docstring.
+
+    A docstring is parsed the first time it is seen and kept in pickled
+    form, so later occurrences in the same run only need to unpickle it.
+    With C{--build-cache-dir}, the pickled docstring is also kept between
+    runs for as long as it doesn't change. Each object still gets its own
+    copy of the parsed docstring, and parse errors are reported for each
+    object.
+
     @param obj: The object we're parsing the documentation for.
     @param doc: The docstring.
     @param source: The object on which the docstring is defined.
         This can differ from C{obj} if the docstring is inherited.
     """
+    pdoc, errs = _load_docstring(obj, doc)
+    if errs:
+        reportErrors(source, errs)
+    return pdoc
+
+def _load_docstring(
+        obj: model.Documentable,
+        doc: str
+        ) -> Tuple[ParsedDocstring, Sequence[ParseError]]:
+    """Parse a docstring like L{parse_docstring()}, but return the parse
+    errors instead of reporting them.
+    """
+    system = obj.system
+    docformat = system.options.docformat
+    key = (docformat, doc)
+    data = system._parsedDocstrings.get(key)
+    cache_path = None
+    if data is None:
+        cache_dir = system.options.buildcachedir
+        if cache_dir is not None:
+            cache_path = cache_dir / (
+                buildcache.cacheKey(doc.encode('utf-8', 'surrogatepass'),
+                                    docformat, _docutils_version)
+                + '.docstring')
+            data = buildcache.readEntry(cache_path)
+
+    parsed: Optional[Tuple[ParsedDocstring, Sequence[ParseError]]] = None
+    if data is not None:
+        try:
+            parsed = pickle.loads(data)
+        except Exception:
+            # Corrupt or incompatible entries are rewritten below.
+            pass
+        else:
+            system._parsedDocstrings[key] = data
+    if parsed is None:
+        parsed = _parse_docstring(obj, doc)
+        # Pickle the result before it is handed out: the parsed docstring
+        # is changed while it is being used, so it cannot be copied later.
+        try:
+            data = pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Parsed docstrings that cannot be copied are not shared.
+            data = None
+        else:
+            if cache_path is not None:
+                buildcache.writeEntry(cache_path, data)
+        system._parsedDocstrings[key] = data
+    return parsed
 
+def _parse_docstring(
+        obj: model.Documentable,
+        doc: str
+        ) -> Tuple[ParsedDocstring, Sequence[ParseError]]:
     parser = get_parser(obj)
     errs: List[ParseError] = []
     try:
@@ -490,9 +614,20 @@ def parse_docstring(
     except Exception as e:
         errs.append(ParseError(f'{e.__class__.__name__}: {e}', 1))
         pdoc = pydoctor.epydoc.markup.plaintext.parse_docstring(doc, errs)
-    if errs:
-        reportErrors(source, errs)
-    return pdoc
+    return pdoc, errs
+
+
+def ensure_parsed_docstring(obj: model.Documentable) -> Optional[ParsedDocstring]:
+    """Parse the docstring of C{obj}, unless that has already been done.
+
+    @return: The parsed docstring, or L{None} if C{obj} is undocumented.
+    """
+    if obj.parsed_docstring is None:
+        doc, source = get_docstring(obj)
+        if doc is not None:
+            assert source is not None
+            obj.parsed_docstring = parse_docstring(obj, doc, source)
+    return obj.parsed_docstring
 
 
 def format_docstring(obj: model.Documentable) -> Tag:
@@ -514,8 +649,7 @@ def format_docstring(obj: model.Documentable) -> Tag:
             assert source is not None
 
     if pdoc is None and doc is not None:
-        pdoc = parse_docstring(obj, doc, source)
-        obj.parsed_docstring = pdoc
+        pdoc = ensure_parsed_docstring(obj)
 
     ret: Tag = tags.div
     if pdoc is None:
@@ -549,9 +683,16 @@ def format_docstring(obj: model.Documentable) -> Tag:
 
 
 def format_summary(obj: model.Documentable) -> Tag:
-    """Generate an shortened HTML representation of a docstring."""
+    """Generate an shortened HTML representation of a docstring.
+
+    The summary is rendered once per docstring: it is shown in many places,
+    such as the index pages and the tables of every subclass. Problems with
+    parsing it and with its links are reported every time it is used, as
+    if it was rendered again.
+    """
 
     doc, source = get_docstring(obj)
+    pdoc: Optional[ParsedDocstring]
     if doc is None:
         # Attributes can be documented as fields in their parent's docstring.
         if isinstance(obj, model.Attribute):
@@ -560,35 +701,71 @@ def format_summary(obj: model.Documentable) -> Tag:
             pdoc = None
         if pdoc is None:
             return format_undocumented(obj)
-        source = obj.parent
-        # Since obj is an Attribute, it has a parent.
-        assert source is not None
+        key: object = pdoc
     else:
         # Tell mypy that if we found a docstring, we also have its source.
         assert source is not None
-        # Use up to three first non-empty lines of doc string as summary.
-        lines = [
-            line.strip()
-            for line in itertools.takewhile(
-                lambda line: line.strip(),
-                itertools.dropwhile(lambda line: not line.strip(), doc.split('\n'))
-                )
-            ]
-        if len(lines) > 3:
-            return tags.span(class_='undocumented')("No summary") # type: ignore[no-any-return]
-        pdoc = parse_docstring(obj, ' '.join(lines), source)
+        if source is not obj:
+            # An inherited docstring has the same summary as its source.
+            return format_summary(source)
+        key = doc
+
+    # Attributes documented by a field are reported on their parent.
+    reporter = obj if doc is not None else obj.parent
+    assert reporter is not None
+
+    cached = obj._summary
+    if cached is None or cached[0] != key:
+        summary: Tag
+        errs: Sequence[ParseError] = ()
+        problems: Sequence[Tuple[str, int]] = ()
+        if doc is None:
+            assert pdoc is not None
+            summary, problems = _summary_to_stan(pdoc, reporter)
+        else:
+            # Use up to three first non-empty lines of doc string as summary.
+            lines = [
+                line.strip()
+                for line in itertools.takewhile(
+                    lambda line: line.strip(),
+                    itertools.dropwhile(lambda line: not line.strip(), doc.split('\n'))
+                    )
+                ]
+            if len(lines) > 3:
+                summary = tags.span(class_='undocumented')("No summary")
+            else:
+                pdoc, errs = _load_docstring(obj, ' '.join(lines))
+                summary, problems = _summary_to_stan(pdoc, obj)
+        cached = obj._summary = (key, summary, errs, problems)
 
+    _, summary, errs, problems = cached
+    if errs:
+        reportErrors(obj, errs)
+    for problem, lineno in problems:
+        reporter.report(problem, 'resolve_identifier_xref', lineno)
+    return summary
+
+def _summary_to_stan(
+        pdoc: ParsedDocstring,
+        source: model.Documentable
+        ) -> Tuple[Tag, Sequence[Tuple[str, int]]]:
+    """Render a summary.
+
+    @return: The summary and the problems with its links, which have not
+        been reported yet.
+    """
+    linker = _SummaryLinker(source)
     try:
-        stan = pdoc.to_stan(_EpydocLinker(source))
+        stan = pdoc.to_stan(linker)
     except Exception:
         # This problem will likely be reported by the full docstring as well,
         # so don't spam the log.
-        return tags.span(class_='undocumented')("Broken description") # type: ignore[no-any-return]
+        return tags.span(class_='undocumented')("Broken description"), ()
 
     content = [stan] if stan.tagName else stan.children
     if content and isinstance(content[0], Tag) and content[0].tagName == 'p':
         content = content[0].children
-    return tags.span(*content) # type: ignore[no-any-return]
+    return tags.span(*content), linker.problems
 
 
 def format_undocumented(obj: model.Documentable) -> Tag:
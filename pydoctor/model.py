@@ -9,24 +9,28 @@ being documented -- a System is a bad of Documentables, in some sense.
 import ast
 import datetime
 import importlib
+import heapq
 import inspect
+import itertools
 import os
 import platform
 import sys
 import types
+from collections import defaultdict
 from enum import Enum
 from inspect import Signature
 from optparse import Values
 from pathlib import Path
 from typing import (
-    TYPE_CHECKING, Any, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Type, TypeVar, Union
+    TYPE_CHECKING, Any, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Type, TypeVar, Union, cast
 )
 from urllib.parse import quote
 
-from pydoctor.epydoc.markup import ParsedDocstring
+from pydoctor.epydoc.markup import ParseError, ParsedDocstring
 from pydoctor.sphinx import CacheT, SphinxInventory
 
 if TYPE_CHECKING:
+    from twisted.web.template import Tag
     from pydoctor.astbuilder import ASTBuilder
 else:
     ASTBuilder = object
@@ -53,6 +57,13 @@ line in the string, rather than the first line.
 """
 
 
+checkCaches = os.environ.get('PYDOCTOR_CHECK_CACHES', '') not in ('', '0')
+"""If true, cached values are checked against a recomputation every time
+they are used. This is meant for finding missing cache invalidations;
+set the C{PYDOCTOR_CHECK_CACHES} environment variable to enable it.
+"""
+
+
 class DocLocation(Enum):
     OWN_PAGE = 1
     PARENT_PAGE = 2
@@ -98,7 +109,32 @@ class Documentable:
     docstring_lineno = 0
     linenumber = 0
     sourceHref: Optional[str] = None
-    kind: Optional[str]
+    _kind: Optional[str]
+    _fullName: Optional[str] = None
+    _summary: Optional[Tuple[
+        object, 'Tag', Sequence[ParseError], Sequence[Tuple[str, int]]
+        ]] = None
+    """The summary of our docstring as rendered by
+    L{epydoc2stan.format_summary()}, with the docstring it was made from,
+    the errors from parsing it and the problems with its links."""
+
+    @property
+    def kind(self) -> Optional[str]:
+        return self._kind
+
+    @kind.setter
+    def kind(self, kind: Optional[str]) -> None:
+        self._kind = kind
+        # The privacy class depends on the kind.
+        self.system._privacyOutdated = True
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # Subclasses can still set their kind as a class attribute, which
+        # would otherwise hide the property.
+        if 'kind' in cls.__dict__ and not isinstance(cls.__dict__['kind'], property):
+            cls._kind = cls.__dict__['kind']
+            del cls.kind
 
     @property
     def documentation_location(self) -> DocLocation:
@@ -200,6 +236,16 @@ class Documentable:
             assert False, location
 
     def fullName(self) -> str:
+        fullName = self._fullName
+        if fullName is None:
+            fullName = self._fullName = self._computeFullName()
+        elif checkCaches:
+            expected = self._computeFullName()
+            assert fullName == expected, \
+                f"cached full name {fullName!r} should be {expected!r}"
+        return fullName
+
+    def _computeFullName(self) -> str:
         parent = self.parent
         if parent is not None:
             if (parent.parent and isinstance(parent.parent, Package)
@@ -243,12 +289,16 @@ class Documentable:
         self._handle_reparenting_post()
 
     def _handle_reparenting_pre(self) -> None:
-        del self.system.allobjects[self.fullName()]
+        self.system._removeObject(self.fullName())
         for o in self.contents.values():
             o._handle_reparenting_pre()
 
     def _handle_reparenting_post(self) -> None:
-        self.system.allobjects[self.fullName()] = self
+        # Our name or one of our parents has changed.
+        self._fullName = None
+        self.system._privacyOutdated = True
+        self.system._containersByName = None
+        self.system._setObject(self.fullName(), self)
         for o in self.contents.values():
             o._handle_reparenting_post()
 
@@ -276,6 +326,20 @@ class Documentable:
         In the context of mod2.E, expandName("RenamedExternal") should be
         "external_location.External" and expandName("renamed_mod.Local")
         should be "mod1.Local". """
+        memo = self.system._expandedNames
+        if memo is None:
+            return self._expandName(name)
+        key = (self, name)
+        full_name = memo.get(key)
+        if full_name is None:
+            full_name = memo[key] = self._expandName(name)
+        elif checkCaches:
+            expected = self._expandName(name)
+            assert full_name == expected, \
+                f"cached expansion of {name!r} in {self.fullName()} is {full_name!r}, should be {expected!r}"
+        return full_name
+
+    def _expandName(self, name: str) -> str:
         parts = name.split('.')
         obj: Documentable = self
         for i, p in enumerate(parts):
@@ -302,6 +366,19 @@ class Documentable:
         """How visible this object should be."""
         return self.system.privacyClass(self)
 
+    @property
+    def isPrivateInContext(self) -> bool:
+        """Is this object private or does it live in a private context?"""
+        private = self.system._privacyEntry(self)
+        if private is None:
+            obj: Optional[Documentable] = self
+            while obj is not None:
+                if obj.isPrivate:
+                    return True
+                obj = obj.parent
+            return False
+        return private
+
     @property
     def isVisible(self) -> bool:
         """Is this object so private as to be not shown at all?
@@ -351,7 +428,7 @@ class Documentable:
 
 
 class Package(Documentable):
-    kind = "Package"
+    _kind: Optional[str] = "Package"
     def docsources(self) -> Iterator[Documentable]:
         yield self.contents['__init__']
     @property
@@ -382,7 +459,7 @@ class CanContainImportsDocumentable(Documentable):
 
 
 class Module(CanContainImportsDocumentable):
-    kind = "Module"
+    _kind: Optional[str] = "Module"
     state = ProcessingState.UNPROCESSED
 
     @property
@@ -428,7 +505,7 @@ class Module(CanContainImportsDocumentable):
 
 
 class Class(CanContainImportsDocumentable):
-    kind = "Class"
+    _kind: Optional[str] = "Class"
     parent: CanContainImportsDocumentable
     bases: List[str]
     baseobjects: List[Optional['Class']]
@@ -510,7 +587,7 @@ class Inheritable(Documentable):
         return self.parent._localNameToFullName(name)
 
 class Function(Inheritable):
-    kind = "Function"
+    _kind: Optional[str] = "Function"
     is_async: bool
     annotations: Mapping[str, Optional[ast.expr]]
     decorators: Optional[Sequence[ast.expr]]
@@ -519,12 +596,14 @@ class Function(Inheritable):
     def setup(self) -> None:
         super().setup()
         if isinstance(self.parent, Class):
-            self.kind = "Method"
+            # Not added to the system yet, so there is no privacy to update.
+            self._kind = "Method"
 
 class Attribute(Inheritable):
-    kind: Optional[str] = "Attribute"
+    _kind: Optional[str] = "Attribute"
     annotation: Optional[ast.expr]
     decorators: Optional[Sequence[ast.expr]] = None
+    property_docstring: Optional[str] = None
 
 
 # Work around the attributes of the same name within the System class.
@@ -533,6 +612,11 @@ _PackageT = Package
 
 T = TypeVar('T')
 
+XrefResult = Tuple[Optional[str], Sequence[str]]
+"""The result of resolving a cross-reference: the URL of the link target,
+or L{None} if it was not found, and the problems to report where the
+cross-reference is used."""
+
 class System:
     """A collection of related documentable objects.
 
@@ -572,6 +656,10 @@ class System:
 
         self.docstring_syntax_errors: Set[str] = set()
         """FullNames of objects for which the docstring failed to parse."""
+        self._parsedDocstrings: Dict[Tuple[str, str], Optional[bytes]] = {}
+        """Parsed docstrings and their parse errors, pickled, by docstring
+        format and text, or L{None} for docstrings that could not be
+        pickled. See L{epydoc2stan.parse_docstring()}."""
 
         self.verboselevel = 0
         self.needsnl = False
@@ -579,6 +667,32 @@ class System:
         self.unprocessed_modules: Set[Module] = set()
         self.module_count = 0
         self.processing_modules: List[str] = []
+        self._privacy: Optional[Dict[Documentable, bool]] = None
+        """The privacy of all objects after processing, as computed by
+        L{updatePrivacy()}: for each object, whether it is private in
+        context."""
+        self._privacyOutdated = False
+        self._containersByName: Optional[Dict[str, List[Documentable]]] = None
+        """For each short name, the objects that contain a member by that
+        name, in the order of L{allobjects}. Built on demand by
+        L{objectsContaining()}."""
+        self._objectsByType: Optional[Dict[type, Dict[str, Tuple[int, Documentable]]]] = None
+        """The objects in L{allobjects} by their exact type, with their
+        position in L{allobjects}. Built on demand by L{objectsOfType()}
+        and kept up to date by L{_setObject()} and L{_removeObject()}."""
+        self._positions = itertools.count()
+        self._expandedNames: Optional[Dict[Tuple[Documentable, str], str]] = None
+        """Memo for L{Documentable.expandName()}, by context and name.
+        Enabled by L{enableNameCaches()} after processing and cleared when
+        objects are added, renamed or moved."""
+        self._xrefCache: Optional[Dict[Tuple[Documentable, str], XrefResult]] = None
+        """Resolved cross-references, by context and identifier, including
+        the ones that were not found. Enabled and cleared along with
+        L{_expandedNames}."""
+        self.xrefCacheHits = 0
+        """The number of cross-references that were found in the cache."""
+        self.xrefCacheMisses = 0
+        """The number of cross-references that had to be resolved."""
         self.buildtime = datetime.datetime.now()
         self.intersphinx = SphinxInventory(logger=self.msg)
 
@@ -692,9 +806,85 @@ class System:
 
     def objectsOfType(self, cls: Type[T]) -> Iterator[T]:
         """Iterate over all instances of C{cls} present in the system. """
-        for o in self.allobjects.values():
-            if isinstance(o, cls):
-                yield o
+        index = self._objectsByType
+        if index is None:
+            index = {}
+            for fullName, o in self.allobjects.items():
+                index.setdefault(type(o), {})[fullName] = (next(self._positions), o)
+            self._objectsByType = index
+        entries = [objs.values() for t, objs in index.items() if issubclass(t, cls)]
+        found: Iterator[Tuple[int, Documentable]]
+        if len(entries) == 1:
+            found = iter(entries[0])
+        else:
+            # Keep the order of allobjects across types.
+            found = heapq.merge(*entries)
+        result: Iterator[Documentable] = (o for _, o in found)
+        if checkCaches:
+            objs = list(result)
+            expected = [o for o in self.allobjects.values() if isinstance(o, cls)]
+            assert objs == expected, \
+                f"indexed objects of type {cls.__name__} are {objs}, should be {expected}"
+            result = iter(objs)
+        return cast(Iterator[T], result)
+
+    def _setObject(self, fullName: str, obj: Documentable) -> None:
+        """Store C{obj} under C{fullName} in L{allobjects}."""
+        self._clearNameCaches()
+        prev = self.allobjects.get(fullName)
+        self.allobjects[fullName] = obj
+        index = self._objectsByType
+        if index is None or prev is obj:
+            return
+        if prev is not None:
+            # The new object takes over the position of the previous one,
+            # which the index cannot represent for another type.
+            self._objectsByType = None
+        else:
+            index.setdefault(type(obj), {})[fullName] = (next(self._positions), obj)
+
+    def _removeObject(self, fullName: str) -> None:
+        """Remove the object stored under C{fullName} from L{allobjects}."""
+        self._clearNameCaches()
+        obj = self.allobjects.pop(fullName)
+        index = self._objectsByType
+        if index is not None:
+            del index[type(obj)][fullName]
+
+    def enableNameCaches(self) -> None:
+        """Enable the caches for L{Documentable.expandName()} and for
+        resolving cross-references, which are only valid once the system
+        is complete.
+
+        The imported names themselves are left alone: a name that a module
+        imported from elsewhere is looked up under the name it was imported
+        by, not at the end of its chain of imports, so the cached results
+        are the same as the uncached ones.
+        """
+        self._expandedNames = {}
+        self._xrefCache = {}
+
+    def _clearNameCaches(self) -> None:
+        if self._expandedNames:
+            self._expandedNames.clear()
+        if self._xrefCache:
+            self._xrefCache.clear()
+
+    def objectsContaining(self, name: str) -> Sequence[Documentable]:
+        """Return the objects in the system that contain a member called
+        C{name}, in the order of L{allobjects}.
+
+        The index that answers this is built from all objects at once and
+        is built again when objects are added, renamed or moved.
+        """
+        index = self._containersByName
+        if index is None:
+            index = defaultdict(list)
+            for o in self.allobjects.values():
+                for childName in o.contents:
+                    index[childName].append(o)
+            self._containersByName = index
+        return index.get(name, ())
 
     def privacyClass(self, ob: Documentable) -> PrivacyClass:
         if ob.kind is None:
@@ -704,17 +894,67 @@ class System:
             return PrivacyClass.PRIVATE
         return PrivacyClass.VISIBLE
 
+    def updatePrivacy(self) -> None:
+        """Compute whether each object is private in context, in a single
+        pass over all objects.
+
+        This is done after processing. The result is kept until the model
+        changes: adding, renaming or moving objects marks it as outdated,
+        so it is computed again the next time it is needed, as does changing
+        the kind of an object. Code that changes the privacy class of objects
+        in other ways, for example an override of L{privacyClass()} that
+        depends on other state, should call this method afterwards.
+        """
+        table: Dict[Documentable, bool] = {}
+        pending: List[Tuple[Documentable, bool]] = [
+            (obj, False) for obj in self.rootobjects
+            ]
+        while pending:
+            obj, inPrivate = pending.pop()
+            private = inPrivate or obj.privacyClass is not PrivacyClass.VISIBLE
+            table[obj] = private
+            pending.extend((child, private) for child in obj.contents.values())
+        self._privacy = table
+        self._privacyOutdated = False
+
+    def _privacyEntry(self, obj: Documentable) -> Optional[bool]:
+        """Look up the privacy of C{obj} computed by L{updatePrivacy()}.
+
+        @return: Whether the object is private in context, or L{None} if
+            the privacy has not been computed.
+        """
+        if self._privacy is None:
+            return None
+        if self._privacyOutdated:
+            self.updatePrivacy()
+        assert self._privacy is not None
+        entry = self._privacy.get(obj)
+        if entry is not None and checkCaches:
+            # Bypass the table for the expected value.
+            self._privacy, table = None, self._privacy
+            try:
+                expected = obj.isPrivateInContext
+            finally:
+                self._privacy = table
+            assert entry == expected, \
+                f"cached privacy of {obj.fullName()} is {entry}, should be {expected}"
+        return entry
+
     def addObject(self, obj: Documentable) -> None:
         """Add C{object} to the system."""
 
+        self._privacyOutdated = True
+        self._containersByName = None
         if obj.parent:
             obj.parent.contents[obj.name] = obj
         else:
             self.rootobjects.append(obj)
 
-        first = self.allobjects.setdefault(obj.fullName(), obj)
-        if obj is not first:
+        fullName = obj.fullName()
+        if fullName in self.allobjects:
             self.handleDuplicate(obj)
+        else:
+            self._setObject(fullName, obj)
 
     # if we assume:
     #
@@ -884,19 +1124,22 @@ class System:
             i += 1
         prev = self.allobjects[fullName]
         self._warning(obj.parent, "duplicate", str(prev))
+        self._privacyOutdated = True
+        self._containersByName = None
         def remove(o: Documentable) -> None:
-            del self.allobjects[o.fullName()]
+            self._removeObject(o.fullName())
             oc = list(o.contents.values())
             for c in oc:
                 remove(c)
         remove(prev)
         prev.name = obj.name + ' ' + str(i)
         def readd(o: Documentable) -> None:
-            self.allobjects[o.fullName()] = o
+            o._fullName = None
+            self._setObject(o.fullName(), o)
             for c in o.contents.values():
                 readd(c)
         readd(prev)
-        self.allobjects[fullName] = obj
+        self._setObject(fullName, obj)
 
 
     def getProcessedModule(self, modname: str) -> Optional[_ModuleT]:
@@ -942,6 +1185,8 @@ class System:
             mod = next(iter(self.unprocessed_modules))
             self.processModule(mod)
         self.postProcess()
+        self.enableNameCaches()
+        self.updatePrivacy()
 
 
     def postProcess(self) -> None:
@@ -957,6 +1202,10 @@ class System:
     def fetchIntersphinxInventories(self, cache: CacheT) -> None:
         """
         Download and parse intersphinx inventories based on configuration.
+
+        This happens in the background: the inventories are waited for
+        when the first link is looked up.
         """
-        for url in self.options.intersphinx:
-            self.intersphinx.update(cache, url)
+        self.intersphinx.updateInBackground(
+            cache, self.options.intersphinx, self.options.buildcachedir)
+        self._clearNameCaches()
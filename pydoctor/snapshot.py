@@ -0,0 +1,389 @@
+"""Saving and loading of processed systems.
+
+A snapshot contains the documentables of a L{model.System} after
+L{System.process()<model.System.process>} has run, so HTML or an intersphinx
+inventory can be generated again without discovering and parsing the
+sources.
+
+The file is gzip-compressed JSON, with a format version that is checked
+when loading. Documentables are stored as the plain values of their instance
+variables; references between documentables are stored as indices into the
+object list and AST expressions are stored node by node. Parsed docstrings
+are not stored: they are derived from the docstrings again after loading.
+Options are not stored either: the options of the loading run apply.
+"""
+
+from contextlib import redirect_stdout
+from enum import Enum
+from importlib import import_module
+from inspect import Parameter, Signature
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Type
+import ast
+import base64
+import gzip
+import io
+import json
+import sys
+
+from pydoctor import astbuilder, epydoc2stan, model, __version__
+
+
+FORMAT_NAME = 'pydoctor-system'
+FORMAT_VERSION = 1
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot cannot be saved or loaded."""
+
+
+_notStored = frozenset((
+    'system', 'contents', 'parsed_docstring', 'parsed_type', '_fullName',
+    '_summary'
+    ))
+"""Instance variables of documentables that are not stored in a snapshot.
+
+The system and the contents are restored from the snapshot's structure,
+parsed docstrings and summaries are derived from the docstrings again and
+full names are computed again on demand.
+"""
+
+_astLeafTypes = (str, int, float, bool, type(None))
+
+
+class _Unencodable(Exception):
+    pass
+
+
+class _Encoder:
+
+    def __init__(self, index: Mapping[model.Documentable, int]):
+        self.index = index
+
+    def encode(self, value: Any) -> Any:
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, model.Documentable):
+            try:
+                return {'ref': self.index[value]}
+            except KeyError:
+                raise _Unencodable(value)
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        if isinstance(value, tuple):
+            return {'tuple': [self.encode(v) for v in value]}
+        if isinstance(value, (set, frozenset)):
+            return {'set': [self.encode(v) for v in value]}
+        if isinstance(value, dict):
+            if not all(isinstance(k, str) for k in value):
+                raise _Unencodable(value)
+            return {'dict': {k: self.encode(v) for k, v in value.items()}}
+        if isinstance(value, ast.AST):
+            return {'ast': self.encodeAST(value)}
+        if isinstance(value, Signature):
+            return {'signature': [
+                [param.name, param.kind.value, self.encodeDefault(param.default)]
+                for param in value.parameters.values()
+                ]}
+        if isinstance(value, Path):
+            return {'path': str(value)}
+        if isinstance(value, Enum) and type(value) in _enums.values():
+            return {'enum': [type(value).__name__, value.name]}
+        raise _Unencodable(value)
+
+    def encodeDefault(self, default: object) -> Any:
+        if default is Parameter.empty:
+            return None
+        if isinstance(default, astbuilder._ValueFormatter):
+            return self.encodeAST(default.value)
+        raise _Unencodable(default)
+
+    def encodeAST(self, node: ast.AST) -> Dict[str, Any]:
+        encoded: Dict[str, Any] = {'_type': type(node).__name__}
+        for name in node._fields + node._attributes:
+            value = getattr(node, name, None)
+            encoded[name] = self.encodeASTField(value)
+        return encoded
+
+    def encodeASTField(self, value: object) -> Any:
+        if isinstance(value, ast.AST):
+            return self.encodeAST(value)
+        if isinstance(value, list):
+            return [self.encodeASTField(v) for v in value]
+        if isinstance(value, _astLeafTypes):
+            return value
+        if isinstance(value, bytes):
+            return {'bytes': base64.b64encode(value).decode('ascii')}
+        if isinstance(value, complex):
+            return {'complex': [value.real, value.imag]}
+        if value is Ellipsis:
+            return {'ellipsis': True}
+        raise _Unencodable(value)
+
+
+_enums: Dict[str, Type[Enum]] = {
+    cls.__name__: cls
+    for cls in (model.ProcessingState, model.PrivacyClass, model.DocLocation)
+    }
+
+
+class _Decoder:
+
+    def __init__(self, objects: List[model.Documentable]):
+        self.objects = objects
+
+    def decode(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        (kind, data), = value.items()
+        if kind == 'ref':
+            return self.objects[data]
+        if kind == 'tuple':
+            return tuple(self.decode(v) for v in data)
+        if kind == 'set':
+            return {self.decode(v) for v in data}
+        if kind == 'dict':
+            return {k: self.decode(v) for k, v in data.items()}
+        if kind == 'ast':
+            return self.decodeAST(data)
+        if kind == 'signature':
+            return Signature([
+                Parameter(name, _parameterKinds[kind_value],
+                    default=Parameter.empty if default is None
+                        else astbuilder._ValueFormatter(self.decodeExpr(default)))
+                for name, kind_value, default in data
+                ])
+        if kind == 'path':
+            return Path(data)
+        if kind == 'enum':
+            enum_name, member_name = data
+            return _enums[enum_name][member_name]
+        raise SnapshotError(f"unknown value type {kind!r}")
+
+    def decodeAST(self, data: Dict[str, Any]) -> ast.AST:
+        node_type = getattr(ast, data['_type'], None)
+        if not (isinstance(node_type, type) and issubclass(node_type, ast.AST)):
+            raise SnapshotError(f"unknown AST node type {data['_type']!r}")
+        fields = {
+            name: self.decodeASTField(value)
+            for name, value in data.items()
+            if name != '_type'
+            }
+        node: ast.AST = node_type(**fields)
+        return node
+
+    def decodeExpr(self, data: Dict[str, Any]) -> ast.expr:
+        node = self.decodeAST(data)
+        if not isinstance(node, ast.expr):
+            raise SnapshotError(f"expected an expression, got {data['_type']!r}")
+        return node
+
+    def decodeASTField(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.decodeASTField(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        if '_type' in value:
+            return self.decodeAST(value)
+        (kind, data), = value.items()
+        if kind == 'bytes':
+            return base64.b64decode(data)
+        if kind == 'complex':
+            return complex(*data)
+        if kind == 'ellipsis':
+            return Ellipsis
+        raise SnapshotError(f"unknown AST value type {kind!r}")
+
+_parameterKinds = {
+    kind.value: kind for kind in (
+        Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD,
+        Parameter.VAR_POSITIONAL, Parameter.KEYWORD_ONLY, Parameter.VAR_KEYWORD,
+        )
+    }
+
+
+def _qualifiedName(cls: type) -> str:
+    return f'{cls.__module__}:{cls.__qualname__}'
+
+def _findClass(name: str) -> Type[model.Documentable]:
+    """Look up a documentable class by its qualified name.
+
+    Only modules that are already imported or that are part of pydoctor are
+    looked in, so loading a snapshot does not import arbitrary modules.
+    """
+    module_name, _, qualname = name.partition(':')
+    if module_name not in sys.modules and not (
+            module_name == 'pydoctor' or module_name.startswith('pydoctor.')):
+        raise SnapshotError(f"cannot find documentable class {name}")
+    try:
+        obj: Any = import_module(module_name)
+        for part in qualname.split('.'):
+            obj = getattr(obj, part)
+    except (ImportError, AttributeError):
+        raise SnapshotError(f"cannot find documentable class {name}")
+    if not (isinstance(obj, type) and issubclass(obj, model.Documentable)):
+        raise SnapshotError(f"{name} is not a documentable class")
+    return obj
+
+
+def _allObjects(system: model.System) -> Iterable[model.Documentable]:
+    """Iterate over all documentables in the system, including ones that are
+    only reachable through the contents of another documentable.
+    """
+    seen = set()
+    pending = list(system.allobjects.values())
+    pending.reverse()
+    while pending:
+        obj = pending.pop()
+        if obj in seen:
+            continue
+        seen.add(obj)
+        yield obj
+        pending.extend(reversed(list(obj.contents.values())))
+
+
+def save_system(system: model.System, path: Path) -> None:
+    """Save a processed system to a snapshot file.
+
+    @raise SnapshotError: If the snapshot cannot be written.
+    """
+    objects = list(_allObjects(system))
+    index = {obj: idx for idx, obj in enumerate(objects)}
+    encoder = _Encoder(index)
+    skipped = set()
+
+    records = []
+    for obj in objects:
+        attributes = {}
+        for name, value in vars(obj).items():
+            if name in _notStored:
+                continue
+            try:
+                attributes[name] = encoder.encode(value)
+            except _Unencodable:
+                skipped.add(name)
+        records.append({
+            'class': _qualifiedName(type(obj)),
+            'attributes': attributes,
+            'contents': [
+                [name, index[child]] for name, child in obj.contents.items()
+                ],
+            })
+    for name in sorted(skipped):
+        system.msg('snapshot',
+                   f"not saving values of '{name}': unsupported type; "
+                   f"they will be missing from the loaded system")
+
+    data = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'pydoctor': __version__,
+        'python': list(sys.version_info[:2]),
+        'system': {
+            'class': _qualifiedName(type(system)),
+            'projectname': system.projectname,
+            'rootobjects': [index[obj] for obj in system.rootobjects],
+            'allobjects': [
+                [name, index[obj]] for name, obj in system.allobjects.items()
+                ],
+            'docstring_syntax_errors': sorted(system.docstring_syntax_errors),
+            },
+        'objects': records,
+        }
+    try:
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+    except OSError as ex:
+        raise SnapshotError(f"cannot write snapshot: {ex}")
+
+
+def load_system(system: model.System, path: Path) -> None:
+    """Load a snapshot into an empty system.
+
+    After loading, the system is in the same state as after
+    L{System.process()<model.System.process>}.
+
+    @raise SnapshotError: If the file is not a compatible snapshot.
+    """
+    if system.allobjects:
+        raise SnapshotError("cannot load a snapshot into a non-empty system")
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as ex:
+        raise SnapshotError(f"cannot read snapshot: {ex}")
+    if not isinstance(data, dict) or data.get('format') != FORMAT_NAME:
+        raise SnapshotError("not a pydoctor system snapshot")
+    if data.get('version') != FORMAT_VERSION:
+        raise SnapshotError(
+            f"unsupported snapshot version {data.get('version')}, "
+            f"expected {FORMAT_VERSION}")
+    if data.get('python') != list(sys.version_info[:2]):
+        # The stored AST nodes are specific to the Python version.
+        raise SnapshotError(
+            "snapshot was saved by Python %s, not %d.%d" % (
+                '.'.join(map(str, data.get('python', ()))),
+                *sys.version_info[:2]))
+
+    try:
+        objects = _loadObjects(system, data)
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError) as ex:
+        raise SnapshotError(f"malformed snapshot: {ex!r}")
+
+    # The problems in these docstrings were reported by the run that
+    # saved the snapshot.
+    violations = system.violations
+    with redirect_stdout(io.StringIO()):
+        _parseDocstrings(objects)
+    system.violations = violations
+    system.enableNameCaches()
+    system.updatePrivacy()
+
+
+def _loadObjects(system: model.System, data: Dict[str, Any]) -> List[model.Documentable]:
+    """Create the documentables of a snapshot and add them to C{system}.
+
+    @raise SnapshotError: If the snapshot was saved from a different type
+        of system or refers to an unknown class.
+    """
+    info = data['system']
+    if info['class'] != _qualifiedName(type(system)):
+        raise SnapshotError(
+            f"snapshot was saved from a {info['class']} system, "
+            f"not {_qualifiedName(type(system))}")
+
+    records = data['objects']
+    # Create all objects first, so references can be resolved in any order.
+    objects = [
+        _findClass(record['class'])(system, '', None, None)
+        for record in records
+        ]
+    decoder = _Decoder(objects)
+    for obj, record in zip(objects, records):
+        for name, value in record['attributes'].items():
+            setattr(obj, name, decoder.decode(value))
+        for name, idx in record['contents']:
+            obj.contents[name] = objects[idx]
+
+    system.projectname = info['projectname']
+    system.rootobjects = [objects[idx] for idx in info['rootobjects']]
+    for name, idx in info['allobjects']:
+        system.allobjects[name] = objects[idx]
+    system.docstring_syntax_errors.update(info['docstring_syntax_errors'])
+    return objects
+
+
+def _parseDocstrings(objects: Iterable[model.Documentable]) -> None:
+    """Derive the parsed docstrings that are set during processing.
+
+    Other parsed docstrings are created on demand when rendering.
+    """
+    for obj in objects:
+        if isinstance(obj, (model.Module, model.Class)) \
+                and obj.docstring is not None:
+            epydoc2stan.extract_fields(obj)
+        elif isinstance(obj, model.Attribute) \
+                and obj.property_docstring is not None:
+            astbuilder.parsePropertyDocstring(obj, obj.property_docstring)
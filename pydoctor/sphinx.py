@@ -3,14 +3,23 @@ Support for Sphinx compatibility.
 """
 
 import logging
+import mmap
 import os
+import re
 import shutil
 import textwrap
 import zlib
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from typing import (
-    TYPE_CHECKING, Callable, ContextManager, Dict, IO, Iterable, Mapping,
-    Optional, Tuple
+    TYPE_CHECKING, Any, Callable, ContextManager, Dict, IO, ItemsView,
+    Iterable, Iterator, List, Mapping, MutableMapping, Optional, Sequence,
+    Set, Tuple, Union
 )
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 
 import appdirs
 import attr
@@ -19,6 +28,8 @@ from cachecontrol import CacheControl
 from cachecontrol.caches import FileCache
 from cachecontrol.heuristics import ExpiresAfter
 
+from pydoctor import buildcache
+
 if TYPE_CHECKING:
     from pydoctor.model import Documentable
     from typing_extensions import Protocol
@@ -33,6 +44,178 @@ else:
 logger = logging.getLogger(__name__)
 
 
+class _PackedStrings(Sequence[str]):
+    """
+    An immutable sequence of strings that are stored as a single string,
+    with an array of the offsets at which they start.
+    """
+
+    __slots__ = ('_data', '_offsets')
+
+    def __init__(self, strings: Iterable[str] = ()):
+        offsets = array('I', [0])
+        end = 0
+        parts = []
+        for string in strings:
+            parts.append(string)
+            end += len(string)
+            offsets.append(end)
+        self._data = ''.join(parts)
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str: # type: ignore[override]
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError(index)
+        offsets = self._offsets
+        return self._data[offsets[index]:offsets[index + 1]]
+
+
+class _LinkTable(MutableMapping[str, Tuple[str, str]]):
+    """
+    Compact mapping of names to C{(base_url, location)} links.
+
+    The links are packed: the names are stored in sorted order and looked
+    up by bisection. A location is split in the page and the fragment that
+    starts at its last C{#}. Each combination of base URL and page is stored
+    once, referred to by its index in L{_pages}, and the fragments are
+    stored in the same order as the names. Since Sphinx abbreviates
+    fragments that end with the name as C{$}, most fragments are short.
+
+    Changes are collected in a dictionary until L{pack()} is called, or
+    until there are as many changes as there are packed links.
+    """
+
+    def __init__(self) -> None:
+        self._pages: List[Tuple[str, str]] = []
+        self._pageIds: Dict[Tuple[str, str], int] = {}
+        self._names = _PackedStrings()
+        self._pageIndices = array('I')
+        self._fragments = _PackedStrings()
+        self._changes: Dict[str, Tuple[str, str]] = {}
+
+    def _index(self, name: str) -> int:
+        """
+        Return the index of C{name} in the packed links, or -1.
+        """
+        names = self._names
+        index = bisect_left(names, name)
+        if index < len(names) and names[index] == name:
+            return index
+        return -1
+
+    def _link(self, index: int) -> Tuple[str, str]:
+        base_url, page = self._pages[self._pageIndices[index]]
+        return base_url, page + self._fragments[index]
+
+    def __getitem__(self, name: str) -> Tuple[str, str]:
+        link = self._changes.get(name)
+        if link is not None:
+            return link
+        index = self._index(name)
+        if index < 0:
+            raise KeyError(name)
+        return self._link(index)
+
+    def __setitem__(self, name: str, link: Tuple[str, str]) -> None:
+        self._changes[name] = link
+        if len(self._changes) > len(self._names):
+            self.pack()
+
+    def __delitem__(self, name: str) -> None:
+        if name not in self:
+            raise KeyError(name)
+        links = [item for item in self.items() if item[0] != name]
+        self._changes.clear()
+        self._pack(links)
+
+    def __iter__(self) -> Iterator[str]:
+        self.pack()
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        self.pack()
+        return len(self._names)
+
+    def items(self) -> ItemsView[str, Tuple[str, str]]:
+        return _LinkTableItems(self)
+
+    def update(self, links: Mapping[str, Tuple[str, str]]) -> None: # type: ignore[override]
+        """
+        Add or replace the given links, without packing them yet.
+        """
+        self._changes.update(links.items())
+
+    def pack(self) -> None:
+        """
+        Merge the changes into the packed links.
+        """
+        if not self._changes:
+            return
+        changes = self._changes
+        changed = sorted(changes)
+        def merged() -> Iterator[Tuple[str, Tuple[str, str]]]:
+            i = 0
+            for index, name in enumerate(self._names):
+                while i < len(changed) and changed[i] < name:
+                    yield changed[i], changes[changed[i]]
+                    i += 1
+                if i < len(changed) and changed[i] == name:
+                    i += 1
+                    yield name, changes[name]
+                else:
+                    yield name, self._link(index)
+            for name in changed[i:]:
+                yield name, changes[name]
+        links = list(merged())
+        self._changes = {}
+        self._pack(links)
+
+    def _pack(self, links: Sequence[Tuple[str, Tuple[str, str]]]) -> None:
+        """
+        Replace the packed links by C{links}, which are sorted by name.
+        """
+        pageIds = self._pageIds
+        pageIndices = array('I')
+        fragments = []
+        for _, (base_url, location) in links:
+            split = location.rfind('#')
+            if split < 0:
+                split = len(location)
+            key = (base_url, location[:split])
+            pageId = pageIds.get(key)
+            if pageId is None:
+                pageId = pageIds[key] = len(self._pages)
+                self._pages.append(key)
+            pageIndices.append(pageId)
+            fragments.append(location[split:])
+        self._names = _PackedStrings(name for name, _ in links)
+        self._pageIndices = pageIndices
+        self._fragments = _PackedStrings(fragments)
+
+
+class _LinkTableItems(ItemsView[str, Tuple[str, str]]):
+    """
+    Items of a L{_LinkTable}, which are read from the packed links
+    instead of being looked up one by one.
+    """
+
+    _mapping: _LinkTable
+
+    def __iter__(self) -> Iterator[Tuple[str, Tuple[str, str]]]:
+        table = self._mapping
+        table.pack()
+        pages = table._pages
+        for name, pageId, fragment in zip(
+                table._names, table._pageIndices, table._fragments):
+            base_url, page = pages[pageId]
+            yield name, (base_url, page + fragment)
+
+
 class SphinxInventory:
     """
     Sphinx inventory handler.
@@ -47,16 +230,47 @@ class SphinxInventory:
         @param project_name: Dummy argument to stay compatible with
                              L{twisted.python._pydoctor}.
         """
-        self._links: Dict[str, Tuple[str, str]] = {}
+        self._links = _LinkTable()
         self._logger = logger
+        self._pending: List['Future[_FetchResult]'] = []
+        self._registry: Dict[str, List[_RegistryEntry]] = {}
+        """Inventories of registry directories, by project root."""
+        self._registryRoots: Dict[Path, Set[str]] = {}
+        """The project roots of the inventories in L{_registry}."""
+        self._loadedRegistry: Set[Path] = set()
+        self._errors = 0
 
     def error(self, where: str, message: str) -> None:
+        self._errors += 1
         self._logger(where, message, thresh=-1)
 
-    def update(self, cache: CacheT, url: str) -> None:
+    def update(
+            self,
+            cache: CacheT,
+            url: str,
+            cache_dir: Optional[Path] = None
+            ) -> None:
         """
-        Update inventory from URL.
+        Update inventory from URL, from a local inventory file or from
+        a registry directory.
+
+        @param url: An C{--intersphinx} location, see L{parseLocation()}.
+        @param cache_dir: Directory in which parsed inventories are stored
+            between runs, or L{None} to always parse. Entries are keyed by
+            the base URL and a hash of the inventory, so the links are only
+            loaded from the cache if the inventory is unchanged.
         """
+        base_url, path = parseLocation(url)
+        if path is not None and path.is_dir():
+            self.addRegistry(base_url, path, cache_dir)
+            return
+        if path is not None:
+            if base_url is None:
+                base_url = path.resolve().parent.as_uri()
+            self._links.update(self._readLocal(base_url, path, cache_dir))
+            self._links.pack()
+            return
+
         parts = url.rsplit('/', 1)
         if len(parts) != 2:
             self.error(
@@ -72,30 +286,236 @@ class SphinxInventory:
                 'sphinx', 'Failed to get object inventory from %s' % (url, ))
             return
 
-        payload = self._getPayload(base_url, data)
-        self._links.update(self._parseInventory(base_url, payload))
+        self._links.update(self._loadLinks(base_url, data, cache_dir))
+        self._links.pack()
 
-    def _getPayload(self, base_url: str, data: bytes) -> str:
+    def _readLocal(
+            self,
+            base_url: str,
+            path: Path,
+            cache_dir: Optional[Path],
+            roots: Optional[Set[str]] = None
+            ) -> Dict[str, Tuple[str, str]]:
         """
-        Parse inventory and return clear text payload without comments.
+        Return the links from the local inventory file at C{path}, which is
+        memory-mapped instead of being read into memory.
+
+        @param roots: As for L{_loadLinks()}.
         """
-        payload = b''
-        while True:
-            parts = data.split(b'\n', 1)
-            if len(parts) != 2:
-                payload = data
-                break
-            if not parts[0].startswith(b'#'):
-                payload = data
-                break
-            data = parts[1]
         try:
-            decompressed = zlib.decompress(payload)
-        except zlib.error:
+            with open(path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return self._loadLinks(base_url, data, cache_dir, roots)
+        except (OSError, ValueError):
+            # Empty files cannot be mapped and raise ValueError.
             self.error(
-                'sphinx',
-                'Failed to uncompress inventory from %s' % (base_url,))
-            return ''
+                'sphinx', 'Failed to get object inventory from %s' % (path, ))
+            return {}
+
+    def _loadLinks(
+            self,
+            base_url: str,
+            data: 'Union[bytes, mmap.mmap]',
+            cache_dir: Optional[Path],
+            roots: Optional[Set[str]] = None
+            ) -> Dict[str, Tuple[str, str]]:
+        """
+        Return the links from the inventory C{data}, using the build cache
+        in C{cache_dir} if there is one.
+
+        @param roots: If given, only the links for names in these project
+            roots are returned.
+        """
+        cache_path = None
+        if cache_dir is not None:
+            key = buildcache.cacheKey(data, base_url, *sorted(roots or ()))
+            cache_path = cache_dir / f'{key}.inv'
+            entry = buildcache.readEntry(cache_path)
+            if entry is not None:
+                links = _unpackLinks(base_url, entry)
+                if links is not None:
+                    return links
+
+        errors = self._errors
+        payload = self._getPayload(base_url, data, roots)
+        links = self._parseInventory(base_url, payload)
+        # Inventories with errors are parsed again, to report the errors.
+        if cache_path is not None and self._errors == errors:
+            entry = _packLinks(links)
+            if entry is not None:
+                buildcache.writeEntry(cache_path, entry)
+        return links
+
+    def updateInBackground(
+            self,
+            cache: CacheT,
+            urls: Iterable[str],
+            cache_dir: Optional[Path] = None
+            ) -> None:
+        """
+        Update inventory from several URLs, which are fetched and parsed in
+        a pool of threads while the caller goes on.
+
+        The links are added in the order of C{urls} by L{wait()}, which is
+        called when the first link is looked up.
+
+        Registry directories are not fetched: their inventories are loaded
+        when they are needed, see L{addRegistry()}.
+
+        @param cache_dir: As for L{update()}.
+        """
+        fetched = []
+        for url in urls:
+            base_url, path = parseLocation(url)
+            if path is not None and path.is_dir():
+                self.addRegistry(base_url, path, cache_dir)
+            else:
+                fetched.append(url)
+        if not fetched:
+            return
+        executor = ThreadPoolExecutor(
+            max_workers=len(fetched), thread_name_prefix='intersphinx')
+        for url in fetched:
+            self._pending.append(
+                executor.submit(self._fetch, cache, url, cache_dir))
+        # The threads exit once the inventories have been fetched.
+        executor.shutdown(wait=False)
+
+    def addRegistry(
+            self,
+            base_url: Optional[str],
+            path: Path,
+            cache_dir: Optional[Path] = None
+            ) -> None:
+        """
+        Add the inventories in a registry directory, which contains an
+        C{objects.inv} file in a subdirectory per project root.
+
+        An inventory is only loaded when a name in its root is looked up.
+        Only its links for names in that root are used, and they do not
+        replace links from other inventories. An inventory that covers
+        several roots can be linked under each of their names, for example
+        using symbolic links; it is loaded once.
+
+        @param base_url: The URL that the links are relative to, followed
+            by the name of the subdirectory that contains the inventory,
+            or L{None} to link to that subdirectory itself.
+        @param cache_dir: As for L{update()}.
+        """
+        try:
+            entries = sorted(path.iterdir())
+        except OSError:
+            self.error(
+                'sphinx', 'Failed to read inventory registry %s' % (path, ))
+            return
+        for entry in entries:
+            inventory = entry / 'objects.inv'
+            if not inventory.is_file():
+                continue
+            inventory = inventory.resolve()
+            if base_url is None:
+                entry_url = inventory.parent.as_uri()
+            else:
+                entry_url = f'{base_url}/{inventory.parent.name}'
+            self._registry.setdefault(entry.name, []).append(
+                _RegistryEntry(entry_url, inventory, cache_dir))
+            self._registryRoots.setdefault(inventory, set()).add(entry.name)
+
+    def _loadRegistry(self, root: str) -> None:
+        """
+        Load the registry inventories for project root C{root},
+        unless that has been done before.
+        """
+        for entry in self._registry.get(root, ()):
+            if entry.path in self._loadedRegistry:
+                continue
+            self._loadedRegistry.add(entry.path)
+            links = self._readLocal(
+                entry.base_url, entry.path, entry.cache_dir,
+                self._registryRoots[entry.path])
+            self._links.update({
+                name: link for name, link in links.items()
+                if name not in self._links
+                })
+            self._links.pack()
+
+    def loadRegistries(self) -> None:
+        """
+        Load the inventories of all project roots in the registries.
+
+        This is needed before forking workers that look up links, since
+        the inventories that a worker loads are not shared with the others
+        and would be loaded again by each of them.
+        """
+        for root in self._registry:
+            self._loadRegistry(root)
+
+    def _fetch(
+            self,
+            cache: CacheT,
+            url: str,
+            cache_dir: Optional[Path]
+            ) -> '_FetchResult':
+        """
+        Fetch and parse the inventory at C{url} in a worker thread.
+
+        The logger is not called from the thread: the messages are returned
+        along with the links, to be logged by L{wait()}.
+        """
+        messages: List[Tuple[Tuple[Any, ...], Dict[str, Any]]] = []
+        def log(*args: Any, **kwargs: Any) -> None:
+            messages.append((args, kwargs))
+        inventory = type(self)(logger=log)
+        inventory.update(cache, url, cache_dir)
+        return inventory._links, messages
+
+    def wait(self) -> None:
+        """
+        Wait for the inventories that are fetched in the background and
+        add their links.
+        """
+        pending = self._pending
+        self._pending = []
+        for future in pending:
+            links, messages = future.result()
+            for args, kwargs in messages:
+                self._logger(*args, **kwargs)
+            self._links.update(links)
+        self._links.pack()
+
+    def _getPayload(
+            self,
+            base_url: str,
+            data: 'Union[bytes, mmap.mmap]',
+            roots: Optional[Set[str]] = None
+            ) -> str:
+        """
+        Parse inventory and return clear text payload without comments.
+
+        @param roots: If given, only the lines for names in these project
+            roots are kept. They are selected before the payload is decoded,
+            so the other lines are never decoded or parsed.
+        """
+        # Skip the comment lines without copying the rest of the data.
+        offset = 0
+        while data[offset:offset + 1] == b'#':
+            end = data.find(b'\n', offset)
+            if end < 0:
+                break
+            offset = end + 1
+        with memoryview(data) as view:
+            payload = view[offset:]
+            try:
+                decompressed = zlib.decompress(payload)
+            except zlib.error:
+                self.error(
+                    'sphinx',
+                    'Failed to uncompress inventory from %s' % (base_url,))
+                return ''
+            finally:
+                payload.release()
+        if roots is not None:
+            decompressed = b'\n'.join(_rootLines(roots).findall(decompressed))
         try:
             return decompressed.decode('utf-8')
         except UnicodeError:
@@ -134,7 +554,14 @@ class SphinxInventory:
         """
         Return link for `name` or None if no link is found.
         """
-        base_url, relative_link = self._links.get(name, (None, None))
+        if self._pending:
+            self.wait()
+        if self._registry:
+            self._loadRegistry(name.split('.', 1)[0])
+        link = self._links.get(name)
+        if link is None:
+            return None
+        base_url, relative_link = link
         if not relative_link:
             return None
 
@@ -145,6 +572,113 @@ class SphinxInventory:
         return f'{base_url}/{relative_link}'
 
 
+def parseLocation(location: str) -> Tuple[Optional[str], Optional[Path]]:
+    """
+    Interpret an C{--intersphinx} location.
+
+    Remote inventories are given as an C{http} or C{https} URL. Local
+    inventories are given as an existing path or a C{file} URL, which
+    can be a directory that is used as a registry, see
+    L{SphinxInventory.addRegistry()}. Local locations can be preceded by
+    C{BASE_URL=} to link to the documentation at C{BASE_URL} instead of the
+    directory that contains the inventory.
+
+    @return: The base URL, if given, and the path of the inventory or
+        registry; the path is L{None} for remote inventories.
+    """
+    base_url: Optional[str] = None
+    path = location
+    # A remote URL can contain '=' itself, so only split off a base URL
+    # if what follows the '=' is a local location.
+    start = 0
+    while True:
+        index = location.find('=', start)
+        if index < 0:
+            break
+        prefix, rest = location[:index], location[index + 1:]
+        if prefix.startswith(('http://', 'https://')) and '?' not in prefix \
+                and _isLocal(rest):
+            base_url, path = prefix.rstrip('/'), rest
+            break
+        start = index + 1
+    if not _isLocal(path):
+        return None, None
+    if path.startswith('file://'):
+        local = Path(url2pathname(urlparse(path).path))
+    else:
+        local = Path(path)
+    return base_url, local
+
+
+def _rootLines(roots: Iterable[str]) -> 're.Pattern[bytes]':
+    """
+    Return a pattern that matches the inventory lines for the names in
+    the project roots C{roots}.
+    """
+    alternatives = b'|'.join(re.escape(root.encode('utf-8')) for root in sorted(roots))
+    return re.compile(rb'^(?:%s)[.\s][^\n]*' % (alternatives,), re.MULTILINE)
+
+
+def _isLocal(path: str) -> bool:
+    """Tell whether C{path} is a C{file} URL or an existing path."""
+    return path.startswith('file://') or os.path.exists(path)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class _RegistryEntry:
+    """An inventory in a registry directory."""
+
+    base_url: str
+    path: Path
+    cache_dir: Optional[Path]
+
+
+_FetchResult = Tuple[
+    Mapping[str, Tuple[str, str]],
+    List[Tuple[Tuple[Any, ...], Dict[str, Any]]]
+    ]
+"""The links of a fetched inventory and the messages logged while fetching it."""
+
+
+def _packLinks(links: Mapping[str, Tuple[str, str]]) -> Optional[bytes]:
+    """
+    Serialize the links parsed from a single inventory, which all share the
+    same base URL, for the build cache.
+
+    The names, in sorted order, and their locations are stored as two
+    blocks of newline separated UTF-8 text, separated by a null byte.
+    Neither can contain newlines, since the inventory is parsed per line.
+
+    @return: The serialized links, or L{None} if they cannot be stored
+        in this form.
+    """
+    names = sorted(links)
+    data = '\n'.join(names) + '\0' + '\n'.join(links[n][1] for n in names)
+    if data.count('\0') != 1:
+        return None
+    return data.encode('utf-8', 'surrogatepass')
+
+
+def _unpackLinks(base_url: str, data: bytes) -> Optional[Dict[str, Tuple[str, str]]]:
+    """
+    Deserialize links stored by L{_packLinks()}.
+
+    @return: The links, or L{None} if C{data} is not a valid entry.
+    """
+    try:
+        names, locations = data.decode('utf-8', 'surrogatepass').split('\0')
+    except ValueError:
+        return None
+    if not names and not locations:
+        return {}
+    nameList = names.split('\n')
+    locationList = locations.split('\n')
+    if len(nameList) != len(locationList):
+        return None
+    return {name: (base_url, location)
+            for name, location in zip(nameList, locationList)}
+
+
 def _parseInventoryLine(line: str) -> Tuple[str, str, int, str, str]:
     """
     Parse a single line from a Sphinx inventory.
@@ -182,6 +716,9 @@ class SphinxInventoryWriter:
     Sphinx inventory handler.
     """
 
+    _batchSize = 1 << 16
+    """The minimum number of bytes that is passed to the compressor at once."""
+
     def __init__(self, logger: Callable[..., None], project_name: str, project_version: str):
         self._project_name = project_name
         self._project_version = project_version
@@ -202,8 +739,20 @@ class SphinxInventoryWriter:
 
         with self._openFileForWriting(path) as target:
             target.write(self._generateHeader())
-            content = self._generateContent(subjects)
-            target.write(zlib.compress(content))
+            # Compress the lines while they are generated, in batches to
+            # limit the number of calls to the compressor.
+            compressor = zlib.compressobj()
+            batch = []
+            size = 0
+            for line in self._generateLines(subjects):
+                batch.append(line)
+                size += len(line)
+                if size >= self._batchSize:
+                    target.write(compressor.compress(b''.join(batch)))
+                    batch = []
+                    size = 0
+            target.write(compressor.compress(b''.join(batch)))
+            target.write(compressor.flush())
 
     def _openFileForWriting(self, path: str) -> ContextManager[IO[bytes]]:
         """
@@ -225,14 +774,22 @@ class SphinxInventoryWriter:
         """
         Write inventory for all `subjects`.
         """
-        content = []
-        for obj in subjects:
-            if not obj.isVisible:
-                continue
-            content.append(self._generateLine(obj).encode('utf-8'))
-            content.append(self._generateContent(obj.contents.values()))
+        return b''.join(self._generateLines(subjects))
 
-        return b''.join(content)
+    def _generateLines(self, subjects: Iterable[Documentable]) -> Iterator[bytes]:
+        """
+        Generate the inventory lines for all visible `subjects` and their
+        visible members, in depth-first order.
+        """
+        stack = [iter(subjects)]
+        while stack:
+            for obj in stack[-1]:
+                if obj.isVisible:
+                    yield self._generateLine(obj).encode('utf-8')
+                    stack.append(iter(obj.contents.values()))
+                    break
+            else:
+                stack.pop()
 
     def _generateLine(self, obj: Documentable) -> str:
         """
@@ -0,0 +1,222 @@
+"""Synchronous flattening of pages to bytes.
+
+L{twisted.web.template.flattenString} supports Deferreds anywhere in the
+rendered tree, which pages never contain, and collects the whole page in
+memory before it can be written. L{Flattener} follows the same rules to
+produce the same output, but writes each piece of output as soon as it is
+produced, which L{BatchedWriter} combines into larger writes.
+
+The escaping helpers are copies of those in the private
+C{twisted.web._flatten} module, so that the output does not depend on
+Twisted internals.
+"""
+
+from types import GeneratorType
+from typing import (
+    Any, Callable, Iterator, List, Mapping, Optional, Sequence, Tuple,
+    Union
+)
+
+from twisted.web.error import UnfilledSlot, UnsupportedType
+from twisted.web.iweb import IRenderable
+from twisted.web.template import CDATA, CharRef, Comment, Tag, slot
+
+
+# The HTML elements that cannot have contents and are written self-closing,
+# as in twisted.web._stan.
+voidElements = frozenset((
+    'img', 'br', 'hr', 'base', 'meta', 'link', 'param', 'area', 'input',
+    'col', 'basefont', 'isindex', 'frame', 'command', 'embed', 'keygen',
+    'source', 'track', 'wbs',
+    ))
+
+def escapeForContent(data: Union[bytes, str]) -> bytes:
+    """Escape C{data} for inclusion in the content of an element."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return data.replace(b'&', b'&amp;').replace(b'<', b'&lt;').replace(b'>', b'&gt;')
+
+def attributeEscapingDoneOutside(data: Union[bytes, str]) -> bytes:
+    """Encode C{data} unescaped: in attributes, L{writeWithAttributeEscaping}
+    escapes all output instead."""
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    return data
+
+def writeWithAttributeEscaping(write: Callable[[bytes], object]) -> Callable[[bytes], None]:
+    """Wrap C{write} to escape all output for inclusion in an attribute value."""
+    def _write(data: bytes) -> None:
+        write(escapeForContent(data).replace(b'"', b'&quot;'))
+    return _write
+
+def escapedCDATA(data: Union[bytes, str]) -> bytes:
+    """Escape C{data} for inclusion in a CDATA section."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return data.replace(b']]>', b']]]]><![CDATA[>')
+
+def escapedComment(data: Union[bytes, str]) -> bytes:
+    """Escape C{data} for inclusion in a comment."""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    data = data.replace(b'--', b'- - ').replace(b'>', b'&gt;')
+    if data and data[-1:] == b'-':
+        data += b' '
+    return data
+
+def getSlotValue(
+        name: str,
+        slotData: Sequence[Optional[Mapping[str, Any]]],
+        default: Any = None
+        ) -> Any:
+    """Find the value of the named slot in the given stack of slot data.
+
+    @raise UnfilledSlot: If the slot has no value and no default.
+    """
+    for slotFrame in reversed(slotData):
+        if slotFrame is not None and name in slotFrame:
+            return slotFrame[name]
+    if default is not None:
+        return default
+    raise UnfilledSlot(name)
+
+
+class BatchedWriter:
+    """Collects written data and passes it on in batches.
+
+    Pages are flattened into many small pieces, which would otherwise each
+    be a separate call to the file's C{write()}.
+    """
+
+    def __init__(self, write: Callable[[bytes], object], batchSize: int = 64 * 1024):
+        self._write = write
+        self._batchSize = batchSize
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def write(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self._batchSize:
+            self.flush()
+
+    def flush(self) -> None:
+        """Pass on all data that was written so far."""
+        if self._chunks:
+            self._write(b''.join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+
+_Write = Callable[[bytes], object]
+_Escaper = Callable[[Any], bytes]
+_Item = Tuple[Any, _Write, Any, _Escaper]
+"""Something to flatten, with the write function, render factory and data
+escaper to flatten it with."""
+
+class Flattener:
+    """Writes the serialized form of stan.
+
+    This does what L{twisted.web.template.flattenString} does, without
+    Deferreds. The tree is walked using a stack instead of recursion, so
+    deeply nested stan does not exceed the recursion limit.
+    """
+
+    def __init__(self, write: _Write):
+        self.write = write
+
+    def flatten(self, root: Any) -> None:
+        """Write the serialized form of C{root}.
+
+        @raise UnsupportedType: If C{root} contains something that cannot
+            be flattened synchronously, such as a Deferred.
+        """
+        slotData: List[Optional[Mapping[str, Any]]] = []
+        # Each iterator yields the items that make up an element, in order.
+        # The items of an iterator are written before it is resumed, so it
+        # can write its own markup around them.
+        stack: List[Iterator[_Item]] = [
+            iter(((root, self.write, None, escapeForContent),))]
+        while stack:
+            try:
+                item = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                continue
+            items = self._flattenItem(item, slotData)
+            if items is not None:
+                stack.append(items)
+
+    def _flattenItem(
+            self,
+            item: _Item,
+            slotData: List[Optional[Mapping[str, Any]]],
+            ) -> Optional[Iterator[_Item]]:
+        """Write C{item} if it is a leaf, otherwise return an iterator over
+        the items that it contains."""
+        root, write, renderFactory, dataEscaper = item
+        if isinstance(root, (bytes, str)):
+            write(dataEscaper(root))
+        elif isinstance(root, Tag):
+            return self._flattenTag(root, write, slotData, renderFactory, dataEscaper)
+        elif isinstance(root, (list, tuple, GeneratorType)):
+            return ((element, write, renderFactory, dataEscaper) for element in root)
+        elif isinstance(root, slot):
+            return iter(((getSlotValue(root.name, slotData, root.default),
+                          write, renderFactory, dataEscaper),))
+        elif isinstance(root, CharRef):
+            write(b'&#%d;' % (root.ordinal,))
+        elif isinstance(root, Comment):
+            write(b'<!--' + escapedComment(root.data) + b'-->')
+        elif isinstance(root, CDATA):
+            write(b'<![CDATA[' + escapedCDATA(root.data) + b']]>')
+        elif IRenderable.providedBy(root):
+            return iter(((self._render(root), write, root, dataEscaper),))
+        else:
+            # This includes Deferreds and coroutines.
+            raise UnsupportedType(root)
+        return None
+
+    def _render(self, element: Any) -> Any:
+        """Return the stan that an L{IRenderable} renders to."""
+        return element.render(None)
+
+    def _flattenTag(
+            self,
+            root: Tag,
+            write: _Write,
+            slotData: List[Optional[Mapping[str, Any]]],
+            renderFactory: Any,
+            dataEscaper: _Escaper,
+            ) -> Iterator[_Item]:
+        slotData.append(root.slotData)
+        rendererName = root.render
+        if rendererName is not None:
+            if renderFactory is None:
+                raise ValueError(
+                    f'Tag wants to be rendered by method "{rendererName}" '
+                    f'but is not contained in any IRenderable')
+            rootClone = root.clone(False)
+            rootClone.render = None
+            renderMethod = renderFactory.lookupRenderMethod(rendererName)
+            yield renderMethod(None, rootClone), write, renderFactory, dataEscaper
+            slotData.pop()
+            return
+        if not root.tagName:
+            yield root.children, write, renderFactory, dataEscaper
+            return
+        tagName = root.tagName.encode('ascii') if isinstance(root.tagName, str) else root.tagName
+        write(b'<' + tagName)
+        for key, value in root.attributes.items():
+            if isinstance(key, str):
+                key = key.encode('ascii')
+            write(b' ' + key + b'="')
+            yield (value, writeWithAttributeEscaping(write), renderFactory,
+                   attributeEscapingDoneOutside)
+            write(b'"')
+        if root.children or tagName.decode('ascii') not in voidElements:
+            write(b'>')
+            yield root.children, write, renderFactory, escapeForContent
+            write(b'</' + tagName + b'>')
+        else:
+            write(b' />')
@@ -0,0 +1,209 @@
+"""Support for only rewriting the HTML pages whose inputs changed.
+
+The fingerprint of a page is a hash over everything the page is rendered
+from: the documented object itself, the objects that are documented on the
+same page, the summaries of its children, the base classes it inherits from
+and a fingerprint of the structure of the whole system, since that
+determines where links point to. The build time is part of the system
+fingerprint, so pages are only kept if the build time is fixed.
+The fingerprints of the pages in the output directory are recorded in a
+L{BuildManifest}.
+"""
+
+from inspect import Signature
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator
+import ast
+import hashlib
+import json
+
+from pydoctor import model, __version__
+
+
+def _describe(value: Any) -> Any:
+    """Convert an attribute value to something with a stable representation."""
+    if isinstance(value, model.Documentable):
+        return value.fullName()
+    if isinstance(value, ast.AST):
+        return ast.dump(value)
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    if isinstance(value, dict):
+        return sorted((k, _describe(v)) for k, v in value.items())
+    if isinstance(value, Signature):
+        return str(value)
+    return repr(value)
+
+_describedAttributes = (
+    'kind', 'linenumber', 'sourceHref', 'docstring_lineno', 'bases', 'rawbases',
+    'baseobjects', 'decorators', 'annotations', 'annotation', 'signature',
+    'is_async', 'auto_attribs', 'implements_directly', 'implementsOnly',
+    'isinterface', 'implementedby_directly', 'subclasses', 'property_docstring',
+    '_deprecated_info', '_localNameToFullName_map',
+    )
+"""Attributes of documentables that are used when rendering them.
+
+The names that a module imports are included, since they determine where
+the links in its docstrings point to.
+"""
+
+def _objectInputs(ob: model.Documentable) -> Iterator[Any]:
+    """Yield the information about a single object that pages render."""
+    yield ob.fullName()
+    yield ob.privacyClass.value
+    for name in _describedAttributes:
+        yield name, _describe(getattr(ob, name, None))
+    for source in ob.docsources():
+        yield source.fullName(), source.docstring
+    if isinstance(ob, model.Attribute):
+        # Attributes can be documented by a field in the parent's docstring.
+        yield ob.parent.docstring
+
+def _pageObjects(ob: model.Documentable) -> Iterator[model.Documentable]:
+    """Yield the objects whose full documentation is included on the page
+    for C{ob}, including C{ob} itself.
+    """
+    yield ob
+    if isinstance(ob, model.Package):
+        yield from _pageObjects(ob.contents['__init__'])
+    for child in ob.contents.values():
+        if child.documentation_location is model.DocLocation.PARENT_PAGE:
+            yield from _pageObjects(child)
+
+def _pageInputs(ob: model.Documentable) -> Iterator[Any]:
+    for o in _pageObjects(ob):
+        yield from _objectInputs(o)
+        for child in o.contents.values():
+            # Children with their own page appear as a summary, which can
+            # mention how many of their own children are documented.
+            yield from _objectInputs(child)
+            yield sorted(
+                (c.kind, c.docstring is not None)
+                for c in child.contents.values()
+                if c.kind is not None
+                )
+    if isinstance(ob, model.Class):
+        for base in ob.allbases(include_self=False):
+            for o in _pageObjects(base):
+                yield from _objectInputs(o)
+        # Overriding subclasses are mentioned for each method.
+        pending = list(ob.subclasses)
+        while pending:
+            sc = pending.pop()
+            yield sc.fullName(), sorted(sc.contents)
+            pending.extend(sc.subclasses)
+
+def _hash(items: Iterable[Any]) -> str:
+    h = hashlib.sha256()
+    for item in items:
+        h.update(repr(item).encode('utf-8', 'surrogatepass'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def systemFingerprint(system: model.System) -> str:
+    """Compute a fingerprint over the information that every page depends
+    on: the names and locations of all objects, the intersphinx links,
+    the build time that is shown in the footer and the options that
+    influence the output.
+    """
+    def inputs() -> Iterator[Any]:
+        yield __version__
+        yield system.buildtime.isoformat()
+        options = system.options
+        for name in ('docformat', 'projectname', 'projecturl',
+                     'projectversion', 'htmlsourcebase'):
+            yield name, getattr(options, name, None)
+        yield system.projectname
+        intersphinx = system.intersphinx
+        intersphinx.wait()
+        # The links are stored in sorted order.
+        yield from intersphinx._links.items()
+        # Registry inventories are loaded while rendering, if at all.
+        for root, entries in sorted(intersphinx._registry.items()):
+            for entry in entries:
+                try:
+                    stat = entry.path.stat()
+                except OSError:
+                    yield root, entry.base_url, None
+                else:
+                    yield root, entry.base_url, stat.st_size, stat.st_mtime_ns
+        for name in sorted(system.allobjects):
+            ob = system.allobjects[name]
+            yield name, ob.kind, ob.privacyClass.value, ob.url
+    return _hash(inputs())
+
+def summaryFingerprint(system: model.System, system_fingerprint: str) -> str:
+    """Compute a fingerprint over the inputs of the summary pages, which
+    include information about every object in the system.
+    """
+    def inputs() -> Iterator[Any]:
+        yield system_fingerprint
+        for name in sorted(system.allobjects):
+            yield from _objectInputs(system.allobjects[name])
+    return _hash(inputs())
+
+def pageFingerprint(ob: model.Documentable, system_fingerprint: str) -> str:
+    """Compute a fingerprint over the inputs of the page for C{ob}.
+
+    @param system_fingerprint: The result of L{systemFingerprint()} for
+        the system that C{ob} belongs to.
+    """
+    def inputs() -> Iterator[Any]:
+        yield system_fingerprint
+        yield type(ob).__name__
+        yield from _pageInputs(ob)
+    return _hash(inputs())
+
+
+class BuildManifest:
+    """Record of the fingerprints of the pages in an output directory.
+
+    Pages can be skipped if their fingerprint did not change since the
+    previous run and the file is still present.
+    """
+
+    filename = '.pydoctor-manifest.json'
+
+    def __init__(self, base: Path):
+        self.base = base
+        self.fingerprints: Dict[str, str] = {}
+        try:
+            with open(base / self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+        if isinstance(data, dict) and data.get('version') == __version__:
+            pages = data.get('pages')
+            if isinstance(pages, dict):
+                self.fingerprints = pages
+        self._changed = False
+
+    @classmethod
+    def discard(cls, base: Path) -> None:
+        """Remove the manifest from an output directory, if present."""
+        try:
+            (base / cls.filename).unlink()
+        except FileNotFoundError:
+            pass
+
+    def isUpToDate(self, filename: str, fingerprint: str) -> bool:
+        """Is the page with the given fingerprint already written?"""
+        return (
+            self.fingerprints.get(filename) == fingerprint
+            and (self.base / filename).is_file()
+            )
+
+    def record(self, filename: str, fingerprint: str) -> None:
+        """Record the fingerprint of a page that was written."""
+        if self.fingerprints.get(filename) != fingerprint:
+            self.fingerprints[filename] = fingerprint
+            self._changed = True
+
+    def save(self) -> None:
+        """Write the manifest to the output directory, if it changed."""
+        if not self._changed:
+            return
+        data = {'version': __version__, 'pages': self.fingerprints}
+        with open(self.base / self.filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=0, sort_keys=True)
+        self._changed = False
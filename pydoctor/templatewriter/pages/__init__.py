@@ -3,7 +3,7 @@
 from typing import Any, Iterator, List, Optional, Union
 import ast
 
-from twisted.web.template import tags, Element, renderer, Tag, XMLFile
+from twisted.web.template import tags, Element, renderer, Tag
 import astor
 
 from pydoctor import epydoc2stan, model, __version__
@@ -51,7 +51,7 @@ class CommonPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('common.html'))
+        return util.templateloader('common.html')
 
     def title(self):
         return self.ob.fullName()
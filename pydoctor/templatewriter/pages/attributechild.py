@@ -1,4 +1,4 @@
-from twisted.web.template import Element, XMLFile, renderer, tags
+from twisted.web.template import Element, renderer, tags
 
 from pydoctor.templatewriter import util
 from pydoctor.templatewriter.pages import format_decorators
@@ -6,7 +6,9 @@ from pydoctor.templatewriter.pages import format_decorators
 
 class AttributeChild(Element):
 
-    loader = XMLFile(util.templatefilepath('attribute-child.html'))
+    @property
+    def loader(self):
+        return util.templateloader('attribute-child.html')
 
     def __init__(self, docgetter, ob, functionExtras):
         self.docgetter = docgetter
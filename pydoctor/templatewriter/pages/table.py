@@ -1,4 +1,4 @@
-from twisted.web.template import Element, TagLoader, XMLFile, renderer
+from twisted.web.template import Element, TagLoader, renderer
 
 from pydoctor.model import Function
 from pydoctor.templatewriter import util
@@ -39,9 +39,12 @@ class TableRow(Element):
 
 
 class ChildTable(Element):
-    loader = XMLFile(util.templatefilepath('table.html'))
     last_id = 0
 
+    @property
+    def loader(self):
+        return util.templateloader('table.html')
+
     def __init__(self, docgetter, ob, children):
         self.docgetter = docgetter
         self.system = ob.system
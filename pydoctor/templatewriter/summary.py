@@ -4,7 +4,7 @@ from typing import Dict, List, Sequence, Tuple, Union, cast
 
 from pydoctor import epydoc2stan, model, __version__
 from pydoctor.templatewriter import util
-from twisted.web.template import Element, TagLoader, XMLFile, renderer, tags
+from twisted.web.template import Element, TagLoader, renderer, tags
 
 
 def moduleSummary(modorpack):
@@ -34,7 +34,7 @@ class ModuleIndexPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('summary.html'))
+        return util.templateloader('summary.html')
 
     def __init__(self, system):
         self.system = system
@@ -76,14 +76,7 @@ def findRootClasses(
 
 def isPrivate(obj: model.Documentable) -> bool:
     """Is the object itself private or does it live in a private context?"""
-
-    while not obj.isPrivate:
-        parent = obj.parent
-        if parent is None:
-            return False
-        obj = parent
-
-    return True
+    return obj.isPrivateInContext
 
 def isClassNodePrivate(cls: model.Class) -> bool:
     """Are a class and all its subclasses are private?"""
@@ -120,7 +113,7 @@ class ClassIndexPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('summary.html'))
+        return util.templateloader('summary.html')
 
     def __init__(self, system):
         self.system = system
@@ -212,7 +205,7 @@ class NameIndexPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('nameIndex.html'))
+        return util.templateloader('nameIndex.html')
 
     def __init__(self, system):
         self.system = system
@@ -246,7 +239,7 @@ class IndexPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('index.html'))
+        return util.templateloader('index.html')
 
     def __init__(self, system):
         self.system = system
@@ -322,7 +315,7 @@ class UndocumentedSummaryPage(Element):
 
     @property
     def loader(self):
-        return XMLFile(util.templatefilepath('summary.html'))
+        return util.templateloader('summary.html')
 
     def __init__(self, system):
         self.system = system
@@ -1,11 +1,11 @@
 """Miscellaneous utilities."""
 
-from typing import Optional
+from typing import Dict, Optional, Tuple, Union
 import os
 
 from pydoctor import model
 from twisted.python.filepath import FilePath
-from twisted.web.template import Tag, tags
+from twisted.web.template import Tag, XMLFile, tags
 
 
 def srclink(o: model.Documentable) -> Optional[str]:
@@ -19,6 +19,32 @@ def templatefile(filename):
 def templatefilepath(filename):
     return FilePath(templatefile(filename))
 
+_templateCache: Dict[Union[str, bytes], Tuple[int, XMLFile]] = {}
+"""Loaders of the templates used in this process, by path, with the
+modification time of the file they were created for."""
+
+def templateloader(template: Union[str, FilePath]) -> XMLFile:
+    """Return a loader for a template.
+
+    Loaders are shared by all pages in the process, so each template is
+    parsed only once, unless the file is modified.
+
+    @param template: The name of one of pydoctor's templates,
+        or the path of another template file.
+    """
+    path = templatefilepath(template) if isinstance(template, str) else template
+    try:
+        mtime = os.stat(path.path).st_mtime_ns
+    except OSError:
+        # Let the loader report the problem when the template is loaded.
+        return XMLFile(path)
+    cached = _templateCache.get(path.path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    loader = XMLFile(path)
+    _templateCache[path.path] = (mtime, loader)
+    return loader
+
 def taglink(o: model.Documentable, label: Optional[str] = None) -> Tag:
     if not o.isVisible:
         o.system.msg("html", "don't link to %s"%o.fullName())
@@ -1,25 +1,118 @@
 """Badly named module that contains the driving code for the rendering."""
 
 from abc import ABC
-from typing import Type
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type
+import filecmp
+import multiprocessing
 import os
 import shutil
+import sys
 
-from pydoctor import model
-from pydoctor.templatewriter import DOCTYPE, pages, summary
+import attr
+
+from pydoctor import epydoc2stan, model
+from pydoctor.templatewriter import DOCTYPE, incremental, pages, summary
+from pydoctor.templatewriter.flatten import BatchedWriter, Flattener
 from pydoctor.templatewriter.util import templatefile
 from twisted.python.filepath import FilePath
-from twisted.web.template import flattenString
 
 
 def flattenToFile(fobj, page):
-    fobj.write(DOCTYPE)
-    err = []
-    def e(r):
-        err.append(r.value)
-    flattenString(None, page).addCallback(fobj.write).addErrback(e)
-    if err:
-        raise err[0]
+    out = BatchedWriter(fobj.write)
+    out.write(DOCTYPE)
+    Flattener(out.write).flatten(page)
+    out.flush()
+
+
+def _copyIfChanged(src, dst):
+    if os.path.isfile(dst) and filecmp.cmp(src, dst, shallow=False):
+        return
+    shutil.copyfile(src, dst)
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class PlannedPage:
+    """A page that will be written for a documentable."""
+
+    ob: model.Documentable
+    filename: str
+    """The name of the output file, relative to the output directory."""
+    pclass: Type[pages.CommonPage]
+
+
+def pageClassFor(ob: model.Documentable) -> Type[pages.CommonPage]:
+    """Find the page class that renders C{ob}."""
+    # brrrrrrr!
+    d = pages.__dict__
+    for c in ob.__class__.__mro__:
+        n = c.__name__ + 'Page'
+        if n in d:
+            pclass: Type[pages.CommonPage] = d[n]
+            return pclass
+    return pages.CommonPage
+
+
+def planPages(obs: Iterable[model.Documentable]) -> List[PlannedPage]:
+    """Make a list of the pages to write for C{obs} and their descendants,
+    in the order of a depth-first walk.
+
+    Hidden objects and everything they contain are left out.
+    """
+    plan = []
+    pending = list(obs)
+    pending.reverse()
+    while pending:
+        ob = pending.pop()
+        if not ob.isVisible:
+            continue
+        if ob.documentation_location is model.DocLocation.OWN_PAGE:
+            plan.append(PlannedPage(ob, f'{ob.fullName()}.html', pageClassFor(ob)))
+        children = list(ob.contents.values())
+        children.reverse()
+        pending.extend(children)
+    return plan
+
+
+def _documentedObjects(page: PlannedPage) -> Iterator[model.Documentable]:
+    """Iterate over the objects whose full docstring is rendered on a planned
+    page: the object itself and the members that are documented on its page.
+    Other objects only have their summary shown.
+    """
+    yield page.ob
+    yield from page.pclass(page.ob).methods()
+
+
+_forkedPages: Optional[Tuple['TemplateWriter', Sequence[PlannedPage]]] = None
+"""The writer and the pages to render, inherited by forked worker processes."""
+
+def _writePageInWorker(index: int) -> Tuple[int, int, Set[str], Set[Tuple[str, str]], int, int]:
+    """Render one page in a worker process.
+
+    @return: The index of the page and the changes to the system's
+        warning state, which the main process has to merge.
+    """
+    assert _forkedPages is not None
+    writer, plan = _forkedPages
+    page = plan[index]
+    system = page.ob.system
+    violations = system.violations
+    syntax_errors = set(system.docstring_syntax_errors)
+    once_msgs = set(system.once_msgs)
+    hits, misses = system.xrefCacheHits, system.xrefCacheMisses
+    with FilePath(writer.base).child(page.filename).open('wb') as out:
+        writer._renderPage(page, out)
+    return (
+        index,
+        system.violations - violations,
+        system.docstring_syntax_errors - syntax_errors,
+        system.once_msgs - once_msgs,
+        system.xrefCacheHits - hits,
+        system.xrefCacheMisses - misses,
+        )
+
+def _canFork() -> bool:
+    return 'fork' in multiprocessing.get_all_start_methods()
 
 
 class TemplateWriter(ABC):
@@ -35,63 +128,192 @@ class TemplateWriter(ABC):
         self.base = filebase
         self.written_pages = 0
         self.total_pages = 0
-        self.dry_run = False
+        self.skipped_pages = 0
+        self._manifest = None
+        self._manifest_loaded = False
+        self._system_fingerprint = None
 
     def prepOutputDirectory(self):
         os.makedirs(self.base, exist_ok=True)
-        shutil.copyfile(templatefile('apidocs.css'),
-                        os.path.join(self.base, 'apidocs.css'))
-        shutil.copyfile(templatefile('bootstrap.min.css'),
-                        os.path.join(self.base, 'bootstrap.min.css'))
-        shutil.copyfile(templatefile('pydoctor.js'),
-                        os.path.join(self.base, 'pydoctor.js'))
+        _copyIfChanged(templatefile('apidocs.css'),
+                       os.path.join(self.base, 'apidocs.css'))
+        _copyIfChanged(templatefile('bootstrap.min.css'),
+                       os.path.join(self.base, 'bootstrap.min.css'))
+        _copyIfChanged(templatefile('pydoctor.js'),
+                       os.path.join(self.base, 'pydoctor.js'))
+
+    def _getManifest(self, system):
+        """Return the build manifest if incremental output is enabled,
+        otherwise L{None}.
+        """
+        if not self._manifest_loaded:
+            self._manifest_loaded = True
+            base = Path(self.base)
+            if system.options.htmlincremental:
+                self._manifest = incremental.BuildManifest(base)
+                self._system_fingerprint = incremental.systemFingerprint(system)
+            else:
+                # Pages written now are not recorded, so an existing
+                # manifest would become stale.
+                incremental.BuildManifest.discard(base)
+        return self._manifest
 
     def writeIndividualFiles(self, obs):
-        self.dry_run = True
-        for ob in obs:
-            self._writeDocsFor(ob)
-        self.dry_run = False
-        for ob in obs:
-            self._writeDocsFor(ob)
+        self._writePages(planPages(obs))
+        if self._manifest is not None:
+            self._manifest.save()
 
     def writeModuleIndex(self, system):
         import time
+        manifest = self._getManifest(system)
+        if manifest is not None:
+            fingerprint = incremental.summaryFingerprint(
+                system, self._system_fingerprint)
+            if all(manifest.isUpToDate(pclass.filename, fingerprint)
+                   for pclass in summary.summarypages):
+                system.msg('html', 'summary pages are up to date')
+                return
         for i, pclass in enumerate(summary.summarypages):
             system.msg('html', 'starting ' + pclass.__name__ + ' ...', nonl=True)
             T = time.time()
             page = pclass(system)
             f = open(os.path.join(self.base, pclass.filename), 'wb')
-            flattenToFile(f, page)
+            self._flattenToFile(f, page)
             f.close()
             system.msg('html', "took %fs"%(time.time() - T), wantsnl=False)
+            if manifest is not None:
+                manifest.record(pclass.filename, fingerprint)
+        if manifest is not None:
+            manifest.save()
 
     def _writeDocsFor(self, ob):
-        if not ob.isVisible:
+        self._writePages(planPages([ob]))
+
+    def _writePages(self, plan):
+        self.total_pages += len(plan)
+        jobs = plan[0].ob.system.options.jobs if plan else 1
+        if jobs > 1 and _canFork():
+            self._writePagesInParallel(plan, jobs)
+        else:
+            for page in plan:
+                self._writePage(page)
+
+    def _writePagesInParallel(self, plan, jobs):
+        """Render the planned pages in C{jobs} forked worker processes.
+
+        Pages are assigned to workers as they become available; the main
+        process reports progress and merges the warnings that were issued
+        while rendering.
+        """
+        global _forkedPages
+        system = plan[0].ob.system
+        todo = []
+        fingerprints = []
+        for page in plan:
+            fingerprint = self._pageFingerprint(page)
+            if not self._skipIfUpToDate(page, fingerprint):
+                todo.append(page)
+                fingerprints.append(fingerprint)
+        if not todo:
             return
-        if ob.documentation_location is model.DocLocation.OWN_PAGE:
-            if self.dry_run:
-                self.total_pages += 1
+
+        # Parse the docstrings that the pages render before forking, so
+        # syntax errors are reported once instead of once per worker that
+        # renders the docstring. Other docstrings are left alone: they would
+        # not be parsed without --jobs either.
+        for page in todo:
+            for ob in _documentedObjects(page):
+                epydoc2stan.ensure_parsed_docstring(ob)
+        # The workers cannot wait for the threads that fetch the intersphinx
+        # inventories, since those are not forked.
+        system.intersphinx.wait()
+        # The registry inventories are loaded lazily: load them here once
+        # instead of once per worker that links to them.
+        system.intersphinx.loadRegistries()
+        # Output that is still buffered would be written by every worker.
+        sys.stdout.flush()
+
+        _forkedPages = (self, todo)
+        try:
+            pool = multiprocessing.get_context('fork').Pool(min(jobs, len(todo)))
+            try:
+                chunksize = max(1, min(16, len(todo) // (jobs * 4)))
+                results = pool.imap_unordered(
+                    _writePageInWorker, range(len(todo)), chunksize)
+                for index, violations, syntax_errors, once_msgs, hits, misses in results:
+                    system.violations += violations
+                    system.docstring_syntax_errors.update(syntax_errors)
+                    system.once_msgs.update(once_msgs)
+                    system.xrefCacheHits += hits
+                    system.xrefCacheMisses += misses
+                    self.written_pages += 1
+                    system.progress(
+                        'html', self.written_pages, self.total_pages,
+                        'pages written')
+                    self._recordPage(todo[index], fingerprints[index])
+            except BaseException:
+                pool.terminate()
+                raise
             else:
-                path = FilePath(self.base).child(f'{ob.fullName()}.html')
-                with path.open('wb') as out:
-                    self._writeDocsForOne(ob, out)
-        for o in ob.contents.values():
-            self._writeDocsFor(o)
+                # Let the workers exit normally, so they flush their output.
+                pool.close()
+            finally:
+                pool.join()
+        finally:
+            _forkedPages = None
+
+    def _pageFingerprint(self, page):
+        """Return the fingerprint of a planned page if incremental output
+        is enabled, otherwise L{None}.
+        """
+        if self._getManifest(page.ob.system) is None:
+            return None
+        return incremental.pageFingerprint(page.ob, self._system_fingerprint)
+
+    def _skipIfUpToDate(self, page, fingerprint):
+        """Check whether a planned page can be skipped because the manifest
+        says it is up to date. Skipped pages count as written.
+        """
+        if fingerprint is None:
+            return False
+        if not self._manifest.isUpToDate(page.filename, fingerprint):
+            return False
+        self.skipped_pages += 1
+        self.written_pages += 1
+        page.ob.system.progress(
+            'html', self.written_pages, self.total_pages, 'pages written')
+        return True
+
+    def _recordPage(self, page, fingerprint):
+        """Record a written page in the manifest, if there is one."""
+        if fingerprint is not None:
+            self._manifest.record(page.filename, fingerprint)
+
+    def _writePage(self, page):
+        fingerprint = self._pageFingerprint(page)
+        if self._skipIfUpToDate(page, fingerprint):
+            return
+        with FilePath(self.base).child(page.filename).open('wb') as out:
+            self.written_pages += 1
+            page.ob.system.progress(
+                'html', self.written_pages, self.total_pages, 'pages written')
+            self._renderPage(page, out)
+        self._recordPage(page, fingerprint)
 
     def _writeDocsForOne(self, ob, fobj):
         if not ob.isVisible:
             return
-        # brrrrrrr!
-        d = pages.__dict__
-        for c in ob.__class__.__mro__:
-            n = c.__name__ + 'Page'
-            if n in d:
-                pclass = d[n]
-                break
-        else:
-            pclass = pages.CommonPage
-        ob.system.msg('html', str(ob), thresh=1)
-        page = pclass(ob)
         self.written_pages += 1
         ob.system.progress('html', self.written_pages, self.total_pages, 'pages written')
+        self._renderPage(
+            PlannedPage(ob, f'{ob.fullName()}.html', pageClassFor(ob)), fobj)
+
+    def _renderPage(self, page, fobj):
+        page.ob.system.msg('html', str(page.ob), thresh=1)
+        # Number the tables per page, so a page renders the same no matter
+        # which pages were rendered before it in the same process.
+        pages.ChildTable.last_id = 0
+        self._flattenToFile(fobj, page.pclass(page.ob))
+
+    def _flattenToFile(self, fobj, page):
         flattenToFile(fobj, page)
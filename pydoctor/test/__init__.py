@@ -9,6 +9,9 @@ from pydoctor import epydoc2stan, model
 from pydoctor.epydoc.markup import DocstringLinker
 
 
+# Find missing cache invalidations while running the test suite.
+model.checkCaches = True
+
 posonlyargs = pytest.mark.skipif(sys.version_info < (3, 8), reason="requires python 3.8")
 typecomment = pytest.mark.skipif(sys.version_info < (3, 8), reason="requires python 3.8")
 
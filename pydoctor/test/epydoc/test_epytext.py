@@ -1,5 +1,8 @@
 from typing import List
 
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
 from pydoctor.epydoc.markup import DocstringLinker, ParseError, epytext, flatten
 from pydoctor.test import NotFoundLinker
 
@@ -84,3 +87,47 @@ def test_literal_braces() -> None:
     assert epytext2html("{1:C{{2:3}}}") == '<p>{1:<code>{2:3}</code>}</p>'
     assert epytext2html("{{{}{}}{}}") == '<p>{{{}{}}{}}</p>'
     assert epytext2html("{{E{lb}E{lb}E{lb}}}") == '<p>{{{{{}}</p>'
+
+
+def test_markup_free() -> None:
+    """
+    Docstrings consisting of paragraphs of text are split into paragraphs
+    without the full parser.
+    """
+    text = "Return the thing.\n\nSome more details, over\ntwo lines.\n"
+    tree = epytext._parse_markup_free(text)
+    assert tree is not None
+    assert str(tree) == str(epytext.parse(text))
+    assert epytext._parse_markup_free(text + "@return: A field.") is None
+    assert epytext._parse_markup_free("Some C{code}.") is None
+
+# Characters that have a meaning in epytext, or for splitting lines.
+markupCharacters = ' \t\r\n\x0c\xa0:.-=~@>{}1aB'
+
+def indentedLines(lines: List[str]) -> str:
+    return '\n'.join(lines)
+
+@given(
+    st.text(alphabet=markupCharacters) |
+    st.lists(
+        st.tuples(
+            st.sampled_from(['', '  ', '    ', '\t']),
+            st.text(alphabet=markupCharacters.replace('\n', ''), max_size=12),
+            ).map(''.join)
+        ).map(indentedLines)
+    )
+@settings(max_examples=1000, deadline=None)
+def test_markup_free_same_tree(text: str) -> None:
+    """
+    If a docstring is found to be free of markup, the tree is the same as
+    the full parser's, which reports no errors for it.
+    """
+    tree = epytext._parse_markup_free(text)
+    if tree is not None:
+        errors: List[ParseError] = []
+        expected = epytext.parse(text, errors)
+        assert errors == []
+        assert repr(tree) == repr(expected)
+        assert epytext2html(text) == flatten(
+            epytext.ParsedEpytextDocstring(expected, []).to_stan(NotFoundLinker())
+            ).rstrip()
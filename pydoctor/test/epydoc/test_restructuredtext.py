@@ -1,7 +1,12 @@
-from typing import List
+from typing import Any, List
 
-from pydoctor.epydoc.markup import DocstringLinker, ParseError, flatten
-from pydoctor.epydoc.markup.restructuredtext import parse_docstring
+from docutils.core import publish_string
+
+from pydoctor.epydoc.markup import DocstringLinker, ParseError, flatten, html2stan
+from pydoctor.epydoc.markup.restructuredtext import (
+    ParsedRstDocstring, _DocumentPseudoWriter, _EpydocHTMLTranslator,
+    _EpydocReader, _Parser, parse_docstring
+)
 from pydoctor.test import NotFoundLinker
 
 from bs4 import BeautifulSoup
@@ -106,3 +111,271 @@ def test_rst_directive_deprecated() -> None:
         <p><span class="versionmodified deprecated">Deprecated since version 0.2: For security reasons</span></p>
         </div>"""
     assert prettify(html) == prettify(expected_html)
+
+def publish_document(docstring: str, errors: List[ParseError]) -> Any:
+    """
+    Parse a docstring with C{publish_string()}, which the reusable parser
+    has to be equivalent to.
+    """
+    writer = _DocumentPseudoWriter()
+    reader = _EpydocReader(errors)
+    publish_string(docstring, writer=writer, reader=reader,
+                   settings_overrides={'report_level':10000,
+                                       'halt_level':10000,
+                                       'warning_stream':None})
+    return writer.document
+
+equivalenceDocstrings = [
+    "Plain text.",
+    """
+    Title
+    =====
+
+    Some *emphasis*, ``literal``, `interpreted` and a `link <http://example.com>`_.
+
+    - an item
+    - another *item
+
+    .. note:: A note with |subst| and a footnote [#]_.
+
+    .. |subst| replace:: substitution
+    .. [#] The footnote.
+
+    .. python::
+
+        print("code")
+
+    >>> 1 + 1
+    2
+
+    :param x: The x.
+    :type x: int
+    :raises ValueError: Never.
+    """,
+    """
+    .. default-role:: literal
+
+    `Code` in the default role, and an unknown directive:
+
+    .. unknown::
+    """,
+    "Back to the `default` role and an unknown_ reference.",
+    ]
+
+def test_reusable_parser() -> None:
+    """
+    Parsing with the reusable parser produces the same documents and
+    errors as parsing each docstring with C{publish_string()}, also when
+    a docstring changes the parser's state.
+    """
+    for docstring in equivalenceDocstrings * 2:
+        expected_errors: List[ParseError] = []
+        expected = publish_document(docstring, expected_errors)
+        errors: List[ParseError] = []
+        document = _Parser.get().parse(docstring, errors)
+        assert document.pformat() == expected.pformat()
+        assert [(e.descr(), e.linenum(), e.is_fatal()) for e in errors] == [
+            (e.descr(), e.linenum(), e.is_fatal()) for e in expected_errors]
+
+translatorDocstrings = [
+    "Plain text.",
+    """
+    Intro with *emphasis*, **strong**, ``literal``, ``--option``,
+    :code:`code`, :sub:`sub`, :sup:`sup`, `resolved` and `Label <target>`.
+
+    Section
+    -------
+
+    - an item
+    - another item
+
+      - nested
+
+    1. first
+
+       With a second paragraph.
+
+    #. second
+
+    term
+        Definition.
+    term : classifier
+        Another definition.
+
+    Quoted:
+
+        A quote.
+
+    Literal::
+
+        code <x> & y
+
+    >>> 1 + 1
+    2
+
+    | line one
+    | line two
+
+    ----------
+
+    .. _target:
+
+    A paragraph with a target_, an `external <http://example.com>`_
+    link and a footnote [#]_.
+
+    .. [#] The footnote.
+
+    .. rubric:: A rubric
+
+    ===  ===
+    a    b
+    ===  ===
+    1    2
+    ===  ===
+    """,
+    """
+    .. admonition:: Custom title
+
+       First paragraph.
+
+       Second paragraph.
+
+    Text [#]_, twice [#twice]_ [#twice]_ and [1]_.
+
+    .. [#] The footnote.
+    .. [#twice] Referenced twice.
+
+       With a second paragraph.
+    .. [1] Numbered.
+
+    .. table:: Caption
+       :align: center
+
+       =====  =====
+       Head   Other
+       =====  =====
+       a      b
+       =====  =====
+
+    +-----+-----+
+    | Span both |
+    +-----+-----+
+
+    .. list-table:: Listed
+       :header-rows: 1
+       :stub-columns: 1
+       :widths: 10 30
+
+       * - H1
+         - H2
+       * - S
+         - V
+
+    .. image:: pic.png
+       :width: 20
+       :height: 10em
+       :scale: 50
+       :align: left
+       :alt: A picture
+
+    An |inline| image.
+
+    .. |inline| image:: small.png
+
+    .. image:: linked.png
+       :target: http://example.com
+
+    .. figure:: diagram.svg
+       :width: 200px
+
+       The caption.
+
+       The legend.
+    """,
+    """
+    .. topic:: A topic
+
+       Rendered by the HTML translator.
+    """,
+    "A \x01 control character.",
+    ]
+
+def html_round_trip(docstring: str) -> str:
+    """
+    Render a docstring by parsing the HTML output of L{_EpydocHTMLTranslator},
+    which is how reStructuredText docstrings used to be rendered.
+    """
+    document = parse_docstring(docstring, [])._document  # type: ignore[attr-defined]
+    return html_round_trip_document(document)
+
+def html_round_trip_document(document: Any) -> str:
+    visitor = _EpydocHTMLTranslator(document, NotFoundLinker())
+    document.walkabout(visitor)
+    return flatten(html2stan(''.join(visitor.body)))
+
+def test_stan_translator() -> None:
+    """
+    Docstrings are translated to the same Stan tree as the HTML
+    translator's output, no matter how often they are rendered.
+    """
+    for docstring in translatorDocstrings:
+        expected = html_round_trip(docstring)
+        parsed = parse_docstring(docstring, [])
+        for _ in range(2):
+            assert flatten(parsed.to_stan(NotFoundLinker())) == expected
+
+def test_stan_translator_field_lists() -> None:
+    """
+    Field lists are translated like the HTML translator does, although
+    they only remain in documents that are not split into fields.
+    """
+    document = _Parser.get().parse("""
+    - Item with fields:
+
+      :Author: Me
+      :Multi: One
+
+         Two
+    - Compact fields:
+
+      :A: b
+      :C: d
+    """, [])
+    actual = flatten(ParsedRstDocstring(document, []).to_stan(NotFoundLinker()))
+    assert 'field-list' in actual
+    assert actual == html_round_trip_document(document)
+
+def test_stan_translator_fallback_settings() -> None:
+    """
+    Nodes that are rendered by the HTML translator leave the settings of
+    the document alone.
+    """
+    parsed = parse_docstring(".. topic:: A topic\n\n   Body.", [])
+    settings = parsed._document.settings  # type: ignore[attr-defined]
+    parsed.to_stan(NotFoundLinker())
+    assert parsed._document.settings is settings  # type: ignore[attr-defined]
+
+def test_stan_translator_empty_cell() -> None:
+    """
+    Empty table cells and the cell next to a long field name hold a
+    no-break space, which the HTML translator writes as an entity that
+    could not be parsed.
+    """
+    html = rst2html("""
+    +---+---+
+    | a |   |
+    +---+---+
+    """)
+    assert '<td>\N{NO-BREAK SPACE}</td>' in html
+    document = _Parser.get().parse(":A very long field name: Value", [])
+    html = flatten(ParsedRstDocstring(document, []).to_stan(NotFoundLinker()))
+    assert '<th class="rst-field-name" colspan="2">' in html
+    assert '<td>\N{NO-BREAK SPACE}</td>' in html
+
+def test_stan_translator_no_break_space() -> None:
+    """
+    Runs of spaces in literals are rendered as no-break spaces, which
+    could not be parsed as HTML.
+    """
+    assert rst2html("``a   b``") == (
+        '<tt class="rst-docutils literal">a\N{NO-BREAK SPACE}\N{NO-BREAK SPACE} b</tt>')
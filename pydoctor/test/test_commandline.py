@@ -244,3 +244,50 @@ def test_make_intersphix(tmp_path: Path) -> None:
     assert [p.name for p in tmp_path.iterdir()] == ['objects.inv']
     assert inventory.is_file()
     assert b'Project: acme-lib\n# Version: 20.12.0-dev123\n' in inventory.read_bytes()
+
+
+def test_jobs_default() -> None:
+    """
+    By default, all work is done in the main process.
+    """
+    options, args = driver.parse_args([])
+    assert options.jobs == 1
+
+
+def test_jobs_per_cpu() -> None:
+    """
+    Passing 0 to --jobs starts one worker per CPU.
+    """
+    options, args = driver.parse_args(['--jobs=0'])
+    assert options.jobs >= 1
+
+
+def test_jobs_negative(capsys: CapSys) -> None:
+    """
+    A negative number of jobs is rejected.
+    """
+    with raises(SystemExit):
+        driver.parse_args(['--jobs=-1'])
+    assert "--jobs must not be negative" in capsys.readouterr().err
+
+
+def test_jobs_same_messages(tmp_path: Path, capsys: CapSys) -> None:
+    """
+    Rendering in worker processes reports the same problems as rendering
+    in the main process: docstrings that are not rendered are not checked.
+    """
+    package = tmp_path / 'pkg'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'good.py').write_text('"""Good module."""\n')
+    (package / 'bad.py').write_text(
+        'def f():\n    """Bad function.\n\n    @param\n    """\n')
+    results = {}
+    for jobs in (1, 2):
+        exit_code = driver.main(args=[
+            '-W', f'--jobs={jobs}', '--html-subject=pkg.good',
+            '--html-output', str(tmp_path / 'out'),
+            str(package)
+            ])
+        results[jobs] = exit_code, capsys.readouterr()
+    assert results[1] == results[2]
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import List, Optional, cast
 import re
 import textwrap
@@ -5,12 +6,12 @@ import textwrap
 from pytest import mark, raises
 
 from pydoctor import epydoc2stan, model
-from pydoctor.epydoc.markup import DocstringLinker, flatten
+from pydoctor.epydoc.markup import DocstringLinker, ParseError, epytext, flatten, restructuredtext
 from pydoctor.epydoc.markup.epytext import ParsedEpytextDocstring
 from pydoctor.sphinx import SphinxInventory
 from pydoctor.test.test_astbuilder import fromText, unwrap
 
-from . import CapSys
+from . import CapSys, MonkeyPatch
 
 
 def test_multiple_types() -> None:
@@ -395,6 +396,50 @@ def test_summary() -> None:
     assert 'No summary' == get_summary('no_summary')
 
 
+def test_summary_cached(capsys: CapSys) -> None:
+    """
+    A summary is rendered once per docstring, also when it is inherited.
+    Problems with its links are reported every time it is used.
+    Changing the docstring renders it again.
+    """
+    mod = fromText('''
+    class Base:
+        def f(self):
+            """Summary with a L{broken link<Nowhere>}."""
+    class Sub(Base):
+        def f(self):
+            pass
+    ''', modname='mod')
+    base_f = mod.contents['Base'].contents['f']
+    sub_f = mod.contents['Sub'].contents['f']
+    summary = epydoc2stan.format_summary(base_f)
+    assert epydoc2stan.format_summary(sub_f) is summary
+    assert epydoc2stan.format_summary(base_f) is summary
+    assert capsys.readouterr().out.count('Cannot find link target') == 3
+
+    base_f.docstring = "Changed summary."
+    assert flatten(epydoc2stan.format_summary(sub_f)) == '<span>Changed summary.</span>'
+
+def test_summary_cached_parse_errors(capsys: CapSys) -> None:
+    """
+    Errors from parsing a summary are reported every time it is used,
+    like problems with its links.
+    """
+    mod = fromText('''
+    def f():
+        "Summary with an L{unclosed link."
+    ''', modname='mod')
+    f = mod.contents['f']
+    epydoc2stan.format_summary(f)
+    assert 'bad docstring' in capsys.readouterr().out
+    # Parse errors are only reported once per object and run.
+    epydoc2stan.format_summary(f)
+    assert capsys.readouterr().out == ''
+    f.system.docstring_syntax_errors.clear()
+    epydoc2stan.format_summary(f)
+    assert 'bad docstring' in capsys.readouterr().out
+
+
 def test_missing_field_name(capsys: CapSys) -> None:
     mod = fromText('''
     """
@@ -620,6 +665,85 @@ def test_EpydocLinker_resolve_identifier_xref_internal_full_name() -> None:
     assert "internal_module.C.html" == url_xref
 
 
+def test_EpydocLinker_resolve_identifier_xref_fallbacks(capsys: CapSys) -> None:
+    """
+    Names that are not in scope are found in "uncle" objects and in other
+    modules, and ambiguous names are reported.
+    """
+    system = model.System()
+    fromText('', modname='pkg', system=system)
+    fromText('''
+    class C:
+        class Inner:
+            pass
+    class Twice:
+        pass
+    ''', modname='m1', parent_name='pkg', system=system)
+    m2 = fromText('''
+    class Twice:
+        pass
+    ''', modname='m2', parent_name='pkg', system=system)
+    other = fromText('', modname='other', system=system)
+
+    uncle = epydoc2stan._EpydocLinker(system.allobjects['pkg'])
+    assert uncle.resolve_identifier_xref('C.Inner', 0) == 'pkg.m1.C.Inner.html'
+    everywhere = epydoc2stan._EpydocLinker(other)
+    assert everywhere.resolve_identifier_xref('C.Inner', 0) == 'pkg.m1.C.Inner.html'
+    assert not capsys.readouterr().out
+
+    with raises(LookupError):
+        everywhere.resolve_identifier_xref('Twice', 3)
+    assert capsys.readouterr().out == (
+        'other:3: ambiguous ref to Twice, could be pkg.m1.Twice, pkg.m2.Twice\n'
+        'other:3: Cannot find link target for "Twice"\n'
+        )
+
+    # Names that are added later are found as well.
+    fromText('''
+    class Later:
+        pass
+    ''', modname='m3', parent_name='pkg', system=system)
+    assert everywhere.resolve_identifier_xref('Later', 0) == 'pkg.m3.Later.html'
+    m2.contents['Twice'].reparent(m2, 'Renamed')
+    assert everywhere.resolve_identifier_xref('Twice', 0) == 'pkg.m1.Twice.html'
+    assert not capsys.readouterr().out
+
+
+def test_EpydocLinker_resolve_identifier_xref_cache(capsys: CapSys) -> None:
+    """
+    After processing, resolved cross-references are cached, including the
+    ones that are not found. Problems are still reported every time.
+    """
+    system = model.System()
+    mod = fromText('''
+    class C:
+        pass
+    ''', modname='mod', system=system)
+    fromText('class Twice: pass', modname='a', system=system)
+    fromText('class Twice: pass', modname='b', system=system)
+    system.enableNameCaches()
+    linker = epydoc2stan._EpydocLinker(mod)
+
+    for lineno in (1, 2):
+        assert linker.resolve_identifier_xref('C', lineno) == 'mod.C.html'
+        with raises(LookupError):
+            linker.resolve_identifier_xref('Missing', lineno)
+        with raises(LookupError):
+            linker.resolve_identifier_xref('Twice', lineno)
+    assert (system.xrefCacheMisses, system.xrefCacheHits) == (3, 3)
+    assert capsys.readouterr().out == ''.join(
+        f'mod:{lineno}: Cannot find link target for "Missing"\n'
+        f'mod:{lineno}: ambiguous ref to Twice, could be a.Twice, b.Twice\n'
+        f'mod:{lineno}: Cannot find link target for "Twice"\n'
+        for lineno in (1, 2)
+        )
+
+    # Adding objects makes the cached results outdated.
+    fromText('class Missing: pass', modname='other', system=system)
+    assert linker.resolve_identifier_xref('Missing', 3) == 'other.Missing.html'
+    assert not capsys.readouterr().out
+
+
 def test_xref_not_found_epytext(capsys: CapSys) -> None:
     """
     When a link in an epytext docstring cannot be resolved, the reference
@@ -714,3 +838,93 @@ def test_annotation_formatter(annotation: str) -> None:
     assert html.endswith('</code>')
     text= html[6:-7]
     assert text == expected_text
+
+
+duplicateDocstringSource = '''
+def f():
+    """
+    Broken B{markup.
+    """
+def g():
+    pass
+def h():
+    """
+    Broken B{markup.
+    """
+def k():
+    """
+    Broken B{markup.
+    """
+'''
+
+def countParses(monkeypatch: MonkeyPatch, module: object) -> List[str]:
+    """Record the docstrings that C{module}'s parser is called for."""
+    parsed: List[str] = []
+    parse = module.parse_docstring # type: ignore[attr-defined]
+    def counting_parse(doc: str, errors: List[ParseError]) -> object:
+        parsed.append(doc)
+        return parse(doc, errors)
+    monkeypatch.setattr(module, 'parse_docstring', counting_parse)
+    return parsed
+
+def test_parse_docstring_duplicates(monkeypatch: MonkeyPatch, capsys: CapSys) -> None:
+    """
+    A docstring that occurs more than once is only parsed once. Each object
+    gets its own parsed docstring, and parse errors are reported for each
+    object.
+    """
+    parsed = countParses(monkeypatch, epytext)
+    mod = fromText(duplicateDocstringSource, modname='mod')
+    f = mod.contents['f']
+    h = mod.contents['h']
+    k = mod.contents['k']
+    pdoc_f = epydoc2stan.ensure_parsed_docstring(f)
+    assert len(parsed) == 1
+    pdoc_h = epydoc2stan.ensure_parsed_docstring(h)
+    pdoc_k = epydoc2stan.ensure_parsed_docstring(k)
+    assert len(parsed) == 1
+    data, = mod.system._parsedDocstrings.values()
+    assert data is not None
+    assert pdoc_f is not None and pdoc_h is not None and pdoc_k is not None
+    assert len({id(pdoc_f), id(pdoc_h), id(pdoc_k)}) == 3
+    assert flatten(epydoc2stan.format_docstring(f)) == flatten(epydoc2stan.format_docstring(k))
+    lines = capsys.readouterr().out.splitlines()
+    assert [line for line in lines if 'bad docstring' in line] == [
+        "mod:4: bad docstring: Unbalanced '{'.",
+        "mod:10: bad docstring: Unbalanced '{'.",
+        "mod:14: bad docstring: Unbalanced '{'.",
+        ]
+
+def test_parse_docstring_build_cache(monkeypatch: MonkeyPatch, capsys: CapSys, tmp_path: Path) -> None:
+    """
+    With a build cache directory, parsed docstrings are reused by later
+    runs. Parse errors are still reported against the right object and line.
+    """
+    src = '''
+    def f():
+        """
+        Some I{text} and a `link <f>`_.
+
+        :param x: Broken *markup.
+        """
+    '''
+    def run() -> List[str]:
+        system = model.System()
+        system.options.docformat = 'restructuredtext'
+        system.options.buildcachedir = tmp_path
+        mod = fromText(src, modname='mod', system=system)
+        f = mod.contents['f']
+        return [flatten(epydoc2stan.format_docstring(f))] + capsys.readouterr().out.splitlines()
+
+    parsed = countParses(monkeypatch, restructuredtext)
+    first = run()
+    assert len(parsed) == 1
+    assert [p.suffix for p in tmp_path.iterdir()] == ['.docstring']
+    assert first[1] == 'mod:7: bad docstring: Inline emphasis start-string without end-string.'
+    assert run() == first
+    assert len(parsed) == 1
+
+    entry, = tmp_path.iterdir()
+    entry.write_bytes(b'garbage')
+    assert run() == first
+    assert len(parsed) == 2
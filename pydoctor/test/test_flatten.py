@@ -0,0 +1,205 @@
+"""
+Check that the flattener produces the same output as twisted's
+L{flattenString}, which serves as the golden reference.
+"""
+
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import sys
+from typing import Any, BinaryIO, Callable, Dict, List, Type
+
+import pytest
+from twisted.web.error import UnfilledSlot, UnsupportedType
+from twisted.web.template import (
+    CDATA, CharRef, Comment, Element, TagLoader, XMLString, flattenString,
+    renderer, slot, tags
+)
+from twisted.internet.defer import succeed
+from twisted.python.failure import Failure
+
+from pydoctor import model
+from pydoctor.templatewriter import DOCTYPE, pages, summary, writer
+from pydoctor.test.test_astbuilder import fromText
+from pydoctor.test.test_packages import processPackage
+
+
+testpackages = Path(__file__).parent / 'testpackages'
+
+def twistedFlattenToFile(fobj: BinaryIO, page: Any) -> None:
+    fobj.write(DOCTYPE)
+    err: List[Failure] = []
+    flattenString(None, page).addCallback(fobj.write).addErrback(err.append)
+    if err:
+        err[0].raiseException()
+
+class ReferenceWriter(writer.TemplateWriter):
+    def _flattenToFile(self, fobj: BinaryIO, page: Any) -> None:
+        twistedFlattenToFile(fobj, page)
+
+def writeDocs(system: model.System, writerclass: Type[writer.TemplateWriter], output: Path) -> Dict[str, bytes]:
+    w = writerclass(str(output))
+    w.prepOutputDirectory()
+    w.writeModuleIndex(system)
+    w.writeIndividualFiles(system.rootobjects)
+    return {p.name: p.read_bytes() for p in output.iterdir()}
+
+@pytest.mark.parametrize('packagename', sorted(
+    p.name for p in testpackages.iterdir() if (p / '__init__.py').is_file()
+    ))
+@pytest.mark.parametrize('privacy', [False, True])
+def test_same_output(packagename: str, privacy: bool, tmp_path: Path) -> None:
+    """
+    All pages of the test packages are the same as the reference,
+    including the summary pages.
+    """
+    system = processPackage(packagename)
+    system.options.htmlusesplitlinks = privacy
+    system.options.htmlusesorttable = privacy
+    expected = writeDocs(system, ReferenceWriter, tmp_path / 'expected')
+    actual = writeDocs(system, writer.TemplateWriter, tmp_path / 'actual')
+    assert sorted(actual) == sorted(expected)
+    for name in expected:
+        assert actual[name] == expected[name], name
+
+docstringSource = '''
+"""
+Some B{bold} & I{italic} text with a L{link<f>}, C{"code"} and U{http://example.com/?a=1&b=2}.
+
+  - an item
+  - another item
+
+>>> print("<doctest>")
+"<doctest>"
+
+@var x: A variable.
+"""
+from typing import Dict
+x: Dict[str, "int"] = {'<': 1}
+def f(a, *args, b=1, **kwargs) -> None:
+    """
+    Function with fields.
+    @param a: The C{a}.
+    @raise ValueError: If C{a < 0}.
+    """
+class C:
+    """A class."""
+    @property
+    def p(self) -> int:
+        """@return: A property."""
+'''
+
+@pytest.mark.parametrize('docformat', ['epytext', 'restructuredtext', 'plaintext'])
+def test_same_docstring_output(docformat: str) -> None:
+    """
+    Docstring markup, which is rendered to arbitrary stan, is flattened
+    the same way.
+    """
+    def render(flattenToFile: Callable[[BytesIO, Any], None]) -> List[bytes]:
+        # Rendering can change parsed docstrings, so each flattener gets
+        # its own system.
+        system = model.System()
+        system.options.docformat = docformat
+        system.buildtime = datetime(2021, 1, 1)
+        fromText(docstringSource, system=system)
+        output = []
+        for ob in writer.planPages(system.rootobjects):
+            f = BytesIO()
+            pages.ChildTable.last_id = 0
+            flattenToFile(f, ob.pclass(ob.ob))
+            output.append(f.getvalue())
+        return output
+    expected = render(twistedFlattenToFile)
+    assert len(expected) == 2
+    assert render(writer.flattenToFile) == expected
+
+def test_summary_pages() -> None:
+    system = processPackage('allgames')
+    for pclass in summary.summarypages:
+        expected = BytesIO()
+        twistedFlattenToFile(expected, pclass(system))
+        actual = BytesIO()
+        writer.flattenToFile(actual, pclass(system))
+        assert actual.getvalue() == expected.getvalue()
+
+
+class Sample(Element):
+    loader = XMLString('''
+    <div xmlns:t="http://twistedmatrix.com/ns/twisted.web.template/0.1"
+         class="static" title="&quot;quoted&quot; &amp; &lt;escaped&gt;">
+      <p>Static <b>content</b> &amp; an entity<br /></p>
+      <t:transparent><i>static transparent</i></t:transparent>
+      <p t:render="filled">
+        <t:slot name="value" /> <t:slot name="missing" default="default" />
+        <a><t:attr name="href"><t:slot name="href" /></t:attr>link</a>
+      </p>
+      <ul t:render="items"><li><t:slot name="item" /></li></ul>
+      <span t:render="nested" />
+      <p>Static again</p>
+    </div>
+    ''')
+
+    @renderer
+    def filled(self, request: object, tag: Any) -> Any:
+        return tag.fillSlots(value='<value>', href='/a?b=1&c="2"')
+
+    @renderer
+    def items(self, request: object, tag: Any) -> Any:
+        return [tag.clone().fillSlots(item=item) for item in ('one', tags.b('two'))]
+
+    @renderer
+    def nested(self, request: object, tag: Any) -> Any:
+        return tag(
+            tags.a(title=[tags.b('tag in attribute'), '"&"', CharRef(160)])('x'),
+            tags.transparent(title=tags.transparent('<transparent>'))('y'),
+            Comment('a -- comment-'),
+            CDATA('some ]]> cdata'),
+            CharRef(8212),
+            b'<bytes>',
+            (c for c in 'gen'),
+            Element(TagLoader(tags.em('element'))),
+            )
+
+@pytest.mark.parametrize('root', [
+    Sample(),
+    [Sample(), Sample()],
+    tags.div(tags.br, tags.img(src='x'), tags.p),
+    tags.p(slot('s', default=tags.b('default'))),
+    ], ids=['element', 'elements', 'void', 'slot-default'])
+def test_flatten(root: Any) -> None:
+    """
+    The flattener produces the same output as twisted's flattener,
+    also when the same template is rendered again.
+    """
+    for _ in range(2):
+        expected = BytesIO()
+        twistedFlattenToFile(expected, root)
+        actual = BytesIO()
+        writer.flattenToFile(actual, root)
+        assert actual.getvalue() == expected.getvalue()
+
+def test_flatten_unfilled_slot() -> None:
+    with pytest.raises(UnfilledSlot):
+        writer.flattenToFile(BytesIO(), tags.p(slot('nothing')))
+
+def test_flatten_deferred() -> None:
+    """
+    Deferreds are not supported: pages are rendered synchronously.
+    """
+    with pytest.raises(UnsupportedType):
+        writer.flattenToFile(BytesIO(), tags.p(succeed('later')))
+
+def test_flatten_deep_nesting() -> None:
+    """
+    Nesting deeper than the recursion limit can be flattened.
+    """
+    depth = sys.getrecursionlimit() * 2
+    root: Any = 'core'
+    for _ in range(depth):
+        root = tags.div(root, class_='"nested"')
+    expected = BytesIO()
+    twistedFlattenToFile(expected, root)
+    actual = BytesIO()
+    writer.flattenToFile(actual, root)
+    assert actual.getvalue() == expected.getvalue()
+    assert actual.getvalue().count(b'<div class="&quot;nested&quot;">') == depth
@@ -4,7 +4,7 @@ Unit tests for model.
 
 from optparse import Values
 from pathlib import Path, PurePosixPath, PureWindowsPath
-from typing import cast
+from typing import Dict, Optional, Tuple, cast
 import zlib
 
 import pytest
@@ -12,6 +12,7 @@ import pytest
 from pydoctor import model
 from pydoctor.driver import parse_args
 from pydoctor.sphinx import CacheT
+from pydoctor.test import CapSys, MonkeyPatch
 from pydoctor.test.test_astbuilder import fromText
 
 
@@ -22,6 +23,7 @@ class FakeOptions:
     sourcehref = None
     projectbasedirectory: Path
     docformat = 'epytext'
+    buildcachedir = None
 
 
 class FakeDocumentable:
@@ -121,21 +123,22 @@ def test_fetchIntersphinxInventories_empty() -> None:
     assert {} == sut.intersphinx._links
 
 
-def test_fetchIntersphinxInventories_content() -> None:
+def test_fetchIntersphinxInventories_content(tmp_path: Path) -> None:
     """
     Download and parse intersphinx inventories for each configured
-    intersphix.
+    intersphix. Local inventories are read from the file system.
     """
+    local = tmp_path / 'twisted' / 'index.inv'
+    local.parent.mkdir()
+    local.write_bytes(zlib.compress(b'twisted.package py:module -1 tm.html -'))
     options, _ = parse_args([])
     options.intersphinx = [
         'http://sphinx/objects.inv',
-        'file:///twisted/index.inv',
+        local.as_uri(),
         ]
     url_content = {
         'http://sphinx/objects.inv': zlib.compress(
             b'sphinx.module py:module -1 sp.html -'),
-        'file:///twisted/index.inv': zlib.compress(
-            b'twisted.package py:module -1 tm.html -'),
         }
     sut = model.System(options=options)
     log = []
@@ -150,15 +153,15 @@ def test_fetchIntersphinxInventories_content() -> None:
 
     sut.fetchIntersphinxInventories(Cache())
 
-    assert [] == log
     assert (
         'http://sphinx/sp.html' ==
         sut.intersphinx.getLink('sphinx.module')
         )
     assert (
-        'file:///twisted/tm.html' ==
+        f'{local.parent.as_uri()}/tm.html' ==
         sut.intersphinx.getLink('twisted.package')
         )
+    assert [] == log
 
 
 def test_docsources_class_attribute() -> None:
@@ -271,3 +274,262 @@ def test_introspection_extension() -> None:
     func = module.contents['raiseException']
     assert func.docstring is not None
     assert func.docstring.strip() == "Raise L{RaiserException}."
+
+
+def test_fullName_reparent() -> None:
+    """
+    The cached full names of an object and its contents are updated
+    when the object is moved to another module.
+    """
+    system = model.System()
+    fromText('''
+    class C:
+        def f(self): pass
+    ''', modname='a', system=system)
+    new_parent = fromText('', modname='b', system=system)
+    cls = system.allobjects['a.C']
+    method = cls.contents['f']
+    assert method.fullName() == 'a.C.f'
+
+    cls.reparent(new_parent, 'D')
+    assert cls.fullName() == 'b.D'
+    assert method.fullName() == 'b.D.f'
+    assert system.allobjects['b.D.f'] is method
+    assert 'a.C.f' not in system.allobjects
+
+def test_fullName_duplicate(capsys: CapSys) -> None:
+    """
+    The cached full names of a replaced duplicate and its contents are
+    updated when it is renamed.
+    """
+    system = model.System()
+    mod = fromText('''
+    class C:
+        def f(self): pass
+    class C:
+        pass
+    ''', system=system)
+    first = system.allobjects['<test>.C 0']
+    assert first.fullName() == '<test>.C 0'
+    assert first.contents['f'].fullName() == '<test>.C 0.f'
+    assert system.allobjects['<test>.C 0.f'] is first.contents['f']
+    assert mod.contents['C'].fullName() == '<test>.C'
+    assert 'duplicate' in capsys.readouterr().out
+
+def test_fullName_check(monkeypatch: MonkeyPatch) -> None:
+    """
+    When checking caches, a stale full name is detected.
+    """
+    monkeypatch.setattr(model, 'checkCaches', True)
+    mod = fromText('def f(): pass')
+    func = mod.contents['f']
+    assert func.fullName() == '<test>.f'
+    func.name = 'g'
+    with pytest.raises(AssertionError):
+        func.fullName()
+
+def test_privacy_table() -> None:
+    """
+    After processing, the privacy of all objects comes from a table that
+    is kept up to date when objects are added or moved.
+    """
+    system = model.System()
+    mod = fromText('''
+    class _Private:
+        def f(self): pass
+    class Public:
+        def _g(self): pass
+    ''', system=system)
+    system.updatePrivacy()
+    assert system._privacy is not None
+    private = mod.contents['_Private']
+    public = mod.contents['Public']
+    assert private.privacyClass is model.PrivacyClass.PRIVATE
+    assert private.isPrivateInContext
+    assert private.contents['f'].privacyClass is model.PrivacyClass.VISIBLE
+    assert private.contents['f'].isPrivateInContext
+    assert public.privacyClass is model.PrivacyClass.VISIBLE
+    assert not public.isPrivateInContext
+    assert public.contents['_g'].isPrivateInContext
+
+    private.reparent(mod, 'Renamed')
+    assert private.privacyClass is model.PrivacyClass.VISIBLE
+    assert not private.contents['f'].isPrivateInContext
+
+    fromText('def h(): pass', modname='_other', system=system)
+    assert system.allobjects['_other.h'].isPrivateInContext
+
+def test_privacy_main_module() -> None:
+    """
+    A C{__main__} module is private, also when looked up in the table.
+    """
+    system = model.System()
+    mod = fromText('def f(): pass', modname='__main__', system=system)
+    assert mod.privacyClass is model.PrivacyClass.PRIVATE
+    system.updatePrivacy()
+    assert mod.privacyClass is model.PrivacyClass.PRIVATE
+    assert mod.contents['f'].isPrivateInContext
+
+def test_privacy_check(monkeypatch: MonkeyPatch) -> None:
+    """
+    When checking caches, a privacy that changed without updating the
+    table is detected.
+    """
+    monkeypatch.setattr(model, 'checkCaches', True)
+    system = model.System()
+    mod = fromText('def f(): pass', system=system)
+    system.updatePrivacy()
+    func = mod.contents['f']
+    assert not func.isPrivateInContext
+    func.name = '_f'
+    with pytest.raises(AssertionError):
+        func.isPrivateInContext
+    system.updatePrivacy()
+    assert func.isPrivateInContext
+
+def test_privacy_kind() -> None:
+    """
+    Changing the kind of an object updates its privacy and that of its
+    contents.
+    """
+    system = model.System()
+    mod = fromText('''
+    class C:
+        def m(self): pass
+    ''', system=system)
+    system.updatePrivacy()
+    cls = mod.contents['C']
+    meth = cls.contents['m']
+    assert not meth.isPrivateInContext
+    cls.kind = None
+    assert cls.privacyClass is model.PrivacyClass.HIDDEN
+    assert meth.isPrivateInContext
+
+def test_privacy_subclass() -> None:
+    """
+    Subclasses of documentables can override the privacy class and set
+    their kind as a class attribute.
+    """
+    class Hidden(model.Class):
+        kind: Optional[str] = 'Hidden class'
+        @property
+        def privacyClass(self) -> model.PrivacyClass:
+            return model.PrivacyClass.HIDDEN
+    system = model.System()
+    mod = fromText('', system=system)
+    hidden = Hidden(system, 'H', mod)
+    system.addObject(hidden)
+    system.addObject(model.Function(system, 'f', hidden))
+    assert hidden.kind == 'Hidden class'
+    system.updatePrivacy()
+    assert hidden.privacyClass is model.PrivacyClass.HIDDEN
+    assert hidden.contents['f'].isPrivateInContext
+
+    hidden.kind = None
+    assert hidden.kind is None
+    assert Hidden(system, 'G', mod).kind == 'Hidden class'
+
+def test_objectsOfType() -> None:
+    """
+    Objects of a type are found through the index in the order of
+    L{model.System.allobjects}, also after objects were added, moved or
+    replaced by duplicates.
+    """
+    class SubClass(model.Class):
+        pass
+    system = model.System()
+    mod = fromText('''
+    class A:
+        def f(self): pass
+    def g(): pass
+    ''', system=system)
+
+    def check() -> None:
+        for cls in (model.Documentable, model.Class, SubClass, model.Function):
+            assert list(system.objectsOfType(cls)) == [
+                o for o in system.allobjects.values() if isinstance(o, cls)]
+
+    check()
+    system.addObject(SubClass(system, 'B', mod))
+    fromText('class C: pass', modname='other', system=system)
+    check()
+    mod.contents['A'].reparent(mod, 'Z')
+    check()
+    system.addObject(SubClass(system, 'g', mod))
+    assert isinstance(system.allobjects['<test>.g'], SubClass)
+    assert isinstance(system.allobjects['<test>.g 0'], model.Function)
+    check()
+    assert [o.fullName() for o in system.objectsOfType(model.Class)] == [
+        '<test>.B', 'other.C', '<test>.Z', '<test>.g']
+
+def test_objectsOfType_check(monkeypatch: MonkeyPatch) -> None:
+    """
+    When checking caches, objects stored without updating the index are
+    detected.
+    """
+    monkeypatch.setattr(model, 'checkCaches', True)
+    system = model.System()
+    mod = fromText('class A: pass', system=system)
+    assert list(system.objectsOfType(model.Class)) == [mod.contents['A']]
+    system.allobjects['<test>.B'] = model.Class(system, 'B', mod)
+    with pytest.raises(AssertionError):
+        system.objectsOfType(model.Class)
+
+def test_enableNameCaches() -> None:
+    """
+    Enabling the name caches does not change how names are looked up,
+    including names that were imported through a chain of modules.
+    """
+    system = model.System()
+    fromText('''
+    class A:
+        pass
+    from ext import E
+    from d import Y as X
+    ''', modname='a', system=system)
+    fromText('from a import A as B, E, X', modname='b', system=system)
+    fromText('from b import B as C, E, X as Y', modname='c', system=system)
+    d = fromText('''
+    from c import C, E, Y
+    class D(C):
+        pass
+    ''', modname='d', system=system)
+    names = ['A', 'B', 'C', 'D', 'E', 'X', 'Y', 'C.f', 'D.f', 'unknown']
+    def lookups() -> Dict[Tuple[str, str], Tuple[str, Optional[model.Documentable]]]:
+        return {
+            (ctx.fullName(), name): (ctx.expandName(name), ctx.resolveName(name))
+            for ctx in system.allobjects.values()
+            for name in names
+            }
+
+    uncached = lookups()
+    assert uncached[('d', 'C')] == ('c.C', None)
+    system.enableNameCaches()
+    assert lookups() == uncached
+    # The second time, the results come from the cache.
+    assert system._expandedNames
+    assert lookups() == uncached
+    assert d.contents['D'].bases == ['c.C']
+
+def test_expandName_memo(monkeypatch: MonkeyPatch) -> None:
+    """
+    After processing, expanded names are remembered until objects are
+    added or moved. When checking caches, outdated entries are detected.
+    """
+    system = model.System()
+    mod = fromText('from other import f', system=system)
+    assert mod.system._expandedNames is None
+    system.enableNameCaches()
+    assert mod.expandName('f') == 'other.f'
+    assert system._expandedNames == {(mod, 'f'): 'other.f'}
+    assert mod.resolveName('f') is None
+
+    other = fromText('def f(): pass', modname='other', system=system)
+    assert not system._expandedNames
+    assert mod.resolveName('f') is other.contents['f']
+
+    monkeypatch.setattr(model, 'checkCaches', True)
+    assert mod.expandName('g') == 'g'
+    mod._localNameToFullName_map['g'] = 'other.f'
+    with pytest.raises(AssertionError):
+        mod.expandName('g')
@@ -0,0 +1,240 @@
+"""
+Tests for saving and loading processed systems.
+"""
+
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, Type
+import gzip
+import json
+import re
+import sys
+import textwrap
+
+import pytest
+
+from pydoctor import driver, model, snapshot, templatewriter, zopeinterface
+from pydoctor.test.test_packages import processPackage
+
+from . import CapSys, MonkeyPatch
+
+
+def renderAll(system: model.System) -> str:
+    """Render every page of the system, with the table IDs made stable."""
+    wr = templatewriter.TemplateWriter('')
+    out = BytesIO()
+    for name, ob in sorted(system.allobjects.items()):
+        if ob.isVisible and ob.documentation_location is model.DocLocation.OWN_PAGE:
+            out.write(name.encode() + b'\n')
+            wr._writeDocsForOne(ob, out)
+    return re.sub(r'id\d+', 'id', out.getvalue().decode())
+
+
+@pytest.mark.parametrize('packname, systemcls', [
+    ('basic', model.System),
+    ('allgames', model.System),
+    ('multipleinheritance', model.System),
+    ('interfaceclass', zopeinterface.ZopeInterfaceSystem),
+    ('interfaceallgames', zopeinterface.ZopeInterfaceSystem),
+    ])
+def test_roundtrip(
+        packname: str,
+        systemcls: Type[model.System],
+        tmp_path: Path
+        ) -> None:
+    """
+    A loaded system renders the same pages as the system that was saved.
+    """
+    system = processPackage(packname, systemcls)
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(system, path)
+
+    loaded = systemcls()
+    loaded.buildtime = system.buildtime
+    snapshot.load_system(loaded, path)
+
+    assert list(loaded.allobjects) == list(system.allobjects)
+    assert [o.fullName() for o in loaded.rootobjects] == \
+           [o.fullName() for o in system.rootobjects]
+    for name, ob in system.allobjects.items():
+        assert type(loaded.allobjects[name]) is type(ob)
+    assert renderAll(loaded) == renderAll(system)
+
+
+def _writeModule(tmp_path: Path, src: str) -> Path:
+    path = tmp_path / 'mod.py'
+    path.write_text(textwrap.dedent(src))
+    return path
+
+
+def test_property_docstring(tmp_path: Path) -> None:
+    """
+    Docstrings of properties that consist of only a return field are
+    restored from the original docstring.
+    """
+    system = model.System()
+    system.addModuleFromPath(None, str(_writeModule(tmp_path, '''
+    class C:
+        @property
+        def p(self):
+            """@return: The value."""
+    ''')))
+    system.process()
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(system, path)
+
+    loaded = model.System()
+    snapshot.load_system(loaded, path)
+    p = loaded.allobjects['mod.C.p']
+    assert isinstance(p, model.Attribute)
+    assert p.docstring == ''
+    assert p.parsed_docstring is not None
+
+
+def test_docstring_problems_reported_once(tmp_path: Path, capsys: CapSys) -> None:
+    """
+    Problems in docstrings that are parsed while processing were reported
+    when the snapshot was saved, so loading does not report them again.
+    """
+    system = model.System()
+    system.addModuleFromPath(None, str(_writeModule(tmp_path, '''
+    class C:
+        """
+        @ivar: No name.
+        """
+    ''')))
+    system.process()
+    assert system.violations
+    assert 'Missing field name' in capsys.readouterr().out
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(system, path)
+
+    loaded = model.System()
+    snapshot.load_system(loaded, path)
+    assert loaded.violations == 0
+    assert capsys.readouterr().out == ''
+    assert loaded.allobjects['mod.C'].parsed_docstring is not None
+
+
+def test_save_unsupported_value(tmp_path: Path, capsys: CapSys) -> None:
+    """
+    Values that cannot be stored are reported at the default verbosity.
+    """
+    system = model.System()
+    system.options.verbosity = 0
+    system.addModuleFromPath(None, str(_writeModule(tmp_path, 'x = 1')))
+    system.process()
+    system.allobjects['mod'].custom = object()  # type: ignore[attr-defined]
+    capsys.readouterr()
+    snapshot.save_system(system, tmp_path / 'system.json.gz')
+    assert "not saving values of 'custom'" in capsys.readouterr().out
+
+
+def test_load_not_a_snapshot(tmp_path: Path) -> None:
+    path = tmp_path / 'system.json.gz'
+    with gzip.open(path, 'wt') as f:
+        json.dump({'format': 'something else'}, f)
+    with pytest.raises(snapshot.SnapshotError, match='not a pydoctor'):
+        snapshot.load_system(model.System(), path)
+
+
+def test_load_unsupported_version(tmp_path: Path) -> None:
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    with gzip.open(path, 'rt') as f:
+        data = json.load(f)
+    data['version'] = snapshot.FORMAT_VERSION + 1
+    with gzip.open(path, 'wt') as f:
+        json.dump(data, f)
+    with pytest.raises(snapshot.SnapshotError, match='unsupported snapshot version'):
+        snapshot.load_system(model.System(), path)
+
+
+def _editSnapshot(path: Path, edit: Callable[[Dict[str, Any]], None]) -> None:
+    with gzip.open(path, 'rt') as f:
+        data = json.load(f)
+    edit(data)
+    with gzip.open(path, 'wt') as f:
+        json.dump(data, f)
+
+
+def test_load_other_system_class(tmp_path: Path) -> None:
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    with pytest.raises(snapshot.SnapshotError, match='saved from a pydoctor.model:System system'):
+        snapshot.load_system(zopeinterface.ZopeInterfaceSystem(), path)
+
+
+def test_load_malformed(tmp_path: Path) -> None:
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    def edit(data: Dict[str, Any]) -> None:
+        data['system']['rootobjects'].append(len(data['objects']))
+    _editSnapshot(path, edit)
+    with pytest.raises(snapshot.SnapshotError, match='malformed snapshot'):
+        snapshot.load_system(model.System(), path)
+
+
+@pytest.mark.parametrize('classname', [
+    'os:system',
+    'pydoctor.model:System',
+    'pydoctor.model:NoSuchClass',
+    ])
+def test_load_unknown_class(tmp_path: Path, classname: str) -> None:
+    """
+    Only documentable classes from imported modules or pydoctor are used.
+    """
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    def edit(data: Dict[str, Any]) -> None:
+        data['objects'][0]['class'] = classname
+    _editSnapshot(path, edit)
+    with pytest.raises(snapshot.SnapshotError, match=re.escape(classname)):
+        snapshot.load_system(model.System(), path)
+
+
+def test_load_unimported_module(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Modules that are not imported yet are not imported to find a class.
+    """
+    monkeypatch.delitem(sys.modules, 'this', raising=False)
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    def edit(data: Dict[str, Any]) -> None:
+        data['objects'][0]['class'] = 'this:Documentable'
+    _editSnapshot(path, edit)
+    with pytest.raises(snapshot.SnapshotError, match='cannot find'):
+        snapshot.load_system(model.System(), path)
+    assert 'this' not in sys.modules
+
+
+def test_load_into_nonempty_system(tmp_path: Path) -> None:
+    path = tmp_path / 'system.json.gz'
+    snapshot.save_system(processPackage('basic'), path)
+    with pytest.raises(snapshot.SnapshotError, match='non-empty'):
+        snapshot.load_system(processPackage('basic'), path)
+
+
+def test_driver_save_and_load(tmp_path: Path) -> None:
+    """
+    The intersphinx inventory generated from a loaded system is the same
+    as the one generated from the sources.
+    """
+    path = tmp_path / 'system.json.gz'
+    exit_code = driver.main(args=[
+        '--make-intersphinx', '--project-name=basic',
+        '--html-output', str(tmp_path / 'first'),
+        '--save-system', str(path),
+        'pydoctor/test/testpackages/basic/'
+        ])
+    assert exit_code == 0
+    assert path.is_file()
+
+    exit_code = driver.main(args=[
+        '--make-intersphinx',
+        '--html-output', str(tmp_path / 'second'),
+        '--load-system', str(path),
+        ])
+    assert exit_code == 0
+    assert (tmp_path / 'first' / 'objects.inv').read_bytes() == \
+           (tmp_path / 'second' / 'objects.inv').read_bytes()
@@ -5,10 +5,12 @@ Tests for Sphinx integration.
 import datetime
 import io
 import string
+import threading
 import zlib
 from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Callable, Iterator, List, Optional, Tuple, cast
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, cast
 
 import cachecontrol
 import pytest
@@ -20,6 +22,7 @@ from hypothesis import strategies as st
 
 from . import CapLog, FixtureRequest, MonkeyPatch, TempPathFactory
 from pydoctor import model, sphinx
+from pydoctor.test.test_astbuilder import fromText
 
 
 
@@ -129,6 +132,37 @@ x\x9c\x03\x00\x00\x00\x00\x01"""
 
 
 
+def test_generate_streaming(monkeypatch: MonkeyPatch) -> None:
+    """
+    The inventory is compressed in batches while it is generated; the output
+    is the same as when compressing all content at once.
+    """
+    mod = fromText('\n'.join(
+        [f'def f{i}(): pass' for i in range(300)] +
+        ['class C:', '    class D:', '        def m(self): pass']
+        ), modname='mod')
+    inv_writer, _ = get_inv_writer_with_logger()
+    monkeypatch.setattr(inv_writer, '_batchSize', 100)
+    output = io.BytesIO()
+    writes = []
+    @contextmanager
+    def openFileForWriting(path: str) -> Iterator[io.BytesIO]:
+        monkeypatch.setattr(output, 'write', lambda data: writes.append(data))
+        yield output
+    monkeypatch.setattr(inv_writer, '_openFileForWriting', openFileForWriting)
+
+    inv_writer.generate(subjects=[mod], basepath='base-path')
+
+    content = inv_writer._generateContent([mod])
+    assert content.endswith(
+        b'mod.C py:class -1 mod.C.html -\n'
+        b'mod.C.D py:class -1 mod.C.D.html -\n'
+        b'mod.C.D.m py:method -1 mod.C.D.html#m -\n'
+        )
+    assert len(writes) > 3
+    assert b''.join(writes) == inv_writer._generateHeader() + zlib.compress(content)
+
+
 def test_generateContent(inv_writer_nolog: sphinx.SphinxInventoryWriter) -> None:
     """
     Return a string with inventory for all  targeted objects, recursive.
@@ -371,6 +405,106 @@ def test_update_functional(inv_reader_nolog: sphinx.SphinxInventory) -> None:
     assert 'http://some.url/api/module2.html' == inv_reader_nolog.getLink('other.module2')
 
 
+def test_update_cached(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    With a cache directory, the links parsed from an inventory are stored
+    and loaded again for the same URL and content.
+    """
+    url = 'http://some.url/api/objects.inv'
+    content = zlib.compress(
+        b'some.module1 py:module -1 module1.html -\n'
+        b'other.module2 py:module 0 module2.html#$ Other description\n'
+        b'a.label std:label -1 label.html -\n'
+        )
+    first = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    first.update({url: content}, url, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    def parse(*args: object) -> None:
+        assert False, "inventory parsed again"
+    monkeypatch.setattr(sphinx.SphinxInventory, '_parseInventory', parse)
+    second = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    second.update({url: content}, url, tmp_path)
+    assert second._links == first._links
+    assert 'http://some.url/api/module2.html#other.module2' == second.getLink('other.module2')
+
+    # Another URL or changed content is not found in the cache.
+    monkeypatch.undo()
+    other = 'http://other.url/objects.inv'
+    second.update({other: content}, other, tmp_path)
+    second.update({url: content + zlib.compress(b'')}, url, tmp_path)
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_update_cached_errors(tmp_path: Path) -> None:
+    """
+    Inventories that contain errors are not cached, so the errors are
+    reported on every run.
+    """
+    url = 'http://some.url/api/objects.inv'
+    content = zlib.compress(b'some.module1 py:module -1 module1.html -\nbad line\n')
+    for _ in range(2):
+        inv = InvReader(logger=PydoctorLogger())
+        inv.update({url: content}, url, tmp_path)
+        assert 'http://some.url/api/module1.html' == inv.getLink('some.module1')
+        assert len(inv._logger.messages) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('links', [
+    {},
+    {'': ('http://base', 'empty.html')},
+    {'a b': ('http://base', 'ab.html#$'), 'c': ('http://base', '')},
+    ])
+def test_packLinks(links: Dict[str, Tuple[str, str]]) -> None:
+    data = sphinx._packLinks(links)
+    assert data is not None
+    assert sphinx._unpackLinks('http://base', data) == links
+
+
+linkNames = st.text(alphabet='ab.#$', max_size=4)
+links = st.tuples(st.sampled_from(['http://a', 'http://b']),
+                  st.text(alphabet='ab.#$/', max_size=6))
+
+@given(operations=st.lists(st.one_of(
+    st.tuples(st.just('set'), linkNames, links),
+    st.tuples(st.just('update'), st.dictionaries(linkNames, links)),
+    st.tuples(st.just('delete'), linkNames),
+    st.tuples(st.just('pack')),
+    )))
+@settings(max_examples=500)
+def test_LinkTable(operations: List[Tuple[object, ...]]) -> None:
+    """
+    The packed link table behaves like a dictionary.
+    """
+    expected: Dict[str, Tuple[str, str]] = {}
+    table = sphinx._LinkTable()
+    for op, *args in operations:
+        if op == 'set':
+            name, link = cast(Tuple[str, Tuple[str, str]], args)
+            expected[name] = link
+            table[name] = link
+        elif op == 'update':
+            other, = cast(Tuple[Dict[str, Tuple[str, str]]], args)
+            expected.update(other)
+            table.update(other)
+        elif op == 'delete':
+            name, = cast(Tuple[str], args)
+            if name in expected:
+                del expected[name]
+                del table[name]
+            else:
+                with pytest.raises(KeyError):
+                    del table[name]
+        else:
+            table.pack()
+        for name in ('', 'a', 'a.b'):
+            assert table.get(name) == expected.get(name)
+    assert list(table) == sorted(expected)
+    assert list(table.items()) == sorted(expected.items())
+    assert table == expected
+
+
 def test_update_bad_url(inv_reader: InvReader) -> None:
     """
     Log an error when failing to get base url from url.
@@ -401,6 +535,216 @@ def test_update_fail(inv_reader: InvReader) -> None:
     assert expected_log == inv_reader._logger.messages
 
 
+@contextmanager
+def inventoryServer(inventories: Dict[str, bytes], release: threading.Event) -> Iterator[str]:
+    """
+    Serve C{inventories} by path from a local HTTP server, which holds back
+    its responses until C{release} is set.
+
+    @return: The base URL of the server.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            release.wait(10)
+            content = inventories.get(self.path)
+            if content is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        release.set()
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+
+def test_updateInBackground() -> None:
+    """
+    Inventories are fetched while the caller goes on and are waited for
+    when the first link is looked up. Links from later inventories take
+    precedence and errors are logged by the waiting thread.
+    """
+    release = threading.Event()
+    inventories = {
+        '/first/objects.inv': zlib.compress(
+            b'first.module py:module -1 first.html -\n'
+            b'shared.name py:function -1 first.html#$ -\n'),
+        '/second/objects.inv': zlib.compress(
+            b'second.module py:module -1 second.html -\n'
+            b'shared.name py:function -1 second.html#$ -\n'),
+        }
+    logger = PydoctorLogger()
+    def log(section: str, msg: str, thresh: int = 0) -> None:
+        assert threading.current_thread() is threading.main_thread()
+        logger(section, msg, thresh)
+    sut = sphinx.SphinxInventory(logger=log)
+    with inventoryServer(inventories, release) as base:
+        urls = [f'{base}/first/objects.inv',
+                f'{base}/missing/objects.inv',
+                f'{base}/second/objects.inv']
+        sut.updateInBackground(sphinx.IntersphinxCache(requests.Session()), urls)
+        # None of the responses have been sent yet.
+        assert sut._links == {}
+        release.set()
+        assert sut.getLink('first.module') == f'{base}/first/first.html'
+        assert sut.getLink('second.module') == f'{base}/second/second.html'
+        assert sut.getLink('shared.name') == f'{base}/second/second.html#shared.name'
+    assert logger.messages == [(
+        'sphinx', f'Failed to uncompress inventory from {base}/missing', -1
+        )]
+
+
+def writeInventory(path: Path, payload: bytes) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b'# Sphinx inventory version 2\n' + zlib.compress(payload))
+    return path
+
+
+@pytest.mark.parametrize('location, expected', [
+    ('https://docs.python.org/3/objects.inv', (None, None)),
+    ('http://example.com/objects.inv?version=1', (None, None)),
+    ('does/not/exist.inv', (None, None)),
+    ('file:///srv/inv/objects.inv', (None, Path('/srv/inv/objects.inv'))),
+    ('https://docs.python.org/3/=/does/not/exist.inv', (None, None)),
+    ('https://a.com/docs/v=2/objects.inv', (None, None)),
+    ('https://docs.python.org/3/=file:///srv/inv/objects.inv',
+     ('https://docs.python.org/3', Path('/srv/inv/objects.inv'))),
+    ('https://docs.python.org/3=file:///srv/inv',
+     ('https://docs.python.org/3', Path('/srv/inv'))),
+    ])
+def test_parseLocation(location: str, expected: Tuple[Optional[str], Optional[Path]]) -> None:
+    assert sphinx.parseLocation(location) == expected
+
+
+def test_parseLocation_existing(tmp_path: Path) -> None:
+    """
+    A base URL is split off if an existing path follows the C{=}, also
+    when the base URL contains a C{=} itself.
+    """
+    path = tmp_path / 'objects.inv'
+    path.touch()
+    assert sphinx.parseLocation(f'https://a.com/docs/={path}') == ('https://a.com/docs', path)
+    assert sphinx.parseLocation(f'https://a.com/v=2/={path}') == ('https://a.com/v=2', path)
+
+
+def test_update_local(tmp_path: Path) -> None:
+    """
+    Local inventories are read from a path or C{file} URL. Their links
+    point to the directory of the inventory, unless a base URL is given.
+    """
+    path = writeInventory(tmp_path / 'some' / 'objects.inv',
+                          b'some.module py:module -1 module.html -\n')
+    for location, expected in [
+            (str(path), f'{path.parent.as_uri()}/module.html'),
+            (path.as_uri(), f'{path.parent.as_uri()}/module.html'),
+            (f'https://some.tld/api/={path}', 'https://some.tld/api/module.html'),
+            ]:
+        inv = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+        inv.update({}, location)
+        assert inv.getLink('some.module') == expected
+
+
+def test_update_local_fail(tmp_path: Path, inv_reader: InvReader) -> None:
+    """
+    Log an error when a local inventory cannot be read.
+    """
+    empty = tmp_path / 'empty.inv'
+    empty.touch()
+    missing = tmp_path / 'missing.inv'
+    inv_reader.update({}, str(empty))
+    inv_reader.update({}, f'https://some.tld/={missing.as_uri()}')
+    assert inv_reader._links == {}
+    assert inv_reader._logger.messages == [
+        ('sphinx', f'Failed to get object inventory from {empty}', -1),
+        ('sphinx', f'Failed to get object inventory from {missing}', -1),
+        ]
+
+
+def test_registry(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    The inventories in a registry directory are only loaded when a name in
+    their project root is looked up. They do not replace links from other
+    inventories and are loaded once if they cover several roots.
+    """
+    registry = tmp_path / 'registry'
+    writeInventory(registry / 'python' / 'objects.inv',
+                   b'os.path py:module -1 library/os.path.html -\n'
+                   b'sys py:module -1 library/sys.html -\n')
+    writeInventory(registry / 'twisted' / 'objects.inv',
+                   b'twisted.web py:module -1 web.html -\n'
+                   b'os.path py:module -1 wrong.html -\n')
+    (registry / 'os').symlink_to(registry / 'python')
+    (registry / 'sys').symlink_to(registry / 'python')
+    (registry / 'README').touch()
+
+    loaded = []
+    readLocal = sphinx.SphinxInventory._readLocal
+    def recordRead(self: sphinx.SphinxInventory, base_url: str, path: Path, cache_dir: Optional[Path], roots: Optional[Set[str]] = None) -> object:
+        loaded.append(path.parent.name)
+        return readLocal(self, base_url, path, cache_dir, roots)
+    monkeypatch.setattr(sphinx.SphinxInventory, '_readLocal', recordRead)
+
+    inv = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    inv._links['twisted.internet'] = ('https://twisted.org/api', 'internet.html')
+    inv.updateInBackground({}, [f'https://docs.example/={registry}'])
+    assert loaded == []
+
+    assert inv.getLink('twisted.internet') == 'https://twisted.org/api/internet.html'
+    assert inv.getLink('os.path') == 'https://docs.example/python/library/os.path.html'
+    assert inv.getLink('sys') == 'https://docs.example/python/library/sys.html'
+    assert loaded == ['twisted', 'python']
+    assert inv.getLink('unknown.name') is None
+
+    inv = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    inv.updateInBackground({}, [registry.as_uri()])
+    assert inv.getLink('twisted.web') == f'{(registry / "twisted").as_uri()}/web.html'
+
+    # All registry inventories can be loaded up front, each one once.
+    del loaded[:]
+    inv = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    inv.updateInBackground({}, [f'https://docs.example/={registry}'])
+    inv.wait()
+    inv.loadRegistries()
+    assert sorted(loaded) == ['python', 'twisted']
+    assert inv.getLink('os.path') == 'https://docs.example/python/library/os.path.html'
+    assert inv.getLink('twisted.web') == 'https://docs.example/twisted/web.html'
+    assert sorted(loaded) == ['python', 'twisted']
+
+
+def test_registry_other_roots(tmp_path: Path) -> None:
+    """
+    Only the lines of a registry inventory for names in its project roots
+    are parsed, so problems in the other lines are not reported.
+    """
+    registry = tmp_path / 'registry'
+    writeInventory(registry / 'os' / 'objects.inv',
+                   b'os py:module -1 os.html -\r\n'
+                   b'os.path py:module -1 os.path.html -\r\n'
+                   b'osx.thing py:module -1 osx.html -\n'
+                   b'broken line\n'
+                   b'\xff\xfe py:module -1 bad.html -\n')
+    (registry / 'sys').symlink_to(registry / 'os')
+
+    inv = sphinx.SphinxInventory(logger=PydoctorNoLogger())
+    inv.updateInBackground({}, [f'https://docs.example/={registry}'])
+    assert inv.getLink('os') == 'https://docs.example/os/os.html'
+    assert inv.getLink('os.path') == 'https://docs.example/os/os.path.html'
+    assert inv.getLink('osx.thing') is None
+    assert sorted(inv._links) == ['os', 'os.path']
+
+
 def test_parseInventory_empty(inv_reader_nolog: sphinx.SphinxInventory) -> None:
     """
     Return empty dict for empty input.
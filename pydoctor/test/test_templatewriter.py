@@ -1,11 +1,17 @@
+from datetime import datetime
 from io import BytesIO
 from pathlib import Path
-from typing import Callable
+from typing import Callable, List, Set
+import os
 
 import pytest
-from pydoctor import model, templatewriter
-from pydoctor.templatewriter import pages, writer
+from twisted.python.filepath import FilePath
+from twisted.web.template import XMLFile
+from pydoctor import model, templatewriter, zopeinterface
+from pydoctor.templatewriter import incremental, pages, util, writer
+from pydoctor.templatewriter.flatten import BatchedWriter
 from pydoctor.templatewriter.summary import isClassNodePrivate, isPrivate
+from pydoctor.test import MonkeyPatch
 from pydoctor.test.test_astbuilder import fromText
 from pydoctor.test.test_packages import processPackage
 
@@ -23,6 +29,32 @@ def getHTMLOf(ob: model.Documentable) -> str:
     return f.getvalue().decode()
 
 
+def test_batched_writer() -> None:
+    """
+    Small writes are combined into batches of at least the batch size.
+    """
+    writes: List[bytes] = []
+    out = BatchedWriter(writes.append, batchSize=10)
+    for data in (b'abc', b'defg', b'hijkl', b'm'):
+        out.write(data)
+    assert writes == [b'abcdefghijkl']
+    out.flush()
+    out.flush()
+    assert writes == [b'abcdefghijkl', b'm']
+
+def test_flattenToFile_streams() -> None:
+    """
+    Large pages are written in several pieces, instead of being collected
+    in memory first.
+    """
+    writes: List[bytes] = []
+    class File:
+        write = writes.append
+    mod = fromText('\n'.join(f'def f{i}(): pass' for i in range(2000)))
+    writer.flattenToFile(File(), pages.ModulePage(mod))
+    assert len(writes) > 1
+    assert b''.join(writes).count(b'<td>Function</td>') == 2000
+
 def test_simple() -> None:
     src = '''
     def f():
@@ -157,3 +189,203 @@ def test_isClassNodePrivate() -> None:
     assert isClassNodePrivate(mod.contents['_Private'])
     assert not isClassNodePrivate(mod.contents['_BaseForPublic'])
     assert isClassNodePrivate(mod.contents['_BaseForPrivate'])
+
+
+def test_template_cache() -> None:
+    """
+    Template loaders are shared, so templates are only parsed once.
+    """
+    mod = fromText('def f(): pass')
+    first = pages.CommonPage(mod).loader
+    assert pages.ModulePage(mod).loader is first
+    assert first.load() is util.templateloader('common.html').load()
+
+def test_template_cache_override(tmp_path: Path) -> None:
+    """
+    Templates at other locations are cached as well, until they are modified.
+    """
+    template = tmp_path / 'custom.html'
+    template.write_text('<div xmlns:t="http://twistedmatrix.com/ns/twisted.web.template/0.1">'
+                        '<t:slot name="title" /></div>')
+    os.utime(template, ns=(1, 1))
+
+    def load() -> XMLFile:
+        return util.templateloader(FilePath(str(template)))
+
+    loader = load()
+    assert load() is loader
+    assert 'slot' in repr(loader.load())
+
+    template.write_text('<div>changed</div>')
+    os.utime(template, ns=(2, 2))
+    assert load() is not loader
+    assert 'changed' in repr(load().load())
+
+def test_page_plan() -> None:
+    """
+    The page plan lists the pages of visible objects in depth-first order,
+    with the page class that renders them.
+    """
+    system = processPackage("basic")
+    # Objects without a kind are hidden.
+    system.allobjects['basic.mod.D'].kind = None
+    plan = writer.planPages(system.rootobjects)
+    assert [(p.filename, p.pclass) for p in plan] == [
+        ('basic.html', pages.PackagePage),
+        ('basic._private_mod.html', pages.ModulePage),
+        ('basic.mod.html', pages.ModulePage),
+        ('basic.mod.C.html', pages.ClassPage),
+        ('basic.mod.C.S.html', pages.ClassPage),
+        ]
+    assert all(p.ob.fullName() + '.html' == p.filename for p in plan)
+
+def writeIncremental(system: model.System, output: Path) -> writer.TemplateWriter:
+    w = writer.TemplateWriter(str(output))
+    w.prepOutputDirectory()
+    w.writeModuleIndex(system)
+    w.writeIndividualFiles(system.rootobjects)
+    return w
+
+def test_incremental_output(tmp_path: Path) -> None:
+    """
+    With --html-incremental, pages are only rewritten if their inputs changed.
+    """
+    system = processPackage("basic")
+    system.options.htmlincremental = True
+
+    w = writeIncremental(system, tmp_path)
+    assert w.skipped_pages == 0
+    assert (tmp_path / '.pydoctor-manifest.json').is_file()
+
+    def rewritten() -> Set[str]:
+        """Write again and return the names of the files that were written."""
+        # Backdate the files, so a write is visible even if the file
+        # system's timestamps are coarse.
+        for p in tmp_path.iterdir():
+            os.utime(p, ns=(0, 0))
+        writeIncremental(system, tmp_path)
+        return {p.name for p in tmp_path.iterdir() if p.stat().st_mtime_ns != 0}
+
+    # Nothing changed: no file is touched.
+    assert rewritten() == set()
+
+    # A changed docstring only invalidates the pages that show it. The
+    # summary pages cover every object, so they are written again as well.
+    system.allobjects['basic.mod.C.f'].docstring = "Changed docstring."
+    assert rewritten() == {
+        'basic.mod.C.html', 'basic.mod.D.html', '.pydoctor-manifest.json',
+        'moduleIndex.html', 'classIndex.html', 'index.html', 'nameIndex.html',
+        'undoccedSummary.html'}
+    assert 'Changed docstring' in (tmp_path / 'basic.mod.C.html').read_text()
+    assert 'Changed docstring' in (tmp_path / 'basic.mod.D.html').read_text()
+
+    # Every page shows the build time.
+    system.buildtime = datetime(2021, 1, 1)
+    assert rewritten() == {p.name for p in tmp_path.glob('*.html')} | {
+        '.pydoctor-manifest.json'}
+    assert '2021-01-01 00:00:00' in (tmp_path / 'basic.mod.html').read_text()
+
+def test_incremental_rendered_attributes(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    """
+    Every attribute of a documentable that is read while rendering is part
+    of the page fingerprints, or is covered by them in another way.
+    """
+    mod = fromText('''
+    """Links to L{C} and L{path}."""
+    import zope.interface
+    from os import path
+    class IFoo(zope.interface.Interface):
+        x = zope.interface.Attribute("An attribute.")
+        def m(a):
+            "A method."
+    @zope.interface.implementer(IFoo)
+    class C(IFoo):
+        """
+        @ivar v: A variable.
+        """
+        @property
+        def p(self):
+            """A property.
+            @rtype: int
+            """
+        @staticmethod
+        async def f(a: int = 1) -> str:
+            "A function."
+        v: int = 1
+    ''', modname='mod', systemcls=zopeinterface.ZopeInterfaceSystem)
+    systems = [mod.system] + [
+        processPackage(name) for name in ('basic', 'allgames', 'multipleinheritance')]
+
+    read = set()
+    getattribute = model.Documentable.__getattribute__
+    def recordRead(self: model.Documentable, name: str) -> object:
+        if name in getattribute(self, '__dict__'):
+            read.add(name)
+        return getattribute(self, name)
+    monkeypatch.setattr(model.Documentable, '__getattribute__', recordRead)
+    for system in systems:
+        writeIncremental(system, tmp_path / system.rootobjects[0].name)
+    monkeypatch.undo()
+
+    covered = {
+        # Hashed by _objectInputs() and _pageInputs().
+        'name', '_fullName', 'parent', 'contents', 'docstring', '_kind',
+        # Derived from hashed inputs.
+        'parsed_docstring', 'parsed_type', '_summary', 'parentMod', 'system',
+        # Only used in warnings, which are not part of the output.
+        'source_path',
+        }
+    assert read - covered - set(incremental._describedAttributes) == set()
+
+def test_incremental_output_disabled(tmp_path: Path) -> None:
+    """
+    A run without --html-incremental removes the manifest, since the pages
+    it writes are not recorded.
+    """
+    system = processPackage("basic")
+    system.options.htmlincremental = True
+    writeIncremental(system, tmp_path)
+    assert (tmp_path / '.pydoctor-manifest.json').is_file()
+
+    system.options.htmlincremental = False
+    writeIncremental(system, tmp_path)
+    assert not (tmp_path / '.pydoctor-manifest.json').exists()
+
+@pytest.mark.skipif(not writer._canFork(), reason="requires fork()")
+@pytest.mark.parametrize('packagename', ['basic', 'report_trigger'])
+def test_parallel_output(packagename: str, tmp_path: Path) -> None:
+    """
+    Rendering pages in worker processes produces the same files and the
+    same number of warnings as rendering them in the main process.
+    """
+    outputs = {}
+    violations = {}
+    for jobs in (1, 3):
+        system = processPackage(packagename)
+        # The footer shows the build time, which differs between the runs.
+        system.buildtime = datetime(2021, 1, 1)
+        system.options.jobs = jobs
+        output = tmp_path / str(jobs)
+        w = writeIncremental(system, output)
+        assert w.written_pages == w.total_pages
+        outputs[jobs] = {p.name: p.read_bytes() for p in output.iterdir()}
+        violations[jobs] = system.violations
+    assert outputs[1] == outputs[3]
+    assert violations[1] == violations[3]
+
+@pytest.mark.skipif(not writer._canFork(), reason="requires fork()")
+def test_parallel_incremental_output(tmp_path: Path) -> None:
+    """
+    Pages rendered in worker processes are recorded in the manifest.
+    """
+    system = processPackage("basic")
+    system.options.jobs = 2
+    system.options.htmlincremental = True
+    writeIncremental(system, tmp_path)
+    w = writeIncremental(system, tmp_path)
+    assert w.skipped_pages == w.total_pages
+
+    system.allobjects['basic.mod.C.f'].docstring = "Changed docstring."
+    w = writeIncremental(system, tmp_path)
+    assert 'Changed docstring' in (tmp_path / 'basic.mod.C.html').read_text()
+    assert w.total_pages - w.skipped_pages == 2